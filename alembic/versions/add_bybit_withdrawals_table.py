@@ -0,0 +1,46 @@
+"""add bybit_withdrawals table (pending payouts reconciled by requestId)
+
+Revision ID: ref011
+Revises: ref010
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = 'ref011'
+down_revision = 'ref010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'bybit_withdrawals',
+        sa.Column('request_id', sa.String(32), primary_key=True),
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('amount_usdt', sa.Numeric(18, 3), nullable=False),
+        sa.Column('credits', sa.Numeric(18, 3), nullable=False),
+        sa.Column(
+            'status',
+            sa.Enum('PENDING', 'COMPLETED', 'REFUNDED', name='bybitwithdrawalstatus'),
+            nullable=False,
+            server_default='PENDING'
+        ),
+        sa.Column('bybit_withdrawal_id', sa.String(64), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('reconcile_attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('resolved_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('idx_bybit_withdrawals_status_created', 'bybit_withdrawals', ['status', 'created_at'])
+    op.create_index('idx_bybit_withdrawals_user_id', 'bybit_withdrawals', ['user_id'])
+
+
+def downgrade():
+    op.drop_index('idx_bybit_withdrawals_user_id', table_name='bybit_withdrawals')
+    op.drop_index('idx_bybit_withdrawals_status_created', table_name='bybit_withdrawals')
+    op.drop_table('bybit_withdrawals')
+    sa.Enum(name='bybitwithdrawalstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,35 @@
+"""add credit_ledger_summaries table (per-user ledger rollup for wallet and history screens)
+
+Revision ID: ref009
+Revises: ref008
+Create Date: 2026-10-16
+
+Rows are built lazily from the ledger on first read or posting, so no backfill.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import UUID
+
+revision = 'ref009'
+down_revision = 'ref008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'credit_ledger_summaries',
+        sa.Column('user_id', UUID(as_uuid=True), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('lifetime_earned', sa.Numeric(18, 3), nullable=False, server_default='0'),
+        sa.Column('lifetime_spent', sa.Numeric(18, 3), nullable=False, server_default='0'),
+        sa.Column('entry_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('totals_by_category', sa.JSON(), nullable=False),
+        sa.Column('recent_entries', sa.JSON(), nullable=False),
+        sa.Column('claims', sa.JSON(), nullable=False),
+        sa.Column('recent_withdrawals', sa.JSON(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('credit_ledger_summaries')
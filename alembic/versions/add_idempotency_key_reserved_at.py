@@ -0,0 +1,23 @@
+"""add reserved_at to idempotency_keys (stale reservations can be taken over)
+
+Revision ID: ref012
+Revises: ref011
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'ref012'
+down_revision = 'ref011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('idempotency_keys', sa.Column('reserved_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE idempotency_keys SET reserved_at = created_at WHERE status_code IS NULL")
+
+
+def downgrade():
+    op.drop_column('idempotency_keys', 'reserved_at')
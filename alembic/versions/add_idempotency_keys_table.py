@@ -0,0 +1,45 @@
+"""add idempotency_keys table (Idempotency-Key replays, one welcome reward per user)
+
+Revision ID: ref010
+Revises: ref009
+Create Date: 2026-10-16
+
+Backfills the implicit welcome_reward:<user_id> key for every user who has
+already claimed the welcome reward, so they cannot claim it again.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'ref010'
+down_revision = 'ref009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.String(300), primary_key=True),
+        sa.Column('request_hash', sa.String(64), nullable=True),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column('response', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('idx_idempotency_keys_expires_at', 'idempotency_keys', ['expires_at'])
+    op.execute(
+        """
+        INSERT INTO idempotency_keys (key, status_code, created_at, completed_at)
+        SELECT 'welcome_reward:' || CAST(user_id AS VARCHAR), 200, MIN(timestamp), MIN(timestamp)
+        FROM credit_transactions
+        WHERE transaction_type = 'CLAIM_REWARD'
+          AND (reference_type IS NULL OR reference_type = 'welcome_reward')
+        GROUP BY user_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_index('idx_idempotency_keys_expires_at', table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
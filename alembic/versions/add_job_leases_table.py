@@ -0,0 +1,35 @@
+"""add job_leases table (single-worker scheduling of background jobs)
+
+Revision ID: ref006
+Revises: ref005
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'ref006'
+down_revision = 'ref005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_leases',
+        sa.Column('name', sa.String(100), primary_key=True),
+        sa.Column('owner', sa.String(100), nullable=True),
+        sa.Column('lease_until', sa.DateTime(), nullable=True),
+        sa.Column('next_run_at', sa.DateTime(), nullable=True),
+        sa.Column('last_owner', sa.String(100), nullable=True),
+        sa.Column('last_started_at', sa.DateTime(), nullable=True),
+        sa.Column('last_finished_at', sa.DateTime(), nullable=True),
+        sa.Column('last_duration_ms', sa.Float(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('run_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failure_count', sa.Integer(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade():
+    op.drop_table('job_leases')
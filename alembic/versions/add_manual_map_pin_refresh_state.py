@@ -0,0 +1,32 @@
+"""add refresh state to manual_map_pins (channel id cache, validators, back-off)
+
+Revision ID: ref005
+Revises: ref004
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'ref005'
+down_revision = 'ref004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('manual_map_pins', sa.Column('youtube_channel_id', sa.String(64), nullable=True))
+    op.add_column('manual_map_pins', sa.Column('content_etag', sa.String(255), nullable=True))
+    op.add_column('manual_map_pins', sa.Column('content_last_modified', sa.String(64), nullable=True))
+    op.add_column('manual_map_pins', sa.Column('refresh_failures', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('manual_map_pins', sa.Column('next_refresh_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_manual_map_pins_next_refresh_at', 'manual_map_pins', ['next_refresh_at'])
+
+
+def downgrade():
+    op.drop_index('ix_manual_map_pins_next_refresh_at', table_name='manual_map_pins')
+    op.drop_column('manual_map_pins', 'next_refresh_at')
+    op.drop_column('manual_map_pins', 'refresh_failures')
+    op.drop_column('manual_map_pins', 'content_last_modified')
+    op.drop_column('manual_map_pins', 'content_etag')
+    op.drop_column('manual_map_pins', 'youtube_channel_id')
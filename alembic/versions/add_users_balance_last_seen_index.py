@@ -0,0 +1,21 @@
+"""add users (credit_balance, last_seen, id) index (keyset-paginated zero-balance watchdog)
+
+Revision ID: ref007
+Revises: ref006
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+
+revision = 'ref007'
+down_revision = 'ref006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_users_balance_last_seen', 'users', ['credit_balance', 'last_seen', 'id'])
+
+
+def downgrade():
+    op.drop_index('idx_users_balance_last_seen', table_name='users')
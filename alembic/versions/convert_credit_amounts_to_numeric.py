@@ -0,0 +1,47 @@
+"""store credit balances and ledger amounts as NUMERIC(18, 3) instead of float
+
+Revision ID: ref008
+Revises: ref007
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'ref008'
+down_revision = 'ref007'
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = (
+    ('users', 'credit_balance'),
+    ('credit_transactions', 'amount'),
+    ('credit_transactions', 'balance_after'),
+    ('credit_ledger', 'amount'),
+    ('credit_ledger', 'balance_before'),
+    ('credit_ledger', 'balance_after'),
+)
+
+
+def upgrade():
+    for table, column in MONEY_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(
+                column,
+                existing_type=sa.Float(),
+                type_=sa.Numeric(18, 3),
+                existing_nullable=False,
+                postgresql_using=f'round({column}::numeric, 3)',
+            )
+
+
+def downgrade():
+    for table, column in MONEY_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(
+                column,
+                existing_type=sa.Numeric(18, 3),
+                type_=sa.Float(),
+                existing_nullable=False,
+                postgresql_using=f'{column}::double precision',
+            )
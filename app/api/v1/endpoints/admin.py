@@ -10,9 +10,11 @@ Complete implementation with:
 - All administrative alerts linked to phone number
 """
 import re
-from fastapi import APIRouter, Depends, HTTPException, Body, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_
+from sqlalchemy import and_, func, or_, select, text
 from typing import Optional, Dict, List
 from datetime import datetime, timedelta
 from pydantic import BaseModel
@@ -32,15 +34,13 @@ except ImportError:
         import jose.jwt as jwt
     except ImportError:
         jwt = None
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
 from app.core.config import settings
+from app.core.pagination import NDJSON_MEDIA_TYPE, NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, ndjson_lines, parse_cursor_datetime
 from app.models.user import User, UserRole, UserStatus
-from app.models.business import Business, BusinessStatus
-from app.models.credit import CreditLedger, CreditTransaction
-from app.models.post import Post
-from app.models.chat import Chat
 from app.models.manual_map_pin import ManualMapPin
 from app.services.admin_alert import send_admin_login_alert, send_admin_alert
+from app.services.admin_analytics import get_cached_admin_analytics
 from app.middleware.auth import require_admin
 from app.services.sms import send_sms_alert
 import uuid
@@ -90,7 +90,7 @@ async def get_client_ip(request: Request) -> str:
 
 
 @router.post("/setup")
-async def admin_setup_first_user(db: Session = Depends(get_db)):
+def admin_setup_first_user(db: Session = Depends(get_db)):
     """
     One-time setup: create the first admin user so you can log in.
     Only works when no admin user exists. Use username admin@bili.local, password admin123.
@@ -133,6 +133,21 @@ async def admin_setup_first_user(db: Session = Depends(get_db)):
     }
 
 
+def _find_admin_user(db: Session, username: str) -> Optional[User]:
+    return db.query(User).filter(
+        User.role == UserRole.ADMIN,
+        or_(
+            User.phone_number == username,
+            User.email == username
+        )
+    ).first()
+
+
+def _touch_last_seen(db: Session, user: User) -> None:
+    user.last_seen = datetime.utcnow()
+    db.commit()
+
+
 @router.post("/login")
 async def admin_login(
     username: str = Body(..., description="Admin username/phone"),
@@ -145,14 +160,8 @@ async def admin_login(
     
     Sends SMS notification immediately upon any admin login attempt.
     """
-    # Find admin user
-    admin_user = db.query(User).filter(
-        User.role == UserRole.ADMIN,
-        or_(
-            User.phone_number == username,
-            User.email == username
-        )
-    ).first()
+    # Find admin user (blocking ORM work in the threadpool)
+    admin_user = await run_in_threadpool(_find_admin_user, db, username)
     
     if not admin_user:
         # Still send alert for failed login attempt
@@ -175,8 +184,7 @@ async def admin_login(
     
     # Create JWT token and return response immediately (don't block on SMS)
     token = create_admin_token(str(admin_user.id))
-    admin_user.last_seen = datetime.utcnow()
-    db.commit()
+    await run_in_threadpool(_touch_last_seen, db, admin_user)
     
     # Send SMS alert in background so login response is not delayed
     import asyncio
@@ -201,54 +209,146 @@ async def admin_login(
     }
 
 
+# Rows fetched per round trip by the NDJSON export
+WATCHDOG_STREAM_BATCH = 1000
+
+WATCHDOG_COLUMNS = (
+    User.id, User.phone_number, User.email, User.display_name,
+    User.status, User.credit_balance, User.last_seen,
+)
+
+
+def _zero_balance_queries(status: Optional[UserStatus], cursor: Optional[str]) -> list:
+    """
+    Zero-balance users after cursor, as keyset phases read in turn: seen users
+    most recent first, then never-seen users. Each phase is one backward range
+    scan of idx_users_balance_last_seen (credit_balance, last_seen, id).
+    """
+    base = select(*WATCHDOG_COLUMNS).where(User.credit_balance == 0.00)
+    if status is not None:
+        base = base.where(User.status == status)
+    seen = base.where(User.last_seen.isnot(None))
+    never_seen = base.where(User.last_seen.is_(None))
+    if cursor:
+        try:
+            last_seen, user_id = decode_cursor(cursor, 2)
+            last_seen = parse_cursor_datetime(last_seen)
+            user_id = uuid.UUID(user_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if last_seen is None:
+            # Already in the never-seen tail
+            return [never_seen.where(User.id < user_id).order_by(User.id.desc())]
+        seen = seen.where(or_(
+            User.last_seen < last_seen,
+            and_(User.last_seen == last_seen, User.id < user_id),
+        ))
+    return [
+        seen.order_by(User.last_seen.desc(), User.id.desc()),
+        never_seen.order_by(User.id.desc()),
+    ]
+
+
+def _zero_balance_page(db: Session, status: Optional[UserStatus], cursor: Optional[str], count: int) -> list:
+    """Up to count rows after cursor, continuing into the next phase when one runs out."""
+    rows = []
+    for query in _zero_balance_queries(status, cursor):
+        rows.extend(db.execute(query.limit(count - len(rows))).all())
+        if len(rows) >= count:
+            break
+    return rows
+
+
+def _zero_balance_row(row) -> dict:
+    should_appear = row.status == UserStatus.ONLINE or (row.status == UserStatus.OFFLINE and row.credit_balance > 0.00)
+    return {
+        "user_id": str(row.id),
+        "phone_number": row.phone_number,
+        "email": row.email,
+        "display_name": row.display_name,
+        "status": row.status.value,
+        "credit_balance": float(row.credit_balance),
+        "last_seen": row.last_seen.isoformat() if row.last_seen else None,
+        "should_appear_on_radar": should_appear,
+        "silent_decay_applied": row.status == UserStatus.OFFLINE and row.credit_balance == 0.00
+    }
+
+
+def _stream_zero_balance_users(status: Optional[UserStatus], cursor: Optional[str]):
+    """NDJSON export on its own session, fetched in batches (request session is not held)."""
+    queries = [
+        query.execution_options(yield_per=WATCHDOG_STREAM_BATCH)
+        for query in _zero_balance_queries(status, cursor)
+    ]
+
+    def rows():
+        db = SessionLocal()
+        try:
+            for query in queries:
+                for row in db.execute(query):
+                    yield _zero_balance_row(row)
+        finally:
+            db.close()
+    return ndjson_lines(rows())
+
+
 @router.get("/zero-balance-watchdog")
-async def get_zero_balance_users(
+def get_zero_balance_users(
+    response: Response,
+    status: Optional[str] = Query(None, description="Only users with this status: online, offline or invisible"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000, description="Users per page"),
+    format: str = Query("json", description="json (one page) or ndjson (stream every matching user)"),
     db: Session = Depends(get_db)
 ):
     """
     ZERO-BALANCE WATCHDOG: Monitor all accounts with 0.00 Credits
     
     Live Admin dashboard to monitor all accounts with 0.00 Credits for instant oversight.
+    Pages are keyset-paginated on (last_seen, id): pass next_cursor (also sent as
+    X-Next-Cursor) to get the next page. format=ndjson streams every matching user,
+    one JSON object per line. Counts always cover all zero-balance users.
     """
-    zero_balance_users = db.query(User).filter(
-        User.credit_balance == 0.00
-    ).order_by(desc(User.last_seen)).all()
+    status_filter = None
+    if status:
+        try:
+            status_filter = UserStatus(status.lower())
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid status: {status}. Must be: online, offline, or invisible")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
     
-    # Categorize by status
-    online_zero = [u for u in zero_balance_users if u.status == UserStatus.ONLINE]
-    offline_zero = [u for u in zero_balance_users if u.status == UserStatus.OFFLINE]
+    if format == "ndjson":
+        return StreamingResponse(_stream_zero_balance_users(status_filter, cursor), media_type=NDJSON_MEDIA_TYPE)
     
-    # Check Silent Decay status
-    silent_decay_candidates = [
-        u for u in offline_zero 
-        if u.should_appear_on_radar() == False
-    ]
+    rows = _zero_balance_page(db, status_filter, cursor, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].last_seen, rows[-1].id)
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    
+    # Categorize by status in SQL
+    counts = dict(db.execute(
+        select(User.status, func.count()).where(User.credit_balance == 0.00).group_by(User.status)
+    ).all())
+    offline_zero = counts.get(UserStatus.OFFLINE, 0)
     
     return {
-        "total": len(zero_balance_users),
-        "online_zero_balance": len(online_zero),
-        "offline_zero_balance": len(offline_zero),
-        "silent_decay_candidates": len(silent_decay_candidates),
-        "users": [
-            {
-                "user_id": str(u.id),
-                "phone_number": u.phone_number,
-                "email": u.email,
-                "display_name": u.display_name,
-                "status": u.status.value,
-                "credit_balance": float(u.credit_balance),
-                "last_seen": u.last_seen.isoformat() if u.last_seen else None,
-                "should_appear_on_radar": u.should_appear_on_radar(),
-                "silent_decay_applied": u.status == UserStatus.OFFLINE and u.credit_balance == 0.00
-            }
-            for u in zero_balance_users
-        ],
+        "total": sum(counts.values()),
+        "online_zero_balance": counts.get(UserStatus.ONLINE, 0),
+        "offline_zero_balance": offline_zero,
+        # Offline with 0.00 credits is exactly the Silent Decay condition
+        "silent_decay_candidates": offline_zero,
+        "users": [_zero_balance_row(row) for row in rows],
+        "next_cursor": next_cursor,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
 @router.get("/analytics")
-async def get_admin_analytics(
+def get_admin_analytics(
+    refresh: bool = Query(False, description="Recompute instead of serving the cached figures"),
     db: Session = Depends(get_db)
 ):
     """
@@ -256,106 +356,10 @@ async def get_admin_analytics(
     - Active geographic zones
     - Top ad categories
     - Conversion metrics (Claim → Post → Chat)
-    """
-    # User metrics
-    total_users = db.query(User).count()
-    total_members = db.query(User).filter(User.role == UserRole.MEMBER).count()
-    total_guests = db.query(User).filter(User.role == UserRole.GUEST).count()
-    total_masters = db.query(User).filter(User.is_master == True).count()
-    online_users = db.query(User).filter(User.status == UserStatus.ONLINE).count()
-    
-    # Business metrics
-    total_businesses = db.query(Business).count()
-    claimed_businesses = db.query(Business).filter(Business.status == BusinessStatus.CLAIMED).count()
-    unclaimed_businesses = db.query(Business).filter(Business.status == BusinessStatus.UNCLAIMED).count()
-    claim_rate = (claimed_businesses / total_businesses * 100) if total_businesses > 0 else 0
-    
-    # Credit metrics
-    total_credits_awarded = db.query(func.sum(CreditTransaction.amount)).filter(
-        CreditTransaction.transaction_type.in_(["claim_reward", "referral_reward"])
-    ).scalar() or 0
-    
-    total_credits_spent = abs(db.query(func.sum(CreditTransaction.amount)).filter(
-        CreditTransaction.amount < 0
-    ).scalar() or 0)
-    
-    # Post metrics
-    total_posts = db.query(Post).count()
-    commercial_posts = db.query(Post).filter(Post.is_commercial == True).count()
-    personal_posts = db.query(Post).filter(Post.post_type == "personal").count()
-    
-    # Chat metrics
-    total_chats = db.query(Chat).count()
-    active_chats = db.query(Chat).filter(Chat.status == "active").count()
-    
-    # Geographic zones (simplified - group by approximate regions)
-    users_with_location = db.query(User).filter(
-        User.latitude.isnot(None),
-        User.longitude.isnot(None)
-    ).all()
     
-    # Top ad categories
-    top_categories = db.query(
-        Post.category,
-        func.count(Post.id).label("count")
-    ).filter(
-        Post.is_commercial == True,
-        Post.category.isnot(None)
-    ).group_by(Post.category).order_by(desc("count")).limit(10).all()
-    
-    # Conversion metrics
-    users_who_claimed = db.query(User).filter(User.claim_date.isnot(None)).count()
-    users_who_posted = db.query(User).join(Post).distinct(User.id).count()
-    users_who_chatted = db.query(User).join(Chat, or_(
-        Chat.initiator_id == User.id,
-        Chat.recipient_id == User.id
-    )).distinct(User.id).count()
-    
-    return {
-        "timestamp": datetime.utcnow().isoformat(),
-        "users": {
-            "total": total_users,
-            "members": total_members,
-            "guests": total_guests,
-            "masters": total_masters,
-            "online": online_users
-        },
-        "businesses": {
-            "total": total_businesses,
-            "claimed": claimed_businesses,
-            "unclaimed": unclaimed_businesses,
-            "claim_rate_percent": round(claim_rate, 2)
-        },
-        "credits": {
-            "total_awarded": float(total_credits_awarded),
-            "total_spent": float(total_credits_spent),
-            "net_circulation": float(total_credits_awarded - total_credits_spent)
-        },
-        "posts": {
-            "total": total_posts,
-            "commercial": commercial_posts,
-            "personal": personal_posts
-        },
-        "chats": {
-            "total": total_chats,
-            "active": active_chats
-        },
-        "conversion_metrics": {
-            "users_who_claimed": users_who_claimed,
-            "users_who_posted": users_who_posted,
-            "users_who_chatted": users_who_chatted,
-            "claim_to_post_rate": round((users_who_posted / users_who_claimed * 100) if users_who_claimed > 0 else 0, 2),
-            "post_to_chat_rate": round((users_who_chatted / users_who_posted * 100) if users_who_posted > 0 else 0, 2)
-        },
-        "top_ad_categories": [
-            {"category": cat, "count": count}
-            for cat, count in top_categories
-        ],
-        "geographic_zones": {
-            "users_with_location": len(users_with_location),
-            "active_zones": "Calculate based on user density"
-        }
-    }
+    Computed with a few aggregate queries and cached for ADMIN_ANALYTICS_CACHE_SECONDS.
+    """
+    return get_cached_admin_analytics(db, refresh=refresh)
 
 
 @router.post("/alert")
@@ -377,6 +381,31 @@ async def send_admin_alert_endpoint(
         raise HTTPException(status_code=500, detail=f"Failed to send alert: {str(e)}")
 
 
+def _health_checks(db: Session):
+    """Database connectivity and user counts; returns (checks, database error or None)."""
+    checks = {}
+    db_error = None
+    
+    # Check database connection
+    try:
+        db.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        db_error = str(e)
+        checks["database"] = f"error: {db_error}"
+    
+    # Check zero-balance users count
+    checks["zero_balance_users"] = db.query(User).filter(User.credit_balance == 0.00).count()
+    
+    # Check for stuck processes (users offline for > 24 hours with credits)
+    checks["stale_offline_users"] = db.query(User).filter(
+        User.status == UserStatus.OFFLINE,
+        User.credit_balance > 0.00,
+        User.last_seen < datetime.utcnow() - timedelta(hours=24)
+    ).count()
+    return checks, db_error
+
+
 @router.get("/system-health")
 async def get_system_health(
     db: Session = Depends(get_db)
@@ -390,30 +419,33 @@ async def get_system_health(
         "checks": {}
     }
     
-    # Check database connection
-    try:
-        db.execute("SELECT 1")
-        health_status["checks"]["database"] = "ok"
-    except Exception as e:
-        health_status["checks"]["database"] = f"error: {str(e)}"
+    # Database checks are blocking: run them in the threadpool
+    checks, db_error = await run_in_threadpool(_health_checks, db)
+    health_status["checks"].update(checks)
+    if db_error:
         health_status["status"] = "degraded"
-        await send_admin_alert(f"⚠️ Database connection issue: {str(e)}")
-    
-    # Check zero-balance users count
-    zero_balance_count = db.query(User).filter(User.credit_balance == 0.00).count()
-    health_status["checks"]["zero_balance_users"] = zero_balance_count
-    
-    # Check for stuck processes (users offline for > 24 hours with credits)
-    stale_offline = db.query(User).filter(
-        User.status == UserStatus.OFFLINE,
-        User.credit_balance > 0.00,
-        User.last_seen < datetime.utcnow() - timedelta(hours=24)
-    ).count()
-    health_status["checks"]["stale_offline_users"] = stale_offline
+        await send_admin_alert(f"⚠️ Database connection issue: {db_error}")
     
     return health_status
 
 
+@router.get("/jobs")
+def get_background_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin),
+):
+    """
+    Background job status: this worker's runs plus, for cluster-wide jobs, the
+    lease row (owner, next run, last run on any worker, duration, error).
+    """
+    from app.core.scheduler import scheduler
+    return {
+        "worker": scheduler.owner,
+        "jobs": scheduler.status(db),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
 # ---------- Manual Map Pins (Admin: paste coordinates/URL, pin appears for all users) ----------
 
 def _pin_to_dict(pin: ManualMapPin) -> dict:
@@ -465,6 +497,25 @@ def _parse_coordinates_from_input(text: str) -> Optional[tuple]:
     return None
 
 
+def _get_pin(db: Session, pin_id: str) -> ManualMapPin:
+    """Pin by id (404 if the id is malformed or unknown)."""
+    try:
+        pin_uuid = uuid.UUID(pin_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=404, detail="Pin not found")
+    pin = db.query(ManualMapPin).filter(ManualMapPin.id == pin_uuid).first()
+    if not pin:
+        raise HTTPException(status_code=404, detail="Pin not found")
+    return pin
+
+
+def _save_pin(db: Session, pin: ManualMapPin) -> None:
+    """Commit pending changes (a new pin is added first) and reload the pin."""
+    db.add(pin)
+    db.commit()
+    db.refresh(pin)
+
+
 class AddMapPinRequest(BaseModel):
     coordinates_or_url: str
     name: Optional[str] = None
@@ -491,14 +542,12 @@ async def add_map_pin(
     name = (body.name or "Store").strip() or "Store"
     profile_url = (body.profile_url or "").strip() or None
     pin = ManualMapPin(name=name, latitude=lat, longitude=lng, profile_url=profile_url)
-    db.add(pin)
-    db.commit()
-    db.refresh(pin)
+    # Blocking ORM work in the threadpool; the content fetch is async
+    await run_in_threadpool(_save_pin, db, pin)
     if profile_url:
         from app.services.pin_content_refresh import refresh_pin_content
-        refresh_pin_content(pin)
-        db.commit()
-        db.refresh(pin)
+        await refresh_pin_content(pin)
+        await run_in_threadpool(_save_pin, db, pin)
     return {
         "success": True,
         "pin": _pin_to_dict(pin),
@@ -515,25 +564,20 @@ async def update_map_pin(
     current_user: User = Depends(require_admin),
 ):
     """Update a pin (e.g. set or change profile URL for dynamic refresh)."""
-    try:
-        from uuid import UUID
-        pin_uuid = UUID(pin_id)
-    except (ValueError, TypeError):
-        raise HTTPException(status_code=404, detail="Pin not found")
-    pin = db.query(ManualMapPin).filter(ManualMapPin.id == pin_uuid).first()
-    if not pin:
-        raise HTTPException(status_code=404, detail="Pin not found")
+    pin = await run_in_threadpool(_get_pin, db, pin_id)
     if "name" in body and body["name"] is not None:
         pin.name = (body["name"] or "Store").strip() or "Store"
     if "profile_url" in body:
-        pin.profile_url = (body["profile_url"] or "").strip() or None
-    db.commit()
-    db.refresh(pin)
+        profile_url = (body["profile_url"] or "").strip() or None
+        if profile_url != pin.profile_url:
+            from app.services.pin_content_refresh import reset_refresh_state
+            reset_refresh_state(pin)
+        pin.profile_url = profile_url
+    await run_in_threadpool(_save_pin, db, pin)
     if pin.profile_url:
         from app.services.pin_content_refresh import refresh_pin_content
-        refresh_pin_content(pin)
-        db.commit()
-        db.refresh(pin)
+        await refresh_pin_content(pin)
+        await run_in_threadpool(_save_pin, db, pin)
     return {"success": True, "pin": _pin_to_dict(pin)}
 
 
@@ -544,25 +588,17 @@ async def refresh_map_pin_content(
     current_user: User = Depends(require_admin),
 ):
     """Fetch latest video/post from the pin's profile URL and update the pin."""
-    try:
-        from uuid import UUID
-        pin_uuid = UUID(pin_id)
-    except (ValueError, TypeError):
-        raise HTTPException(status_code=404, detail="Pin not found")
-    pin = db.query(ManualMapPin).filter(ManualMapPin.id == pin_uuid).first()
-    if not pin:
-        raise HTTPException(status_code=404, detail="Pin not found")
+    pin = await run_in_threadpool(_get_pin, db, pin_id)
     if not pin.profile_url:
         raise HTTPException(status_code=400, detail="Pin has no profile URL. Add one to enable dynamic refresh.")
     from app.services.pin_content_refresh import refresh_pin_content
-    updated = refresh_pin_content(pin)
-    db.commit()
-    db.refresh(pin)
+    updated = await refresh_pin_content(pin)
+    await run_in_threadpool(_save_pin, db, pin)
     return {"success": True, "updated": updated, "pin": _pin_to_dict(pin)}
 
 
 @router.delete("/map-pins/{pin_id}")
-async def delete_map_pin(
+def delete_map_pin(
     pin_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin),
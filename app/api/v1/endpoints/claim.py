@@ -11,14 +11,17 @@ Complete implementation:
 
 Uses auth_handler.py for clean, centralized logic [cite: 2026-02-09]
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import datetime
-from app.core.database import get_db, try_get_db
+from typing import Optional
+from app.core.database import get_db, try_get_db, to_money
 from app.core.config import settings
 from app.models.business import Business, BusinessStatus
 from app.models.user import User
-from app.models.credit import CreditTransaction, CreditTransactionType
+from app.services.ledger_summary import get_ledger_summary
+from app.services.idempotency import run_idempotent
 from app.schemas.claim import ClaimRequest, ClaimResponse
 from app.auth_handler import AuthHandler, process_claim_reward
 from app.core.websocket import websocket_manager
@@ -31,6 +34,7 @@ router = APIRouter()
 async def claim_reward(
     request: ClaimRequest,
     db: Session | None = Depends(try_get_db),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the first response"),
 ):
     """
     THE FLASHING CLAIM BUTTON ENDPOINT - Available at any time [cite: 2026-02-03]
@@ -46,6 +50,7 @@ async def claim_reward(
     
     No login/signup barriers - instant onboarding.
     Uses auth_handler.py for clean logic structure [cite: 2026-02-09]
+    Send an Idempotency-Key header to make retries safe.
     """
     # If database is not available, return a graceful demo response
     if db is None:
@@ -65,9 +70,10 @@ async def claim_reward(
             transaction_id=str(uuid.uuid4()),
         )
 
-    try:
-        # Use auth_handler for centralized logic when DB is available
-        result = process_claim_reward(
+    async def claim() -> ClaimResponse:
+        # Use auth_handler for centralized logic when DB is available (blocking ORM work in the threadpool)
+        result = await run_in_threadpool(
+            process_claim_reward,
             db=db,
             phone_number=request.phone_number,
             device_id=request.device_id,
@@ -96,6 +102,10 @@ async def claim_reward(
             transaction_id=result["transaction_id"],
             referral_code=result.get("referral_code"),
         )
+
+    try:
+        # Retries with the same Idempotency-Key get the first response back
+        return await run_idempotent(db, "claim_reward", idempotency_key, request.model_dump(), claim)
         
     except HTTPException:
         raise
@@ -104,10 +114,63 @@ async def claim_reward(
         raise HTTPException(status_code=500, detail=f"Failed to claim reward: {str(e)}")
 
 
+def _claim_business_sync(db: Session, request: ClaimRequest) -> dict:
+    """Validate the business, award the claim reward and claim the business (blocking)."""
+    # Step 1: Validate business exists and is unclaimed
+    try:
+        business_id_uuid = uuid.UUID(request.business_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid business ID format")
+    
+    business = db.query(Business).filter(Business.id == business_id_uuid).first()
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+    
+    if business.status != BusinessStatus.CLAIMED:
+        # Business is unclaimed, proceed with claim
+        pass
+    else:
+        # Check if user already claimed this business
+        handler = AuthHandler(db)
+        user = None
+        if request.phone_number:
+            user = handler.get_user_by_phone(request.phone_number)
+        
+        if user and business.owner_id == user.id:
+            raise HTTPException(status_code=400, detail="You have already claimed this business")
+        else:
+            raise HTTPException(
+                status_code=400, 
+                detail="Business already claimed by another user"
+            )
+    
+    # Step 2: Use auth_handler to process claim reward
+    result = process_claim_reward(
+        db=db,
+        phone_number=request.phone_number,
+        device_id=request.device_id,
+        display_name=request.display_name,
+        latitude=request.latitude,
+        longitude=request.longitude,
+        business_id=request.business_id
+    )
+    
+    # Step 3: Claim the business
+    claim_date = datetime.utcnow()
+    business.status = BusinessStatus.CLAIMED
+    business.owner_id = uuid.UUID(result["user_id"])
+    business.claimed_at = claim_date
+    
+    db.commit()
+    db.refresh(business)
+    return result
+
+
 @router.post("/business", response_model=ClaimResponse)
 async def claim_business(
     request: ClaimRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the first response"),
 ):
     """
     CLAIM BUSINESS ENDPOINT - Awards 20 Credits and Claims Business [cite: 2026-02-03]
@@ -120,58 +183,14 @@ async def claim_business(
     
     Requires business_id in request.
     Uses auth_handler.py for clean logic structure [cite: 2026-02-09]
+    Send an Idempotency-Key header to make retries safe.
     """
     if not request.business_id:
         raise HTTPException(status_code=400, detail="business_id is required for business claim")
     
-    try:
-        # Step 1: Validate business exists and is unclaimed
-        try:
-            business_id_uuid = uuid.UUID(request.business_id)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid business ID format")
-        
-        business = db.query(Business).filter(Business.id == business_id_uuid).first()
-        if not business:
-            raise HTTPException(status_code=404, detail="Business not found")
-        
-        if business.status != BusinessStatus.CLAIMED:
-            # Business is unclaimed, proceed with claim
-            pass
-        else:
-            # Check if user already claimed this business
-            handler = AuthHandler(db)
-            user = None
-            if request.phone_number:
-                user = handler.get_user_by_phone(request.phone_number)
-            
-            if user and business.owner_id == user.id:
-                raise HTTPException(status_code=400, detail="You have already claimed this business")
-            else:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Business already claimed by another user"
-                )
-        
-        # Step 2: Use auth_handler to process claim reward
-        result = process_claim_reward(
-            db=db,
-            phone_number=request.phone_number,
-            device_id=request.device_id,
-            display_name=request.display_name,
-            latitude=request.latitude,
-            longitude=request.longitude,
-            business_id=request.business_id
-        )
-        
-        # Step 3: Claim the business
-        claim_date = datetime.utcnow()
-        business.status = BusinessStatus.CLAIMED
-        business.owner_id = uuid.UUID(result["user_id"])
-        business.claimed_at = claim_date
-        
-        db.commit()
-        db.refresh(business)
+    async def claim() -> ClaimResponse:
+        # Steps 1-3 are blocking ORM work: run them in the threadpool
+        result = await run_in_threadpool(_claim_business_sync, db, request)
         
         # Broadcast user status update via WebSocket
         try:
@@ -190,6 +209,10 @@ async def claim_business(
             is_new_member=result.get("is_new_member", False),
             transaction_id=result["transaction_id"]
         )
+
+    try:
+        # Retries with the same Idempotency-Key get the first response back
+        return await run_idempotent(db, "claim_business", idempotency_key, request.model_dump(), claim)
         
     except HTTPException:
         db.rollback()
@@ -200,7 +223,7 @@ async def claim_business(
 
 
 @router.get("/claim-history/{user_id}")
-async def get_user_claim_history(
+def get_user_claim_history(
     user_id: str,
     db: Session = Depends(get_db)
 ):
@@ -222,16 +245,13 @@ async def get_user_claim_history(
         Business.status == BusinessStatus.CLAIMED
     ).order_by(Business.claimed_at.desc()).all()
     
-    # Get claim transactions
-    claim_transactions = db.query(CreditTransaction).filter(
-        CreditTransaction.user_id == user.id,
-        CreditTransaction.transaction_type == CreditTransactionType.CLAIM_REWARD
-    ).order_by(CreditTransaction.timestamp.desc()).all()
+    # Claim transactions (kept in full on the ledger summary row)
+    claim_transactions = get_ledger_summary(db, user.id).claims
     
     return {
         "user_id": str(user.id),
         "total_claims": len(claimed_businesses),
-        "total_credits_earned": sum(t.amount for t in claim_transactions),
+        "total_credits_earned": float(sum(to_money(t["amount"]) for t in claim_transactions)),
         "royal_hospitality_end_date": user.royal_hospitality_end_date.isoformat() if user.royal_hospitality_end_date else None,
         "is_in_royal_hospitality": user.is_in_royal_hospitality_period(),
         "claimed_businesses": [
@@ -242,14 +262,5 @@ async def get_user_claim_history(
             }
             for b in claimed_businesses
         ],
-        "claim_transactions": [
-            {
-                "transaction_id": str(t.id),
-                "amount": float(t.amount),
-                "business_id": str(t.reference_id) if t.reference_id else None,
-                "timestamp": t.timestamp.isoformat(),
-                "description": t.description
-            }
-            for t in claim_transactions
-        ]
+        "claim_transactions": claim_transactions
     }
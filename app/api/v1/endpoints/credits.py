@@ -2,19 +2,39 @@
 BILI Master System - Credits Endpoints
 Credit Ledger: Clear history log of all credit movements
 """
-from fastapi import APIRouter, Depends, HTTPException
+import uuid
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
 from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
+from typing import List, Optional
+from app.core.database import get_db, SessionLocal
+from app.core.config import settings
+from app.core.pagination import (
+    CSV_MEDIA_TYPE, NDJSON_MEDIA_TYPE, NEXT_CURSOR_HEADER,
+    csv_lines, decode_cursor, encode_cursor, ndjson_lines, parse_cursor_datetime,
+)
+from app.middleware.auth import require_admin
 from app.models.user import User
 from app.models.credit import CreditLedger
 from app.schemas.credits import CreditLedgerResponse, CreditBalanceResponse
+from app.services.ledger_summary import get_ledger_summary
 
 router = APIRouter()
 
+LEDGER_STREAM_BATCH = 1000
+
+LEDGER_EXPORT_COLUMNS = (
+    CreditLedger.id, CreditLedger.user_id, CreditLedger.transaction_id, CreditLedger.entry_type,
+    CreditLedger.amount, CreditLedger.balance_before, CreditLedger.balance_after,
+    CreditLedger.description, CreditLedger.category, CreditLedger.timestamp,
+)
+LEDGER_EXPORT_FIELDS = [column.key for column in LEDGER_EXPORT_COLUMNS]
+
 
 @router.get("/balance/{user_id}", response_model=CreditBalanceResponse)
-async def get_credit_balance(
+def get_credit_balance(
     user_id: str,
     db: Session = Depends(get_db)
 ):
@@ -31,24 +51,175 @@ async def get_credit_balance(
     )
 
 
+def _ledger_page_query(user_id: uuid.UUID, cursor: Optional[str]):
+    """User's ledger, newest first, strictly after cursor (seeks idx_credit_ledger_user_timestamp)."""
+    query = select(CreditLedger).where(CreditLedger.user_id == user_id)
+    if cursor:
+        try:
+            timestamp, entry_id = decode_cursor(cursor, 2)
+            timestamp = parse_cursor_datetime(timestamp)
+            entry_id = uuid.UUID(entry_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if timestamp is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(or_(
+            CreditLedger.timestamp < timestamp,
+            and_(CreditLedger.timestamp == timestamp, CreditLedger.id < entry_id),
+        ))
+    return query.order_by(CreditLedger.timestamp.desc(), CreditLedger.id.desc())
+
+
+def _ledger_export_row(row) -> dict:
+    return {
+        "id": str(row.id),
+        "user_id": str(row.user_id),
+        "transaction_id": str(row.transaction_id),
+        "entry_type": row.entry_type,
+        "amount": float(row.amount),
+        "balance_before": float(row.balance_before),
+        "balance_after": float(row.balance_after),
+        "description": row.description,
+        "category": row.category,
+        "timestamp": row.timestamp,
+    }
+
+
+def _stream_ledger_export(
+    user_id: Optional[uuid.UUID],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    format: str
+) -> StreamingResponse:
+    """
+    Ledger entries oldest first on their own session, fetched in batches of
+    LEDGER_STREAM_BATCH (a server-side cursor on PostgreSQL), so memory stays
+    flat however long the history is and the request session is not held.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    query = select(*LEDGER_EXPORT_COLUMNS)
+    if user_id is not None:
+        query = query.where(CreditLedger.user_id == user_id)
+    if start is not None:
+        query = query.where(CreditLedger.timestamp >= start)
+    if end is not None:
+        query = query.where(CreditLedger.timestamp < end)
+    query = query.order_by(CreditLedger.timestamp, CreditLedger.id).execution_options(yield_per=LEDGER_STREAM_BATCH)
+
+    def rows():
+        db = SessionLocal()
+        try:
+            for row in db.execute(query):
+                yield _ledger_export_row(row)
+        finally:
+            db.close()
+
+    filename = f"credit-ledger-{user_id or 'all'}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "csv":
+        return StreamingResponse(csv_lines(rows(), LEDGER_EXPORT_FIELDS), media_type=CSV_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(ndjson_lines(rows()), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def _summary_first_page(summary, limit: int) -> Optional[list]:
+    """
+    First ledger page from the summary's recent entries, in the keyset order
+    (timestamp desc, id desc), or None if the summary cannot give it exactly.
+    Entries older than the summary's window are never newer than its oldest
+    timestamp, so the page is exact unless it reaches that timestamp (a batch
+    posted at one instant may straddle the window edge).
+    """
+    recent = sorted(
+        summary.recent_entries or [],
+        key=lambda entry: (datetime.fromisoformat(entry["timestamp"]), entry["id"]),
+        reverse=True
+    )
+    entries = recent[:limit]
+    if len(recent) >= summary.entry_count or (entries and entries[-1]["timestamp"] != recent[-1]["timestamp"]):
+        return entries
+    return None
+
+
+@router.get("/ledger/export")
+def export_credit_ledger(
+    user_id: Optional[str] = Query(None, description="Only this user's entries"),
+    start: Optional[datetime] = Query(None, description="Entries at or after this time"),
+    end: Optional[datetime] = Query(None, description="Entries before this time"),
+    format: str = Query("csv", description="csv or ndjson"),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Admin audit export of the credit ledger for a user and/or date range,
+    streamed oldest first as CSV or NDJSON.
+    """
+    parsed_user_id = None
+    if user_id:
+        try:
+            parsed_user_id = uuid.UUID(user_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid user_id")
+    return _stream_ledger_export(parsed_user_id, start, end, format)
+
+
 @router.get("/ledger/{user_id}", response_model=list[CreditLedgerResponse])
-async def get_credit_ledger(
+def get_credit_ledger(
     user_id: str,
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000, description="Entries per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
     db: Session = Depends(get_db)
 ):
     """
     Get credit ledger for user.
     Provides clear history log of all credit deductions and additions.
+    Newest first, keyset-paginated on (timestamp, id): when more entries exist
+    the X-Next-Cursor header carries the cursor for the next page.
+    A first page of up to LEDGER_SUMMARY_RECENT_ENTRIES comes from the user's
+    ledger summary row when its recent entries cover that page exactly.
     """
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    ledger_entries = db.query(CreditLedger).filter(
-        CreditLedger.user_id == user.id
-    ).order_by(
-        CreditLedger.timestamp.desc()
-    ).limit(limit).all()
+    if not cursor and limit <= settings.LEDGER_SUMMARY_RECENT_ENTRIES:
+        summary = get_ledger_summary(db, user.id)
+        entries = _summary_first_page(summary, limit)
+        if entries is not None:
+            if entries and summary.entry_count > limit:
+                response.headers[NEXT_CURSOR_HEADER] = encode_cursor(entries[-1]["timestamp"], entries[-1]["id"])
+            return [CreditLedgerResponse(**entry) for entry in entries]
     
-    return [CreditLedgerResponse.from_orm(entry) for entry in ledger_entries]
+    ledger_entries = db.execute(_ledger_page_query(user.id, cursor).limit(limit + 1)).scalars().all()
+    if len(ledger_entries) > limit:
+        ledger_entries = ledger_entries[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(ledger_entries[-1].timestamp, ledger_entries[-1].id)
+    
+    return [
+        CreditLedgerResponse(
+            id=str(entry.id),
+            entry_type=entry.entry_type,
+            amount=entry.amount,
+            balance_before=entry.balance_before,
+            balance_after=entry.balance_after,
+            description=entry.description,
+            category=entry.category,
+            timestamp=entry.timestamp
+        )
+        for entry in ledger_entries
+    ]
+
+
+@router.get("/ledger/{user_id}/export")
+def export_user_credit_ledger(
+    user_id: str,
+    start: Optional[datetime] = Query(None, description="Entries at or after this time"),
+    end: Optional[datetime] = Query(None, description="Entries before this time"),
+    format: str = Query("csv", description="csv or ndjson"),
+    db: Session = Depends(get_db)
+):
+    """User's full credit history (optionally a date range), streamed oldest first as CSV or NDJSON."""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return _stream_ledger_export(user.id, start, end, format)
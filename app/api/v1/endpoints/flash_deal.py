@@ -40,7 +40,7 @@ class FlashDealResponse(BaseModel):
 
 
 @router.post("/", response_model=FlashDealResponse)
-async def create_flash_deal(
+def create_flash_deal(
     payload: FlashDealCreate,
     db: Session = Depends(get_db),
 ):
@@ -80,7 +80,7 @@ async def create_flash_deal(
 
 
 @router.get("/active", response_model=List[FlashDealResponse])
-async def list_active_flash_deals(
+def list_active_flash_deals(
     db: Session = Depends(get_db),
 ):
     """List Flash Deals that have not yet expired (for map and feed)."""
@@ -6,6 +6,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Optional, List
 from app.core.database import get_db
+from app.core.geo import nearest_within
 from app.models.business import Business, BusinessStatus
 from app.models.post import Post
 from app.schemas.business import BusinessResponse, BusinessListResponse
@@ -15,7 +16,7 @@ router = APIRouter()
 
 
 @router.get("/businesses", response_model=BusinessListResponse)
-async def browse_businesses(
+def browse_businesses(
     latitude: Optional[float] = Query(None, description="User latitude"),
     longitude: Optional[float] = Query(None, description="User longitude"),
     radius_km: Optional[float] = Query(10, description="Search radius in kilometers"),
@@ -33,20 +34,14 @@ async def browse_businesses(
     if category:
         query = query.filter(Business.google_category == category)
     
-    # If location provided, filter by radius
-    if latitude and longitude:
-        # Simple radius filter (for production, use PostGIS for accurate distance)
-        businesses = query.all()
-        # Filter by approximate radius
-        filtered_businesses = []
-        for business in businesses:
-            if business.latitude and business.longitude:
-                # Calculate approximate distance (Haversine would be better)
-                distance = ((business.latitude - latitude) ** 2 + 
-                           (business.longitude - longitude) ** 2) ** 0.5 * 111  # Rough km conversion
-                if distance <= radius_km:
-                    filtered_businesses.append(business)
-        businesses = filtered_businesses
+    # If location provided, filter by radius (bounding box in SQL, exact Haversine distance)
+    if latitude is not None and longitude is not None:
+        businesses = [
+            business for business, _ in nearest_within(
+                query, Business.latitude, Business.longitude,
+                latitude, longitude, radius_km
+            )
+        ]
     else:
         businesses = query.limit(100).all()
     
@@ -57,7 +52,7 @@ async def browse_businesses(
 
 
 @router.get("/businesses/{business_id}", response_model=BusinessResponse)
-async def get_business_details(
+def get_business_details(
     business_id: str,
     db: Session = Depends(get_db)
 ):
@@ -73,7 +68,7 @@ async def get_business_details(
 
 
 @router.get("/posts", response_model=List[PostResponse])
-async def browse_posts(
+def browse_posts(
     latitude: Optional[float] = Query(None),
     longitude: Optional[float] = Query(None),
     radius_km: Optional[float] = Query(15),
@@ -110,7 +105,7 @@ async def browse_posts(
 
 
 @router.get("/posts/{post_id}", response_model=PostResponse)
-async def get_post_details(
+def get_post_details(
     post_id: str,
     db: Session = Depends(get_db)
 ):
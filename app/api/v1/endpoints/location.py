@@ -12,6 +12,8 @@ from sqlalchemy.orm import Session
 from typing import Optional
 from app.core.database import get_db
 from app.location_handler import LocationHandler, detect_user_location, update_location_realtime
+from app.core.location_filter import location_filter
+from app.core.location_buffer import location_buffer
 from app.schemas.location import LocationRequest, LocationResponse, NearbyUsersResponse
 from app.models.user import User
 from datetime import datetime
@@ -21,7 +23,7 @@ router = APIRouter()
 
 
 @router.post("/detect", response_model=LocationResponse)
-async def detect_location_on_entry(
+def detect_location_on_entry(
     request: LocationRequest,
     db: Session = Depends(get_db)
 ):
@@ -61,7 +63,8 @@ async def detect_location_on_entry(
             status=result["status"],
             should_appear_on_radar=result["should_appear_on_radar"],
             distance_moved_km=result.get("distance_moved_km"),
-            timestamp=result["timestamp"]
+            timestamp=result["timestamp"],
+            suppressed=result.get("suppressed")
         )
         
     except HTTPException:
@@ -72,7 +75,7 @@ async def detect_location_on_entry(
 
 
 @router.post("/update", response_model=LocationResponse)
-async def update_location_realtime(
+def update_location_realtime(
     request: LocationRequest,
     db: Session = Depends(get_db)
 ):
@@ -107,7 +110,8 @@ async def update_location_realtime(
             status=result["status"],
             should_appear_on_radar=result["should_appear_on_radar"],
             distance_moved_km=result.get("distance_moved_km"),
-            timestamp=result["timestamp"]
+            timestamp=result["timestamp"],
+            suppressed=result.get("suppressed")
         )
         
     except HTTPException:
@@ -118,7 +122,7 @@ async def update_location_realtime(
 
 
 @router.get("/user/{user_id}")
-async def get_user_location(
+def get_user_location(
     user_id: str,
     db: Session = Depends(get_db)
 ):
@@ -141,7 +145,7 @@ async def get_user_location(
 
 
 @router.get("/nearby", response_model=NearbyUsersResponse)
-async def get_nearby_users(
+def get_nearby_users(
     latitude: float = Query(..., description="Center latitude"),
     longitude: float = Query(..., description="Center longitude"),
     radius_km: float = Query(15.0, description="Search radius in kilometers"),
@@ -175,7 +179,7 @@ async def get_nearby_users(
 
 
 @router.post("/batch-update")
-async def batch_update_locations(
+def batch_update_locations(
     updates: list[LocationRequest] = Body(..., description="List of location updates"),
     db: Session = Depends(get_db)
 ):
@@ -206,3 +210,18 @@ async def batch_update_locations(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to batch update locations: {str(e)}")
+
+
+@router.get("/filter-stats")
+def get_location_filter_stats():
+    """
+    GPS update filter counters for this worker: accepted vs suppressed pings
+    (stationary / rate limited) and the active thresholds. Use to tune
+    LOCATION_MIN_MOVE_METERS, LOCATION_MIN_INTERVAL_SECONDS and the rate limit.
+    """
+    return {
+        **location_filter.stats(),
+        "buffered_locations": len(location_buffer),
+        "flushed_locations": location_buffer.flushed_total,
+        "timestamp": datetime.utcnow().isoformat()
+    }
@@ -34,7 +34,7 @@ class MapBusinessesResponse(BaseModel):
 
 
 @router.get("/vip-businesses", response_model=MapBusinessesResponse)
-async def get_vip_businesses_for_map(
+def get_vip_businesses_for_map(
     latitude: Optional[float] = Query(None),
     longitude: Optional[float] = Query(None),
     radius_km: Optional[float] = Query(50, description="Radius to include businesses"),
@@ -95,7 +95,7 @@ class MapPinOut(BaseModel):
 
 
 @router.get("/pins", response_model=List[MapPinOut])
-async def get_map_pins(db: Session = Depends(get_db)):
+def get_map_pins(db: Session = Depends(get_db)):
     """
     Returns all admin-added store pins for the map. No Places API.
     All users see the same pins; add pins via Admin Panel (paste coordinates/URL).
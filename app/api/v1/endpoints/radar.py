@@ -9,51 +9,40 @@ Complete implementation with:
 - WebSocket integration
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, Body, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, and_
 from typing import Optional, List
 from datetime import datetime, timedelta
 import asyncio
-import math
 from app.core.database import get_db
 from app.models.user import User, UserStatus
 from app.schemas.radar import RadarUserResponse, RadarResponse
 from app.core.websocket import websocket_manager
+from app.core.radar_index import radar_index, RadarEntry, is_silent_decayed
+from app.core.location_buffer import location_buffer
+from app.core.location_filter import location_filter
+from app.core.geo import haversine_km, nearest_within
 from app.core.config import settings
 
 router = APIRouter()
 
+DEFAULT_RADAR_RADIUS_KM = 15.0
+
 
 def calculate_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calculate distance between two coordinates using Haversine formula.
     Returns distance in kilometers.
     """
-    # Earth radius in kilometers
-    R = 6371.0
-    
-    # Convert to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    # Haversine formula
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    distance = R * c
-    return distance
+    return haversine_km(lat1, lon1, lat2, lon2)
 
 
 @router.get("/users", response_model=RadarResponse)
-async def get_radar_users(
+def get_radar_users(
     latitude: Optional[float] = Query(None, description="User latitude"),
     longitude: Optional[float] = Query(None, description="User longitude"),
-    radius_km: Optional[float] = Query(15, description="Search radius in kilometers"),
+    radius_km: Optional[float] = Query(DEFAULT_RADAR_RADIUS_KM, description="Search radius in kilometers"),
     db: Session = Depends(get_db)
 ):
     """
@@ -63,7 +52,23 @@ async def get_radar_users(
     - Users appear ONLY if status="online" OR (status="offline" AND credit_balance > 0.00)
     - Users with status="offline" AND credit_balance=0.00 are instantly removed
     - Uses WebSocket for real-time synchronization
+    
+    Served from the in-memory radar spatial index when it is warm; otherwise
+    falls back to SQL (bounding-box prefilter when a location is given).
     """
+    if radius_km is None:
+        radius_km = DEFAULT_RADAR_RADIUS_KM
+    if radar_index.is_warm:
+        if latitude is not None and longitude is not None:
+            entries = [entry for entry, _ in radar_index.query_radius(latitude, longitude, radius_km)]
+        else:
+            entries = radar_index.all_entries()
+        return RadarResponse(
+            users=[RadarUserResponse(**entry.to_dict()) for entry in entries],
+            total=len(entries),
+            timestamp=datetime.utcnow().isoformat()
+        )
+    
     # Apply Silent Decay Logic filter
     # Only show: (status=online) OR (status=offline AND balance > 0)
     query = db.query(User).filter(
@@ -80,39 +85,28 @@ async def get_radar_users(
         User.longitude.isnot(None)
     )
     
-    users = query.all()
-    
-    # Filter by radius if location provided
-    radar_users = []
-    if latitude and longitude:
-        for user in users:
-            if user.latitude and user.longitude:
-                distance = calculate_distance_km(
-                    latitude, longitude,
-                    user.latitude, user.longitude
-                )
-                if distance <= radius_km:
-                    radar_users.append(user)
+    if latitude is not None and longitude is not None:
+        # Bounding box in SQL, vectorized distance scoring, nearest first
+        filtered_users = [
+            user for user, _ in nearest_within(
+                query, User.latitude, User.longitude,
+                latitude, longitude, radius_km
+            )
+        ]
     else:
-        radar_users = users
-    
-    # Apply Silent Decay: Double-check and remove any zero-balance offline users
-    filtered_users = []
-    for user in radar_users:
-        if user.status == UserStatus.OFFLINE and user.credit_balance == 0.00:
-            # Silent Decay: Skip this user (should not appear)
-            continue
-        filtered_users.append(user)
+        filtered_users = query.all()
+        # Full visible set already loaded: use it to warm the index
+        radar_index.load(filtered_users)
     
     return RadarResponse(
-        users=[RadarUserResponse.from_orm(u) for u in filtered_users],
+        users=[RadarUserResponse(**RadarEntry.from_user(u).to_dict()) for u in filtered_users],
         total=len(filtered_users),
         timestamp=datetime.utcnow().isoformat()
     )
 
 
 @router.post("/update-location")
-async def update_user_location(
+def update_user_location(
     user_id: str = Body(..., description="User ID"),
     latitude: float = Body(..., description="Latitude"),
     longitude: float = Body(..., description="Longitude"),
@@ -153,6 +147,38 @@ async def update_user_location(
         raise HTTPException(status_code=500, detail=f"Failed to update location: {str(e)}")
 
 
+def _store_status(db: Session, user_id: str, status: str):
+    """
+    Blocking part of a status update (run in the threadpool).
+    Returns (user id, user, silent decay applied); the user is refreshed unless decayed.
+    """
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Validate status
+    try:
+        new_status = UserStatus(status.lower())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid status: {status}. Must be: online, offline, or invisible")
+    
+    user_key = str(user.id)
+    user.status = new_status
+    user.last_seen = datetime.utcnow()
+    if new_status == UserStatus.OFFLINE:
+        # A buffered GPS ping must not flip the user back online on flush
+        location_buffer.cancel_online(user_key)
+    location_filter.forget(user_key)
+    
+    # Apply Silent Decay Logic
+    decayed = is_silent_decayed(new_status, user.credit_balance, user.is_invisible)
+    db.commit()
+    if not decayed:
+        db.refresh(user)
+        radar_index.upsert_user(user)
+    return user_key, user, decayed
+
+
 @router.post("/update-status")
 async def update_user_status(
     user_id: str = Body(..., description="User ID"),
@@ -168,27 +194,11 @@ async def update_user_status(
     - Broadcast removal to all connected WebSocket clients
     """
     try:
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Validate status
-        try:
-            new_status = UserStatus(status.lower())
-        except ValueError:
-            raise HTTPException(status_code=400, detail=f"Invalid status: {status}. Must be: online, offline, or invisible")
-        
-        old_status = user.status
-        user.status = new_status
-        user.last_seen = datetime.utcnow()
+        user_key, user, decayed = await run_in_threadpool(_store_status, db, user_id, status)
         
-        # Apply Silent Decay Logic
-        if new_status == UserStatus.OFFLINE and user.credit_balance == 0.00:
-            # Silent Decay: User should be removed from radar
-            db.commit()
-            
-            # Broadcast removal via WebSocket
-            await websocket_manager.remove_from_radar(str(user.id))
+        if decayed:
+            # Silent Decay: Broadcast removal via WebSocket (also drops the user from the radar index)
+            await websocket_manager.remove_from_radar(user_key)
             
             return {
                 "success": True,
@@ -198,12 +208,8 @@ async def update_user_status(
                 "should_appear_on_radar": False
             }
         else:
-            # User stays on radar (either online or offline with credits > 0)
-            db.commit()
-            db.refresh(user)
-            
-            # Broadcast status change
-            await websocket_manager.broadcast_user_status(str(user.id), status)
+            # User stays on radar (either online or offline with credits > 0): broadcast status change
+            await websocket_manager.broadcast_user_status(user_key, status)
             
             return {
                 "success": True,
@@ -225,27 +231,20 @@ async def trigger_silent_decay_check(
 ):
     """
     Manual trigger for Silent Decay Logic check.
-    Scans all users and removes offline users with 0 credits.
+    Reconciles offline users with 0 credits against the removals already
+    broadcast, and removes only the ones not yet announced.
     
     This is also run automatically via background task.
     """
     try:
-        # Find all offline users with zero balance
-        offline_zero_balance_users = db.query(User).filter(
-            User.status == UserStatus.OFFLINE,
-            User.credit_balance == 0.00,
-            User.is_invisible == False
-        ).all()
-        
-        removed_count = 0
-        for user in offline_zero_balance_users:
-            # Remove from radar via WebSocket
-            await websocket_manager.remove_from_radar(str(user.id))
-            removed_count += 1
+        result = await websocket_manager.reconcile_silent_decay(db)
+        removed_count = result["removed_count"]
         
         return {
             "success": True,
             "removed_count": removed_count,
+            "restored_count": result["restored_count"],
+            "decayed_total": result["decayed_total"],
             "message": f"Silent Decay Logic applied: {removed_count} users removed from radar"
         }
     except Exception as e:
@@ -253,7 +252,7 @@ async def trigger_silent_decay_check(
 
 
 @router.get("/stats")
-async def get_radar_stats(
+def get_radar_stats(
     db: Session = Depends(get_db)
 ):
     """
@@ -7,7 +7,8 @@ Endpoints for:
 2. Automatic withdrawal processing
 3. Wallet balance queries
 """
-from fastapi import APIRouter, Depends, HTTPException, Body, Query
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
 from app.core.database import get_db
@@ -18,11 +19,30 @@ from app.wallet_finance import (
     credits_to_usdt_value
 )
 from app.models.user import User
+from app.services.bybit_client import request_id_for
+from app.services.idempotency import StoredFailure, UnsettledFailure, run_idempotent
 import uuid
 
 router = APIRouter()
 
 
+def _balance_snapshot(handler: WalletFinanceHandler, user_id: str):
+    """USDT balance, user and threshold check for the balance endpoint (blocking)."""
+    # Get USDT balance
+    usdt_balance = handler.get_user_usdt_balance(user_id)
+    if usdt_balance is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Get user for credits
+    user_uuid = uuid.UUID(user_id)
+    user = handler.db.query(User).filter(User.id == user_uuid).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Check withdrawal threshold
+    return usdt_balance, user, handler.check_withdrawal_threshold(user_id)
+
+
 @router.get("/balance/{user_id}")
 async def get_wallet_balance(
     user_id: str,
@@ -34,20 +54,8 @@ async def get_wallet_balance(
     """
     try:
         handler = WalletFinanceHandler(db)
-        
-        # Get USDT balance
-        usdt_balance = handler.get_user_usdt_balance(user_id)
-        if usdt_balance is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Get user for credits
-        user_uuid = uuid.UUID(user_id)
-        user = db.query(User).filter(User.id == user_uuid).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Check withdrawal threshold
-        threshold_check = handler.check_withdrawal_threshold(user_id)
+        # Blocking ORM work in the threadpool; the payout itself is async
+        usdt_balance, user, threshold_check = await run_in_threadpool(_balance_snapshot, handler, user_id)
         
         # Auto-process withdrawal if eligible
         withdrawal_result = None
@@ -71,39 +79,66 @@ async def get_wallet_balance(
         raise HTTPException(status_code=500, detail=f"Failed to get wallet balance: {str(e)}")
 
 
+def _withdraw_response(result: dict) -> dict:
+    """Response for a withdraw_to_bybit result; failures raised the way run_idempotent stores them."""
+    if not result.get("success"):
+        error = result.get("error", "Withdrawal failed")
+        # Results carry bybit_request_id once the debit committed: from then on
+        # a retry must not withdraw again, so the key is not released
+        if result.get("pending"):
+            raise UnsettledFailure(status_code=400, detail=error)
+        if result.get("bybit_request_id"):
+            raise StoredFailure(status_code=400, detail=error)
+        raise HTTPException(status_code=400, detail=error)
+    return result
+
+
 @router.post("/withdraw")
 async def manual_withdraw(
     user_id: str = Body(..., description="User ID"),
     amount_usdt: float = Body(..., description="Amount to withdraw in USDT"),
     force: bool = Body(False, description="Force withdrawal even if below threshold"),
+    idempotency_key: Optional[str] = Header(None, description="Retries with the same key replay the first response"),
     db: Session = Depends(get_db)
 ):
     """
     Manual withdrawal request to Bybit wallet.
     For automatic withdrawals, use the balance endpoint which auto-processes at $50.
+    Send an Idempotency-Key header so a retried request never withdraws twice.
     """
-    try:
+    # Retries with the same key reuse the Bybit requestId (at most one payout)
+    request_id = request_id_for(user_id, idempotency_key) if idempotency_key else None
+    
+    async def withdraw() -> dict:
         handler = WalletFinanceHandler(db)
         result = await handler.withdraw_to_bybit(
             user_id=user_id,
             amount_usdt=amount_usdt,
-            force=force
+            force=force,
+            request_id=request_id
         )
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=400, detail=result.get("error", "Withdrawal failed"))
-        
-        return result
-        
+        return _withdraw_response(result)
+    
+    async def settled() -> Optional[dict]:
+        # Key still reserved: replay the withdrawal once reconciliation settled it
+        state = await run_in_threadpool(WalletFinanceHandler(db).get_withdrawal_state, request_id)
+        if state is None or state.get("pending"):
+            return None
+        return _withdraw_response(state)
+
+    try:
+        payload = {"user_id": user_id, "amount_usdt": amount_usdt, "force": force}
+        return await run_idempotent(db, "wallet_withdraw", idempotency_key, payload, withdraw, settled)
+
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await run_in_threadpool(db.rollback)
         raise HTTPException(status_code=500, detail=f"Failed to process withdrawal: {str(e)}")
 
 
 @router.get("/withdrawal-history/{user_id}")
-async def get_withdrawal_history(
+def get_withdrawal_history(
     user_id: str,
     limit: int = Query(50, description="Maximum number of records"),
     db: Session = Depends(get_db)
@@ -124,7 +159,7 @@ async def get_withdrawal_history(
 
 
 @router.get("/convert/credits-to-usdt")
-async def convert_credits_to_usdt(
+def convert_credits_to_usdt(
     credits: float = Query(..., description="Number of credits (Habbet)"),
     db: Session = Depends(get_db)
 ):
@@ -144,7 +179,7 @@ async def convert_credits_to_usdt(
 
 
 @router.get("/convert/usdt-to-credits")
-async def convert_usdt_to_credits(
+def convert_usdt_to_credits(
     usdt: float = Query(..., description="USDT amount"),
     db: Session = Depends(get_db)
 ):
@@ -164,7 +199,7 @@ async def convert_usdt_to_credits(
 
 
 @router.post("/check-threshold/{user_id}")
-async def check_withdrawal_threshold(
+def check_withdrawal_threshold(
     user_id: str,
     db: Session = Depends(get_db)
 ):
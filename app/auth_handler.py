@@ -17,15 +17,21 @@ Architecture:
 
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 import uuid
 from app.models.user import User, UserRole, UserStatus
-from app.models.credit import CreditTransaction, CreditTransactionType, CreditLedger
+from app.models.credit import CreditTransaction, CreditTransactionType
 from app.core.config import settings
 from app.core.websocket import websocket_manager
+from app.core.radar_index import radar_index
+from app.services.credit_posting import Posting, post_credits
+from app.services.idempotency import add_record, is_recorded, remember, response_cache, welcome_reward_key
 from fastapi import HTTPException
 
+ALREADY_CLAIMED_DETAIL = "You have already claimed your welcome reward! Check your wallet."
+
 
 class AuthHandler:
     """
@@ -165,23 +171,14 @@ class AuthHandler:
         if not user.referral_code:
             user.referral_code = ("R" + str(user.id).replace("-", "")[:8]).upper()
         
-        # Step 2: Check if user already claimed (prevent duplicate claims)
-        # Allow one claim per user (unless it's a business-specific claim)
+        # Step 2: Allow one welcome reward per user (business claims are separate).
+        # Its implicit idempotency key is inserted with the posting, so a repeated
+        # or concurrent claim fails at commit; repeats this worker has seen fail here.
+        welcome_key = None
         if not business_id:
-            # Check if user already has credits from a previous claim
-            existing_claim = self.db.query(CreditTransaction).filter(
-                and_(
-                    CreditTransaction.user_id == user.id,
-                    CreditTransaction.transaction_type == CreditTransactionType.CLAIM_REWARD,
-                    CreditTransaction.reference_type.is_(None)  # General claim (not business-specific)
-                )
-            ).first()
-            
-            if existing_claim:
-                raise HTTPException(
-                    status_code=400,
-                    detail="You have already claimed your welcome reward! Check your wallet."
-                )
+            welcome_key = welcome_reward_key(user.id)
+            if response_cache.get(welcome_key) is not None:
+                raise HTTPException(status_code=400, detail=ALREADY_CLAIMED_DETAIL)
         
         # Step 3: Convert Guest to Active Member
         is_new_member = False
@@ -190,11 +187,6 @@ class AuthHandler:
             user.is_guest = False
             is_new_member = True
         
-        # Step 4: Award 20 Credits (Habbet) [cite: 2026-02-03]
-        balance_before = user.credit_balance
-        user.credit_balance += self.CLAIM_REWARD_AMOUNT
-        balance_after = user.credit_balance
-        
         # Step 5: Set Royal Hospitality Period (30 days free service)
         claim_date = datetime.utcnow()
         if not user.claim_date:  # Only set if not already set
@@ -211,7 +203,7 @@ class AuthHandler:
             user.longitude = longitude
             user.last_location_update = claim_date
         
-        # Step 7: Create credit transaction record
+        # Step 7: Award 20 Credits (Habbet) [cite: 2026-02-03] with transaction and ledger entries
         reference_id = None
         if business_id:
             try:
@@ -219,85 +211,74 @@ class AuthHandler:
             except ValueError:
                 pass  # Invalid UUID, ignore
         
-        transaction = CreditTransaction(
-            user_id=user.id,
-            transaction_type=CreditTransactionType.CLAIM_REWARD,
-            amount=self.CLAIM_REWARD_AMOUNT,
-            reference_id=reference_id,
-            reference_type="business" if business_id else "welcome_reward",
+        postings = [Posting(
+            user.id,
+            self.CLAIM_REWARD_AMOUNT,
+            CreditTransactionType.CLAIM_REWARD,
             description=f"🎉 Welcome Reward - {self.CLAIM_REWARD_AMOUNT} Habbet credited" + 
                        (f" (Business Claim)" if business_id else ""),
-            balance_after=balance_after
-        )
-        self.db.add(transaction)
-        self.db.flush()  # Get transaction.id
-        
-        # Step 8: Create ledger entry for full history
-        ledger_entry = CreditLedger(
-            user_id=user.id,
-            transaction_id=transaction.id,
-            entry_type="credit",
-            amount=self.CLAIM_REWARD_AMOUNT,
-            balance_before=balance_before,
-            balance_after=balance_after,
-            description=f"🎉 Claimed Welcome Reward - Awarded {self.CLAIM_REWARD_AMOUNT} Habbet (حبّات)",
-            category="reward"
-        )
-        self.db.add(ledger_entry)
+            ledger_description=f"🎉 Claimed Welcome Reward - Awarded {self.CLAIM_REWARD_AMOUNT} Habbet (حبّات)",
+            category="reward",
+            reference_id=reference_id,
+            reference_type="business" if business_id else "welcome_reward",
+        )]
         
-        # Step 8b: Viral Gateway - award 5 Habbet to referrer when new member claims with ?ref=
+        # Step 8: Viral Gateway - award 5 Habbet to referrer when new member claims with ?ref=
+        referrer = None
         if referral_code and is_new_member:
             ref_code = (referral_code or "").strip().upper()
             if ref_code:
                 referrer = self.db.query(User).filter(User.referral_code == ref_code).first()
                 if referrer and referrer.id != user.id:
                     user.referred_by_id = referrer.id
-                    r_before = referrer.credit_balance
-                    referrer.credit_balance += self.REFERRAL_REWARD_AMOUNT
-                    r_after = referrer.credit_balance
-                    ref_tx = CreditTransaction(
-                        user_id=referrer.id,
-                        transaction_type=CreditTransactionType.REFERRAL_REWARD,
-                        amount=self.REFERRAL_REWARD_AMOUNT,
-                        reference_id=user.id,
-                        reference_type="referral",
+                    postings.append(Posting(
+                        referrer.id,
+                        self.REFERRAL_REWARD_AMOUNT,
+                        CreditTransactionType.REFERRAL_REWARD,
                         description=f"🎁 Referral bonus: new member claimed (+{self.REFERRAL_REWARD_AMOUNT} Habbet)",
-                        balance_after=r_after,
-                    )
-                    self.db.add(ref_tx)
-                    self.db.flush()
-                    self.db.add(CreditLedger(
-                        user_id=referrer.id,
-                        transaction_id=ref_tx.id,
-                        entry_type="credit",
-                        amount=self.REFERRAL_REWARD_AMOUNT,
-                        balance_before=r_before,
-                        balance_after=r_after,
-                        description=f"🎁 Referral reward: +{self.REFERRAL_REWARD_AMOUNT} Habbet",
+                        ledger_description=f"🎁 Referral reward: +{self.REFERRAL_REWARD_AMOUNT} Habbet",
                         category="referral",
+                        reference_id=user.id,
+                        reference_type="referral",
                     ))
         
-        # Step 9: Commit all changes
-        self.db.commit()
+        try:
+            # Balances change in SQL (one UPDATE for claimer and referrer), rows inserted in bulk
+            claim_posting = post_credits(self.db, postings)[0]
+            
+            result = {
+                "success": True,
+                "message": f"🎉 Welcome! {self.CLAIM_REWARD_AMOUNT} Habbet (حبّات) credited to your wallet. Enjoy 30 days of free service!",
+                "user_id": str(user.id),
+                "credit_balance": float(user.credit_balance),
+                "royal_hospitality_end_date": user.royal_hospitality_end_date.isoformat() if user.royal_hospitality_end_date else None,
+                "is_new_member": is_new_member,
+                "transaction_id": str(claim_posting.transaction_id),
+                "business_id": business_id,
+                "referral_code": user.referral_code,
+            }
+            if welcome_key:
+                add_record(self.db, welcome_key, result)
+            
+            # Step 9: Commit all changes (the welcome key is unique: a second claim rolls back here)
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            if welcome_key and is_recorded(self.db, welcome_key):
+                raise HTTPException(status_code=400, detail=ALREADY_CLAIMED_DETAIL)
+            raise
+        if welcome_key:
+            remember(welcome_key, result)
         self.db.refresh(user)
-        self.db.refresh(transaction)
-        self.db.refresh(ledger_entry)
+        radar_index.upsert_user(user)
+        if referrer is not None and referrer.id != user.id:
+            radar_index.upsert_user(referrer)
         
         # Step 10: Broadcast user status update via WebSocket (for real-time radar)
         # Note: WebSocket broadcast should be handled by the calling endpoint
         # This keeps the handler synchronous and easier to test
         
-        return {
-            "success": True,
-            "message": f"🎉 Welcome! {self.CLAIM_REWARD_AMOUNT} Habbet (حبّات) credited to your wallet. Enjoy 30 days of free service!",
-            "user_id": str(user.id),
-            "credit_balance": float(user.credit_balance),
-            "royal_hospitality_end_date": user.royal_hospitality_end_date.isoformat() if user.royal_hospitality_end_date else None,
-            "is_new_member": is_new_member,
-            "transaction_id": str(transaction.id),
-            "business_id": business_id,
-            "referral_code": user.referral_code,
-        }
+        return result
     
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """
@@ -351,15 +332,7 @@ class AuthHandler:
         """
         Check if user has already claimed the welcome reward.
         """
-        claim_exists = self.db.query(CreditTransaction).filter(
-            and_(
-                CreditTransaction.user_id == user.id,
-                CreditTransaction.transaction_type == CreditTransactionType.CLAIM_REWARD,
-                CreditTransaction.reference_type.is_(None)  # General claim
-            )
-        ).first()
-        
-        return claim_exists is not None
+        return is_recorded(self.db, welcome_reward_key(user.id))
 
 
 # Global helper functions for easy access
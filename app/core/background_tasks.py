@@ -1,204 +1,198 @@
 """
 BILI Master System - Background Tasks
 Silent Decay monitoring and cleanup tasks
+
+Each task is one run of a job registered with the scheduler (app/core/scheduler.py).
+Cluster-wide jobs run on exactly one worker; per-worker jobs run in every process.
 """
 import asyncio
-from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
 from app.core.database import SessionLocal
-from app.models.user import User, UserStatus
 from app.core.websocket import websocket_manager
+from app.core.radar_index import radar_index
+from app.core.location_buffer import location_buffer
 from app.core.config import settings
-from app.models.post import Post
-from app.models.chat import Chat
-from app.models.manual_map_pin import ManualMapPin
-from app.wallet_finance import WalletFinanceHandler
-from app.services.pin_content_refresh import refresh_pin_content
-from sqlalchemy import or_, and_
+from app.core import retention
+from app.core.scheduler import scheduler
+from app.wallet_finance import process_eligible_withdrawals, reconcile_pending_withdrawals
+from app.services.pin_content_refresh import refresh_due_pins
 
 
 async def silent_decay_monitor():
     """
-    Background task: Monitor and apply Silent Decay Logic
-    Runs every 30 seconds to remove offline users with 0 credits
-    """
-    while True:
-        try:
-            await asyncio.sleep(30)  # Check every 30 seconds
-            
-            if SessionLocal is None:
-                continue
-            db = SessionLocal()
-            try:
-                # Find all offline users with zero balance
-                offline_zero_users = db.query(User).filter(
-                    User.status == UserStatus.OFFLINE,
-                    User.credit_balance == 0.00,
-                    User.is_invisible == False
-                ).all()
-                
-                for user in offline_zero_users:
-                    # Remove from radar via WebSocket
-                    await websocket_manager.remove_from_radar(str(user.id))
-                    
-            finally:
-                db.close()
-                
-        except Exception as e:
-            print(f"Error in Silent Decay monitor: {e}")
+    Background task: Reconcile Silent Decay Logic
+    Removals are broadcast when users transition (offline / balance reaches 0.00);
+    every 30 seconds this only announces users that decayed through an unhooked
+    path. Runs on one worker; removals reach the other workers' sockets through
+    the radar backplane. The first run on a worker records the current set
+    without broadcasting.
+    """
+    if SessionLocal is None:
+        return
+    db = SessionLocal()
+    try:
+        # The id query runs in the threadpool (see reconcile_silent_decay)
+        await websocket_manager.reconcile_silent_decay(db, announce=websocket_manager.silent_decay.seeded)
+    finally:
+        # Returning the connection to the pool rolls back: a round trip too
+        await run_in_threadpool(db.close)
+
+
+async def radar_index_refresher():
+    """
+    Background task: Keep the in-memory radar spatial index warm (per worker).
+    Reloads the Silent Decay-visible user set whenever the index goes cold
+    (first start, or after RADAR_INDEX_MAX_AGE_SECONDS).
+    """
+    if SessionLocal is None or radar_index.is_warm:
+        return
+    db = SessionLocal()
+    try:
+        await run_in_threadpool(radar_index.reload, db)
+    finally:
+        db.close()
+
+
+async def location_buffer_flusher():
+    """
+    Background task: Write buffered GPS positions to the database.
+    One bulk UPDATE every LOCATION_FLUSH_INTERVAL_MS (per worker), in the threadpool.
+    """
+    await run_in_threadpool(location_buffer.flush)
 
 
 async def expire_posts():
     """
     Background task: Expire commercial posts after 48 hours
+    and purge expired flash deals and idempotency keys (chunked bulk statements)
     """
-    while True:
-        try:
-            await asyncio.sleep(3600)  # Check every hour
-            
-            if SessionLocal is None:
-                continue
-            db = SessionLocal()
-            try:
-                expired_posts = db.query(Post).filter(
-                    Post.is_expired == False,
-                    Post.expires_at.isnot(None),
-                    Post.expires_at < datetime.utcnow()
-                ).all()
-                
-                for post in expired_posts:
-                    post.is_expired = True
-                    post.is_active = False
-                
-                db.commit()
-            finally:
-                db.close()
-                
-        except Exception as e:
-            print(f"Error in post expiration: {e}")
+    if SessionLocal is None:
+        return
+    report = await run_in_threadpool(_expire_posts_sync)
+    print(f"Retention: {retention.format_report(report)}")
+
+
+def _expire_posts_sync() -> dict:
+    db = SessionLocal()
+    try:
+        report = retention.expire_posts(db)
+        report.update(retention.purge_flash_deals(db))
+        report.update(retention.purge_idempotency_keys(db))
+        return report
+    finally:
+        db.close()
 
 
 async def cleanup_chats():
     """
     Background task: Auto-delete chats after 30-day retention period
+    (chunked bulk statements)
     """
-    while True:
-        try:
-            await asyncio.sleep(86400)  # Check daily
-            
-            if SessionLocal is None:
-                continue
-            db = SessionLocal()
-            try:
-                expired_chats = db.query(Chat).filter(
-                    Chat.expires_at < datetime.utcnow(),
-                    Chat.status != "deleted"
-                ).all()
-                
-                for chat in expired_chats:
-                    chat.status = "deleted"
-                    chat.deleted_at = datetime.utcnow()
-                    # Delete associated messages
-                    for message in chat.messages:
-                        db.delete(message)
-                
-                db.commit()
-            finally:
-                db.close()
-                
-        except Exception as e:
-            print(f"Error in chat cleanup: {e}")
+    if SessionLocal is None:
+        return
+    report = await run_in_threadpool(_cleanup_chats_sync)
+    print(f"Retention: {retention.format_report(report)}")
+
+
+def _cleanup_chats_sync() -> dict:
+    db = SessionLocal()
+    try:
+        return retention.purge_chats(db)
+    finally:
+        db.close()
 
 
 async def automatic_withdrawal_monitor():
     """
     Background task: Monitor user balances and process automatic withdrawals
     when balance reaches $50 threshold [cite: 2026-02-03]
-    Runs every 5 minutes to check eligible users
-    """
-    while True:
-        try:
-            await asyncio.sleep(300)  # Check every 5 minutes
-            
-            if SessionLocal is None:
-                continue
-            db = SessionLocal()
-            try:
-                handler = WalletFinanceHandler(db)
-                
-                # Get all users with credit balance > 0
-                users_with_credits = db.query(User).filter(
-                    User.credit_balance > 0.00
-                ).all()
-                
-                processed_count = 0
-                for user in users_with_credits:
-                    try:
-                        # Check if eligible for withdrawal
-                        threshold_check = handler.check_withdrawal_threshold(str(user.id))
-                        
-                        if threshold_check.get("eligible_for_withdrawal"):
-                            # Process automatic withdrawal
-                            result = await handler.process_automatic_withdrawal(str(user.id))
-                            if result.get("success"):
-                                processed_count += 1
-                                print(f"Automatic withdrawal processed for user {user.id}: {result.get('amount_usdt')} USDT")
-                    except Exception as e:
-                        print(f"Error processing withdrawal for user {user.id}: {e}")
-                        continue
-                
-                if processed_count > 0:
-                    print(f"Automatic withdrawal monitor: Processed {processed_count} withdrawals")
-                    
-            finally:
-                db.close()
-                
-        except Exception as e:
-            print(f"Error in automatic withdrawal monitor: {e}")
+    Runs every 5 minutes; only eligible users are read (AUTO_SWEEP_CONCURRENCY payouts at a time)
+    """
+    if SessionLocal is None:
+        return
+    # Eligibility decided in SQL; payouts run with bounded concurrency
+    result = await process_eligible_withdrawals()
+
+    if result["processed"] > 0:
+        print(f"Automatic withdrawal monitor: Processed {result['processed']} withdrawals")
+
+
+async def reconcile_withdrawals():
+    """
+    Background task: Settle withdrawals whose Bybit outcome was unknown
+    (timeouts, 5xx after retries) from Bybit's record of their requestId.
+    Their credits stay reserved until then.
+    """
+    if SessionLocal is None:
+        return
+    counts = await reconcile_pending_withdrawals()
+    if counts["checked"]:
+        print(
+            f"Withdrawal reconciliation: {counts['checked']} checked, {counts['completed']} completed, "
+            f"{counts['refunded']} refunded, {counts['pending']} still pending"
+        )
 
 
 async def refresh_store_pins_content():
     """
     Background task: Refresh latest video/post content for all pins with a profile URL.
-    Runs every 30 minutes so pins stay fresh without manual updates.
-    """
-    while True:
-        try:
-            await asyncio.sleep(1800)  # 30 minutes
-            if SessionLocal is None:
-                continue
-            db = SessionLocal()
-            try:
-                pins = db.query(ManualMapPin).filter(ManualMapPin.profile_url.isnot(None)).all()
-                for pin in pins:
-                    try:
-                        if refresh_pin_content(pin):
-                            db.commit()
-                    except Exception as e:
-                        print(f"Error refreshing pin {pin.id}: {e}")
-                        db.rollback()
-            finally:
-                db.close()
-        except Exception as e:
-            print(f"Error in store pins refresh: {e}")
+    Runs every 30 minutes so pins stay fresh without manual updates
+    (concurrent conditional fetches, failing pins back off, one bulk write).
+    """
+    if SessionLocal is None:
+        return
+    db = SessionLocal()
+    try:
+        report = await refresh_due_pins(db)
+        if report["checked"]:
+            print(
+                f"Store pins refresh: {report['checked']} checked, {report['updated']} updated, "
+                f"{report['not_modified']} not modified, {report['failed']} failed in {report['duration_ms']}ms"
+            )
+    finally:
+        db.close()
+
+
+def register_jobs():
+    """Register every background task with the scheduler"""
+    # Cluster-wide: exactly one worker runs each of these per interval
+    scheduler.register("silent_decay", silent_decay_monitor, interval_seconds=30, jitter_seconds=5)
+    scheduler.register("expire_posts", expire_posts, interval_seconds=3600, jitter_seconds=60)
+    scheduler.register("cleanup_chats", cleanup_chats, interval_seconds=86400, jitter_seconds=300, lease_seconds=3600)
+    scheduler.register(
+        "automatic_withdrawals", automatic_withdrawal_monitor,
+        interval_seconds=300, jitter_seconds=30, lease_seconds=900
+    )
+    scheduler.register(
+        "withdrawal_reconcile", reconcile_withdrawals,
+        interval_seconds=300, jitter_seconds=30, lease_seconds=900
+    )
+    scheduler.register(
+        "store_pins_refresh", refresh_store_pins_content,
+        interval_seconds=1800, jitter_seconds=120, lease_seconds=900
+    )
+    # Per worker: these maintain this process's in-memory state
+    scheduler.register(
+        "radar_index_refresh", radar_index_refresher,
+        interval_seconds=max(1.0, settings.RADAR_INDEX_MAX_AGE_SECONDS / 10), exclusive=False
+    )
+    scheduler.register(
+        "location_buffer_flush", location_buffer_flusher,
+        interval_seconds=location_buffer.flush_interval_seconds, exclusive=False
+    )
 
 
 def start_background_tasks():
     """Start all background tasks"""
+    if not scheduler.jobs:
+        register_jobs()
     try:
         loop = asyncio.get_event_loop()
     except RuntimeError:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-    
+
     if not loop.is_running():
-        loop.create_task(silent_decay_monitor())
-        loop.create_task(expire_posts())
-        loop.create_task(cleanup_chats())
-        loop.create_task(automatic_withdrawal_monitor())
-        loop.create_task(refresh_store_pins_content())
+        scheduler.start(loop)
     else:
-        asyncio.create_task(silent_decay_monitor())
-        asyncio.create_task(expire_posts())
-        asyncio.create_task(cleanup_chats())
-        asyncio.create_task(automatic_withdrawal_monitor())
-        asyncio.create_task(refresh_store_pins_content())
+        scheduler.start()
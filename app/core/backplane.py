@@ -0,0 +1,151 @@
+"""
+BILI Master System - Radar WebSocket Backplane
+Fans radar events out across uvicorn workers and instances [cite: 2026-01-09]
+
+Each worker only holds its own sockets. Radar events (location batches, status
+changes, Silent Decay removals) are delivered locally first and then published
+on the backplane, so the other workers can deliver them to their sockets too.
+
+- Backplane: the interface used by WebSocketManager
+- InProcessBackplane: default for a single worker; nothing to forward
+- RedisBackplane: Redis pub/sub (RADAR_BACKPLANE_URL=redis://...)
+"""
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.core.config import settings
+
+try:
+    import redis.asyncio as aioredis
+    HAS_REDIS = True
+except ImportError:
+    aioredis = None
+    HAS_REDIS = False
+
+
+# handler(event, payload) called for events published by other workers
+EventHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class Backplane(ABC):
+    """
+    Interface for cross-worker radar event fan-out.
+
+    Envelopes carry the publishing worker's id; a worker never handles its own
+    events because it has already delivered them to its local sockets.
+    """
+
+    # False when publish() is a no-op (lets callers skip building payloads)
+    distributed = False
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.handler: Optional[EventHandler] = None
+
+    async def start(self, handler: EventHandler):
+        self.handler = handler
+
+    @abstractmethod
+    async def publish(self, event: str, payload: Dict[str, Any]):
+        """Send an event to the other workers."""
+
+    async def stop(self):
+        pass
+
+    def _envelope(self, event: str, payload: Dict[str, Any]) -> str:
+        return json.dumps({"origin": self.worker_id, "event": event, "payload": payload})
+
+    async def _dispatch(self, raw) -> None:
+        """Decode an envelope and hand it to the handler unless we sent it."""
+        envelope = json.loads(raw)
+        if envelope.get("origin") == self.worker_id or self.handler is None:
+            return
+        await self.handler(envelope["event"], envelope.get("payload") or {})
+
+
+class InProcessBackplane(Backplane):
+    """Single worker: every socket is local, so there is nobody to forward to."""
+
+    async def publish(self, event: str, payload: Dict[str, Any]):
+        # No other workers: local delivery already happened
+        return None
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis pub/sub backplane: one channel shared by every worker.
+
+    Publishing is fire-and-forget (a lost event only delays a client until its
+    next radar refresh); the listener resubscribes after connection errors.
+    """
+
+    distributed = True
+
+    def __init__(self, url: str, channel: str = settings.RADAR_BACKPLANE_CHANNEL, client=None):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        # Tests may inject a fakeredis-style client exposing publish() and pubsub()
+        self.client = client
+        self.listener_task: Optional[asyncio.Task] = None
+
+    async def start(self, handler: EventHandler):
+        await super().start(handler)
+        if self.client is None:
+            self.client = aioredis.from_url(self.url)
+        self.listener_task = asyncio.create_task(self._listen())
+
+    async def publish(self, event: str, payload: Dict[str, Any]):
+        try:
+            await self.client.publish(self.channel, self._envelope(event, payload))
+        except Exception as e:
+            print(f"Error publishing to radar backplane: {e}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        await self._dispatch(message["data"])
+                    except Exception as e:
+                        print(f"Error handling radar backplane event: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Radar backplane connection error: {e}")
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(1)
+
+    async def stop(self):
+        if self.listener_task is not None:
+            self.listener_task.cancel()
+            self.listener_task = None
+        if self.client is not None:
+            try:
+                await self.client.close()
+            except Exception:
+                pass
+
+
+def create_backplane(url: Optional[str] = None) -> Backplane:
+    """Backplane for RADAR_BACKPLANE_URL (in-process when unset or unavailable)."""
+    url = settings.RADAR_BACKPLANE_URL if url is None else url
+    if not url:
+        return InProcessBackplane()
+    if not url.startswith(("redis://", "rediss://", "unix://")):
+        print("Warning: Unsupported RADAR_BACKPLANE_URL scheme, using in-process backplane")
+        return InProcessBackplane()
+    if not HAS_REDIS:
+        print("Warning: redis package not installed, using in-process backplane")
+        return InProcessBackplane()
+    return RedisBackplane(url)
@@ -0,0 +1,111 @@
+"""
+BILI Master System - In-Process Caches
+Small per-worker caches for values that are expensive to compute and fine to
+serve slightly stale (admin dashboards, rollups), or that never change once
+written (stored idempotent responses).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Values expire ttl_seconds after they were computed. get_or_compute runs the
+    compute function once per key at a time: concurrent callers for the same
+    key wait for that result instead of repeating the work.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        # key -> (computed at (monotonic), value)
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def _fresh(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+            return entry
+        return None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._fresh(key)
+        return entry[1] if entry is not None else default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since key was computed, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._fresh(key)
+        return time.monotonic() - entry[0] if entry is not None else None
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], refresh: bool = False) -> Any:
+        """Cached value for key, computing it (single flight) if missing, expired or refresh."""
+        if not refresh:
+            with self._lock:
+                entry = self._fresh(key)
+            if entry is not None:
+                return entry[1]
+        requested = time.monotonic()
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                # Someone else computed it while we waited (a forced refresh accepts
+                # only a result computed after it was requested)
+                if entry is not None and (entry[0] >= requested if refresh else self._fresh(key) is not None):
+                    return entry[1]
+            value = compute()
+            self.set(key, value)
+            return value
+
+
+class LRUCache:
+    """At most maxsize values; the least recently used one is evicted first."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
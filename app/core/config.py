@@ -27,6 +27,16 @@ class Settings(BaseSettings):
     BYBIT_API_SECRET: str = os.getenv("BYBIT_API_SECRET", "X")
     BYBIT_WALLET_ADDRESS: str = os.getenv("BYBIT_WALLET_ADDRESS", "X")
     BYBIT_TESTNET: bool = os.getenv("BYBIT_TESTNET", "false").lower() == "true"
+    # Empty = api.bybit.com / api-testnet.bybit.com by BYBIT_TESTNET (point at scripts/mock_bybit_server.py to test)
+    BYBIT_BASE_URL: str = os.getenv("BYBIT_BASE_URL", "") or (
+        "https://api-testnet.bybit.com" if BYBIT_TESTNET else "https://api.bybit.com"
+    )
+    BYBIT_TIMEOUT_SECONDS: float = float(os.getenv("BYBIT_TIMEOUT_SECONDS", "10"))
+    # Retries on connection errors, HTTP 429/5xx and transient retCodes (jittered backoff)
+    BYBIT_MAX_RETRIES: int = int(os.getenv("BYBIT_MAX_RETRIES", "3"))
+    BYBIT_RECV_WINDOW_MS: int = int(os.getenv("BYBIT_RECV_WINDOW_MS", "5000"))
+    # Withdrawals whose Bybit outcome was unknown are reconciled once they are this old
+    WITHDRAWAL_RECONCILE_AFTER_SECONDS: int = int(os.getenv("WITHDRAWAL_RECONCILE_AFTER_SECONDS", "120"))
     
     # WhatsApp Gateway (Placeholders: X)
     WHATSAPP_API_KEY: str = os.getenv("WHATSAPP_API_KEY", "X")
@@ -63,6 +73,8 @@ class Settings(BaseSettings):
     
     # Auto-Sweep Configuration
     AUTO_SWEEP_THRESHOLD_USD: float = float(os.getenv("AUTO_SWEEP_THRESHOLD_USD", "50.0"))
+    # Concurrent payout calls per sweep run
+    AUTO_SWEEP_CONCURRENCY: int = int(os.getenv("AUTO_SWEEP_CONCURRENCY", "4"))
     
     # Notification Radius (KM)
     DEFAULT_NOTIFICATION_RADIUS_KM: float = float(os.getenv("DEFAULT_NOTIFICATION_RADIUS_KM", "15"))
@@ -74,9 +86,63 @@ class Settings(BaseSettings):
     # Chat Retention (days)
     CHAT_RETENTION_DAYS: int = int(os.getenv("CHAT_RETENTION_DAYS", "30"))
     
+    # Retention engine: rows per bulk UPDATE/DELETE, flash deal storage after expiry (hours)
+    RETENTION_CHUNK_SIZE: int = int(os.getenv("RETENTION_CHUNK_SIZE", "1000"))
+    FLASH_DEAL_RETENTION_HOURS: int = int(os.getenv("FLASH_DEAL_RETENTION_HOURS", "24"))
+    
+    # Store pin content refresh: concurrent fetches, max back-off for failing pins (hours)
+    PIN_REFRESH_CONCURRENCY: int = int(os.getenv("PIN_REFRESH_CONCURRENCY", "16"))
+    PIN_REFRESH_MAX_BACKOFF_HOURS: float = float(os.getenv("PIN_REFRESH_MAX_BACKOFF_HOURS", "24"))
+    
     # Socket Grace Period (seconds)
     SOCKET_GRACE_PERIOD_SECONDS: int = int(os.getenv("SOCKET_GRACE_PERIOD_SECONDS", "60"))
     
+    # Radar Spatial Index (in-memory cell buckets for radius queries)
+    RADAR_INDEX_CELL_SIZE_DEG: float = float(os.getenv("RADAR_INDEX_CELL_SIZE_DEG", "0.1"))
+    RADAR_INDEX_MAX_AGE_SECONDS: float = float(os.getenv("RADAR_INDEX_MAX_AGE_SECONDS", "300"))
+    # Radar snapshot versioning: changes kept for request_radar deltas
+    RADAR_CHANGELOG_SIZE: int = int(os.getenv("RADAR_CHANGELOG_SIZE", "10000"))
+    
+    # WebSocket location batching (coalesced per user, one frame per tick)
+    WS_LOCATION_BATCH_INTERVAL_MS: int = int(os.getenv("WS_LOCATION_BATCH_INTERVAL_MS", "100"))
+    WS_LOCATION_BATCH_MAX_SIZE: int = int(os.getenv("WS_LOCATION_BATCH_MAX_SIZE", "500"))
+    
+    # Location write-behind buffer: positions are bulk-written to the DB every N ms
+    LOCATION_FLUSH_INTERVAL_MS: int = int(os.getenv("LOCATION_FLUSH_INTERVAL_MS", "200"))
+    
+    # GPS update filter: suppress pings that barely moved, cap pings per user (token bucket)
+    LOCATION_MIN_MOVE_METERS: float = float(os.getenv("LOCATION_MIN_MOVE_METERS", "10"))
+    LOCATION_MIN_INTERVAL_SECONDS: float = float(os.getenv("LOCATION_MIN_INTERVAL_SECONDS", "30"))
+    LOCATION_RATE_PER_SECOND: float = float(os.getenv("LOCATION_RATE_PER_SECOND", "1"))
+    LOCATION_RATE_BURST: float = float(os.getenv("LOCATION_RATE_BURST", "5"))
+    
+    # WebSocket per-socket send queue: size and overflow policy ("drop_oldest" or "disconnect")
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_SLOW_CONSUMER_POLICY: str = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+    
+    # Radar backplane for multi-worker fan-out (empty = single worker, in-process)
+    RADAR_BACKPLANE_URL: str = os.getenv("RADAR_BACKPLANE_URL", "")
+    RADAR_BACKPLANE_CHANNEL: str = os.getenv("RADAR_BACKPLANE_CHANNEL", "bili:radar")
+    
+    # Threads for sync endpoints and offloaded ORM work; match the DB pool (pool_size 10 + max_overflow 20)
+    # so threads don't queue on connections while holding the event loop's capacity
+    DB_THREADPOOL_SIZE: int = int(os.getenv("DB_THREADPOOL_SIZE", "30"))
+    
+    # Ledger entries / withdrawals kept on each user's ledger summary row (history screens read these)
+    LEDGER_SUMMARY_RECENT_ENTRIES: int = int(os.getenv("LEDGER_SUMMARY_RECENT_ENTRIES", "50"))
+    
+    # Admin analytics dashboard is served from a per-worker cache this many seconds old at most
+    ADMIN_ANALYTICS_CACHE_SECONDS: int = int(os.getenv("ADMIN_ANALYTICS_CACHE_SECONDS", "60"))
+    
+    # Idempotency-Key replays: stored responses kept this many hours, most recent ones also in a per-worker LRU
+    IDEMPOTENCY_KEY_TTL_HOURS: int = int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    # A key reserved longer than this without a response (crashed worker) may be taken over by a retry
+    IDEMPOTENCY_RESERVATION_TIMEOUT_SECONDS: int = int(os.getenv("IDEMPOTENCY_RESERVATION_TIMEOUT_SECONDS", "300"))
+    
+    # Prometheus text-format /metrics endpoint and request/DB instrumentation
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    
     # CORS - Allow frontend origins (set CORS_ORIGINS in .env for production, e.g. https://your-app.netlify.app)
     # Note: treat env as raw string; we build the list manually in __init__ to avoid pydantic parsing issues.
     CORS_ORIGINS: str | None = None
@@ -3,8 +3,9 @@ BILI Master System - Database Configuration
 Supports PostgreSQL and SQLite (for local dev without PostgreSQL).
 """
 import uuid
+from decimal import Decimal, ROUND_HALF_UP
 from sqlalchemy import create_engine, String
-from sqlalchemy.types import TypeDecorator, CHAR
+from sqlalchemy.types import TypeDecorator, CHAR, Numeric
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -30,13 +31,54 @@ class GUID(TypeDecorator):
             return value
         return uuid.UUID(value)
 
+
+# Credits are stored as fixed-point NUMERIC(18, 3): exact to 0.001 Habbet
+MONEY_SCALE = 3
+MONEY_QUANTUM = Decimal(1).scaleb(-MONEY_SCALE)
+
+
+def to_money(value) -> Decimal:
+    """Exact fixed-point value of an amount (floats go through their shortest repr)."""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(MONEY_QUANTUM, rounding=ROUND_HALF_UP)
+
+
+class Money(TypeDecorator):
+    """
+    Fixed-point credit amount: NUMERIC(18, 3) in the database, float in Python.
+    Values are rounded to 0.001 on the way in, so sums and comparisons with
+    0.00 (Silent Decay) are exact in SQL.
+    """
+    impl = Numeric(18, MONEY_SCALE, asdecimal=False)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return to_money(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return round(float(value), MONEY_SCALE)
+
 def _make_engine():
     url = settings.DATABASE_URL
     if url and "sqlite" in url.lower():
+        if ":memory:" in url or url.rstrip("/").lower() in ("sqlite:", "sqlite+pysqlite:"):
+            # In-memory: the database lives in its one connection, so share it
+            return create_engine(
+                url,
+                connect_args={"check_same_thread": False},
+                poolclass=StaticPool,
+                echo=settings.APP_DEBUG,
+            )
+        # File-backed: a connection per checkout (default QueuePool), since ORM work
+        # runs on threadpool threads concurrently; writers wait for the file lock
         return create_engine(
             url,
-            connect_args={"check_same_thread": False},
-            poolclass=StaticPool,
+            connect_args={"check_same_thread": False, "timeout": 30},
             echo=settings.APP_DEBUG,
         )
     try:
@@ -0,0 +1,215 @@
+"""
+BILI Master System - Geo Query Helpers
+Shared radius-query building blocks for radar, nearby users and business browse [cite: 2026-01-09]
+
+- Bounding-box prefilter pushed into the SQL WHERE clause so the lat/lon
+  indexes (e.g. idx_users_location) narrow the candidate rows
+- One vectorized Haversine pass (NumPy) over the survivors
+- Correctly ordered nearest-N results (distance filter before the limit)
+"""
+import math
+from typing import Any, List, Optional, Sequence, Tuple
+from sqlalchemy import and_, or_
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate distance between two coordinates using Haversine formula.
+    Returns distance in kilometers.
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def haversine_km_many(
+    latitude: float,
+    longitude: float,
+    latitudes: Sequence[float],
+    longitudes: Sequence[float],
+):
+    """
+    Distances in kilometers from one point to many points.
+    Uses a single NumPy pass when available, otherwise falls back to a Python loop.
+
+    Returns:
+        NumPy array (or list without NumPy) aligned with the input sequences
+    """
+    if not HAS_NUMPY:
+        return [haversine_km(latitude, longitude, lat, lon) for lat, lon in zip(latitudes, longitudes)]
+
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64) - longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def bounding_box(
+    latitude: float,
+    longitude: float,
+    radius_km: float
+) -> Tuple[float, float, Optional[List[Tuple[float, float]]]]:
+    """
+    Lat/lon bounding box that fully contains a search circle.
+
+    Returns:
+        (min_lat, max_lat, lon_ranges) where lon_ranges is a list of
+        (min_lon, max_lon) pairs (two when the box crosses the antimeridian),
+        or None when every longitude qualifies (circle reaches a pole)
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat = max(-90.0, latitude - dlat)
+    max_lat = min(90.0, latitude + dlat)
+
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        return min_lat, max_lat, None
+
+    # Widest longitude span is at the box edge closest to a pole
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+    if dlon >= 180.0:
+        return min_lat, max_lat, None
+
+    min_lon = longitude - dlon
+    max_lon = longitude + dlon
+    if min_lon < -180.0:
+        return min_lat, max_lat, [(min_lon + 360.0, 180.0), (-180.0, max_lon)]
+    if max_lon > 180.0:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360.0)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def apply_bounding_box(query, lat_column, lon_column, latitude: float, longitude: float, radius_km: float):
+    """
+    Add the search circle's bounding box to a SQLAlchemy query's WHERE clause.
+    The box is a superset of the circle; callers must still filter by exact distance.
+    """
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+    query = query.filter(lat_column.between(min_lat, max_lat))
+    if lon_ranges is not None:
+        query = query.filter(or_(*[
+            and_(lon_column >= lo, lon_column <= hi) for lo, hi in lon_ranges
+        ]))
+    return query
+
+
+def nearest_within(
+    query,
+    lat_column,
+    lon_column,
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: Optional[int] = None,
+    lat_attr: str = "latitude",
+    lon_attr: str = "longitude"
+) -> List[Tuple[Any, float]]:
+    """
+    Run a radius query: bounding-box prefilter in SQL, vectorized distance scoring
+    in Python, then nearest-first ordering and limit.
+
+    Args:
+        query: SQLAlchemy query returning rows with latitude/longitude attributes
+        lat_column: Latitude column to filter on (e.g. User.latitude)
+        lon_column: Longitude column to filter on (e.g. User.longitude)
+        latitude: Center latitude
+        longitude: Center longitude
+        radius_km: Search radius in kilometers
+        limit: Maximum number of results (None for all within radius)
+
+    Returns:
+        List of (row, distance_km) tuples ordered by distance
+    """
+    rows = apply_bounding_box(
+        query.filter(lat_column.isnot(None), lon_column.isnot(None)),
+        lat_column, lon_column,
+        latitude, longitude, radius_km
+    ).all()
+    if not rows:
+        return []
+
+    distances = haversine_km_many(
+        latitude, longitude,
+        [getattr(row, lat_attr) for row in rows],
+        [getattr(row, lon_attr) for row in rows]
+    )
+
+    if HAS_NUMPY:
+        within = np.nonzero(distances <= radius_km)[0]
+        order = within[np.argsort(distances[within], kind="stable")]
+        if limit is not None:
+            order = order[:limit]
+        return [(rows[i], float(distances[i])) for i in order]
+
+    scored = sorted(
+        ((row, distance) for row, distance in zip(rows, distances) if distance <= radius_km),
+        key=lambda pair: pair[1]
+    )
+    return scored[:limit] if limit is not None else scored
+
+
+class GeoArea:
+    """
+    Geographic interest area: a viewport (lat/lon bounds) or a circle (center + radius).
+    Used to route radar events only to WebSocket clients that can see them.
+    """
+
+    __slots__ = ("min_lat", "max_lat", "lon_ranges", "center", "radius_km")
+
+    def __init__(
+        self,
+        min_lat: float,
+        max_lat: float,
+        lon_ranges: Optional[List[Tuple[float, float]]],
+        center: Optional[Tuple[float, float]] = None,
+        radius_km: Optional[float] = None
+    ):
+        self.min_lat = min_lat
+        self.max_lat = max_lat
+        self.lon_ranges = lon_ranges
+        self.center = center
+        self.radius_km = radius_km
+
+    @classmethod
+    def from_bounds(cls, south: float, west: float, north: float, east: float) -> "GeoArea":
+        """Viewport bounds; west > east means the viewport crosses the antimeridian."""
+        if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+            raise ValueError("Invalid viewport bounds")
+        if west <= east:
+            lon_ranges = [(west, east)]
+        else:
+            lon_ranges = [(west, 180.0), (-180.0, east)]
+        return cls(south, north, lon_ranges)
+
+    @classmethod
+    def from_radius(cls, latitude: float, longitude: float, radius_km: float) -> "GeoArea":
+        """Circle of radius_km around a center point."""
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius_km <= 0:
+            raise ValueError("Invalid center or radius")
+        min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+        return cls(min_lat, max_lat, lon_ranges, center=(latitude, longitude), radius_km=radius_km)
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        if not (self.min_lat <= latitude <= self.max_lat):
+            return False
+        if self.lon_ranges is not None and not any(lo <= longitude <= hi for lo, hi in self.lon_ranges):
+            return False
+        if self.center is not None:
+            return haversine_km(self.center[0], self.center[1], latitude, longitude) <= self.radius_km
+        return True
@@ -0,0 +1,218 @@
+"""
+BILI Master System - Location Write-Behind Buffer
+Batches GPS pings into one bulk UPDATE per flush [cite: 2026-01-09]
+
+Location endpoints record the newest position per user here instead of
+committing per request. A per-worker background loop flushes the buffer every
+LOCATION_FLUSH_INTERVAL_MS:
+- PostgreSQL: a single UPDATE ... FROM (VALUES ...) per chunk
+- Other backends (SQLite): one executemany UPDATE through SQLAlchemy Core
+
+Until a position is flushed, reads overlay the buffered value (see get/overlay).
+Suppressed pings only refresh last_seen (see touch).
+"""
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import Boolean, DateTime, Float, and_, bindparam, case, func, literal, text, update
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.user import User, UserStatus
+
+
+# Rows per PostgreSQL VALUES statement (6 bind parameters per row)
+PG_CHUNK_SIZE = 1000
+
+
+class BufferedLocation:
+    """
+    Newest unflushed position of one user.
+    latitude/longitude are None for a last_seen-only touch.
+    """
+
+    __slots__ = ("user_id", "latitude", "longitude", "located_at", "timestamp", "set_online")
+
+    def __init__(
+        self,
+        user_id: str,
+        latitude: Optional[float],
+        longitude: Optional[float],
+        timestamp: datetime,
+        set_online: bool = True
+    ):
+        self.user_id = user_id
+        self.latitude = latitude
+        self.longitude = longitude
+        # last_location_update (None when only last_seen changes)
+        self.located_at = timestamp if latitude is not None else None
+        # last_seen
+        self.timestamp = timestamp
+        # Location pings bring offline users online, unless they went offline since
+        self.set_online = set_online
+
+    @property
+    def has_position(self) -> bool:
+        return self.latitude is not None and self.longitude is not None
+
+
+class LocationWriteBuffer:
+    """
+    Process-wide write-behind buffer for user locations.
+    Coalesced per user: only the newest position in each flush window is written.
+    Thread-safe, so sync endpoints running in the threadpool can use it too.
+    """
+
+    def __init__(self, flush_interval_ms: int = settings.LOCATION_FLUSH_INTERVAL_MS):
+        self.flush_interval_seconds = flush_interval_ms / 1000.0
+        self.pending: Dict[str, BufferedLocation] = {}
+        self._lock = threading.Lock()
+        self.flushed_total = 0
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def put(self, user_id: str, latitude: float, longitude: float, timestamp: Optional[datetime] = None) -> BufferedLocation:
+        """Record a user's newest position (replaces any unflushed one)."""
+        location = BufferedLocation(str(user_id), latitude, longitude, timestamp or datetime.utcnow())
+        with self._lock:
+            self.pending[location.user_id] = location
+        return location
+
+    def touch(self, user_id: str, timestamp: Optional[datetime] = None) -> None:
+        """Refresh only last_seen (suppressed ping); keeps any unflushed position."""
+        timestamp = timestamp or datetime.utcnow()
+        with self._lock:
+            location = self.pending.get(str(user_id))
+            if location is not None:
+                location.timestamp = timestamp
+            else:
+                self.pending[str(user_id)] = BufferedLocation(str(user_id), None, None, timestamp, set_online=False)
+
+    def get(self, user_id: str) -> Optional[BufferedLocation]:
+        """Unflushed position of a user, if any (last_seen-only touches are skipped)."""
+        location = self.pending.get(str(user_id))
+        return location if location is not None and location.has_position else None
+
+    def positions(self) -> List[BufferedLocation]:
+        """Snapshot of every unflushed position (last_seen-only touches are skipped)."""
+        with self._lock:
+            return [location for location in self.pending.values() if location.has_position]
+
+    def cancel_online(self, user_id: str) -> None:
+        """User went offline: the pending flush must not flip them back online."""
+        location = self.pending.get(str(user_id))
+        if location is not None:
+            location.set_online = False
+
+    def overlay(self, data: Dict, user_id: str) -> Dict:
+        """Apply a pending position to a serialized user dict (latitude/longitude/status/timestamps)."""
+        location = self.get(user_id)
+        if location is None:
+            return data
+        data["latitude"] = location.latitude
+        data["longitude"] = location.longitude
+        if "last_location_update" in data:
+            data["last_location_update"] = location.located_at.isoformat()
+        if "last_seen" in data:
+            data["last_seen"] = location.timestamp.isoformat()
+        if location.set_online and data.get("status") == UserStatus.OFFLINE.value:
+            data["status"] = UserStatus.ONLINE.value
+        return data
+
+    def _take(self) -> List[BufferedLocation]:
+        with self._lock:
+            batch = list(self.pending.values())
+            self.pending.clear()
+        return batch
+
+    def _requeue(self, batch: List[BufferedLocation]) -> None:
+        """Put a failed batch back without overwriting newer positions."""
+        with self._lock:
+            for location in batch:
+                self.pending.setdefault(location.user_id, location)
+
+    def flush(self) -> int:
+        """
+        Write every pending position in one round trip (per chunk) and commit once.
+        Returns the number of positions written; on failure they are re-queued.
+        """
+        if SessionLocal is None or not self.pending:
+            return 0
+        batch = self._take()
+        db = SessionLocal()
+        try:
+            if db.get_bind().dialect.name == "postgresql":
+                for start in range(0, len(batch), PG_CHUNK_SIZE):
+                    self._update_from_values(db, batch[start:start + PG_CHUNK_SIZE])
+            else:
+                self._update_executemany(db, batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._requeue(batch)
+            print(f"Error flushing location buffer: {e}")
+            return 0
+        finally:
+            db.close()
+        self.flushed_total += len(batch)
+        return len(batch)
+
+    def _update_from_values(self, db, batch: List[BufferedLocation]) -> None:
+        """PostgreSQL: UPDATE users FROM (VALUES ...) joined on id."""
+        rows = []
+        params = {}
+        for i, location in enumerate(batch):
+            rows.append(
+                f"(CAST(:id_{i} AS CHAR(36)), CAST(:lat_{i} AS DOUBLE PRECISION), "
+                f"CAST(:lon_{i} AS DOUBLE PRECISION), CAST(:loc_{i} AS TIMESTAMP), "
+                f"CAST(:ts_{i} AS TIMESTAMP), CAST(:online_{i} AS BOOLEAN))"
+            )
+            params[f"id_{i}"] = location.user_id
+            params[f"lat_{i}"] = location.latitude
+            params[f"lon_{i}"] = location.longitude
+            params[f"loc_{i}"] = location.located_at
+            params[f"ts_{i}"] = location.timestamp
+            params[f"online_{i}"] = location.set_online
+        db.execute(text(
+            "UPDATE users AS u SET "
+            "latitude = COALESCE(v.latitude, u.latitude), longitude = COALESCE(v.longitude, u.longitude), "
+            "last_location_update = COALESCE(v.located_at, u.last_location_update), "
+            "last_seen = v.ts, updated_at = v.ts, "
+            "status = CASE WHEN v.set_online AND u.status = 'OFFLINE' THEN 'ONLINE' ELSE u.status END "
+            f"FROM (VALUES {', '.join(rows)}) AS v(id, latitude, longitude, located_at, ts, set_online) "
+            "WHERE u.id = v.id"
+        ), params)
+
+    def _update_executemany(self, db, batch: List[BufferedLocation]) -> None:
+        """Portable path: one UPDATE statement executed with many parameter sets."""
+        users = User.__table__
+        stmt = update(users).where(users.c.id == bindparam("b_id")).values(
+            latitude=func.coalesce(bindparam("b_latitude", type_=Float), users.c.latitude),
+            longitude=func.coalesce(bindparam("b_longitude", type_=Float), users.c.longitude),
+            last_location_update=func.coalesce(bindparam("b_located_at", type_=DateTime), users.c.last_location_update),
+            last_seen=bindparam("b_timestamp"),
+            updated_at=bindparam("b_timestamp"),
+            status=case(
+                (
+                    and_(users.c.status == UserStatus.OFFLINE, bindparam("b_set_online", type_=Boolean)),
+                    literal(UserStatus.ONLINE, type_=users.c.status.type)
+                ),
+                else_=users.c.status
+            )
+        )
+        db.execute(stmt, [
+            {
+                "b_id": uuid.UUID(location.user_id),
+                "b_latitude": location.latitude,
+                "b_longitude": location.longitude,
+                "b_located_at": location.located_at,
+                "b_timestamp": location.timestamp,
+                "b_set_online": location.set_online,
+            }
+            for location in batch
+        ])
+
+
+# Global location buffer instance (one per worker process)
+location_buffer = LocationWriteBuffer()
@@ -0,0 +1,149 @@
+"""
+BILI Master System - GPS Update Filter
+Server-side suppression of redundant location pings [cite: 2026-01-09]
+
+- Movement threshold: a ping that moved less than LOCATION_MIN_MOVE_METERS
+  within LOCATION_MIN_INTERVAL_SECONDS of the last accepted one is "stationary"
+- Token bucket per user: at most LOCATION_RATE_BURST pings at once, refilled at
+  LOCATION_RATE_PER_SECOND; pings beyond that are "rate_limited"
+
+Suppressed pings skip the DB write and the broadcast; callers only refresh
+last_seen through the location buffer.
+"""
+import threading
+import time
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.geo import haversine_km
+
+
+ACCEPTED = "accepted"
+STATIONARY = "stationary"
+RATE_LIMITED = "rate_limited"
+
+# Check count between sweeps of idle per-user state
+PRUNE_EVERY = 10000
+
+
+class _UserTrack:
+    """Last accepted ping of one user plus their token bucket."""
+
+    __slots__ = ("latitude", "longitude", "accepted_at", "status", "visible", "tokens", "refilled_at")
+
+    def __init__(self, burst: float, now: float):
+        self.latitude: Optional[float] = None
+        self.longitude: Optional[float] = None
+        self.accepted_at = 0.0
+        self.status: Optional[str] = None
+        self.visible = False
+        self.tokens = burst
+        self.refilled_at = now
+
+
+class LocationUpdateFilter:
+    """
+    Per-worker filter deciding whether a GPS ping is written and broadcast.
+    Thread-safe; all state is in memory and rebuilt as users ping.
+    """
+
+    def __init__(
+        self,
+        min_move_meters: float = settings.LOCATION_MIN_MOVE_METERS,
+        min_interval_seconds: float = settings.LOCATION_MIN_INTERVAL_SECONDS,
+        rate_per_second: float = settings.LOCATION_RATE_PER_SECOND,
+        burst: float = settings.LOCATION_RATE_BURST,
+    ):
+        self.min_move_km = min_move_meters / 1000.0
+        self.min_interval_seconds = min_interval_seconds
+        self.rate_per_second = rate_per_second
+        self.burst = max(1.0, burst)
+        self.tracks: Dict[str, _UserTrack] = {}
+        self.counts: Dict[str, int] = {ACCEPTED: 0, STATIONARY: 0, RATE_LIMITED: 0}
+        self._lock = threading.Lock()
+        self._checks_since_prune = 0
+
+    def check(self, user_id: str, latitude: float, longitude: float, force: bool = False) -> str:
+        """
+        Classify a ping as ACCEPTED, STATIONARY or RATE_LIMITED and count it.
+        force skips the movement threshold (e.g. detection on app entry); the
+        rate limit always applies.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._checks_since_prune += 1
+            if self._checks_since_prune >= PRUNE_EVERY:
+                self._prune(now)
+            track = self.tracks.get(user_id)
+            if track is None:
+                track = self.tracks[user_id] = _UserTrack(self.burst, now)
+
+            if self.rate_per_second > 0:
+                track.tokens = min(self.burst, track.tokens + (now - track.refilled_at) * self.rate_per_second)
+                track.refilled_at = now
+                if track.tokens < 1.0:
+                    return self._count(RATE_LIMITED)
+                track.tokens -= 1.0
+
+            if (
+                not force
+                and track.latitude is not None
+                and now - track.accepted_at < self.min_interval_seconds
+                and haversine_km(track.latitude, track.longitude, latitude, longitude) < self.min_move_km
+            ):
+                return self._count(STATIONARY)
+
+            return self._count(ACCEPTED)
+
+    def _count(self, outcome: str) -> str:
+        self.counts[outcome] += 1
+        return outcome
+
+    def accepted(self, user_id: str, latitude: float, longitude: float, status: str, visible: bool) -> None:
+        """Record the position and radar state written for an accepted ping."""
+        with self._lock:
+            track = self.tracks.get(user_id)
+            if track is None:
+                track = self.tracks[user_id] = _UserTrack(self.burst, time.monotonic())
+            track.latitude = latitude
+            track.longitude = longitude
+            track.accepted_at = time.monotonic()
+            track.status = status
+            track.visible = visible
+
+    def last_accepted(self, user_id: str) -> Optional[_UserTrack]:
+        track = self.tracks.get(user_id)
+        return track if track is not None and track.latitude is not None else None
+
+    def forget(self, user_id: str) -> None:
+        """Drop a user's state (e.g. status changed outside the location path)."""
+        with self._lock:
+            self.tracks.pop(user_id, None)
+
+    def _prune(self, now: float) -> None:
+        """Drop users idle long enough that their state no longer matters."""
+        self._checks_since_prune = 0
+        horizon = max(self.min_interval_seconds, self.burst / self.rate_per_second if self.rate_per_second > 0 else 0)
+        stale = [
+            user_id for user_id, track in self.tracks.items()
+            if now - max(track.accepted_at, track.refilled_at) > horizon
+        ]
+        for user_id in stale:
+            del self.tracks[user_id]
+
+    def stats(self) -> Dict:
+        total = sum(self.counts.values())
+        return {
+            "accepted": self.counts[ACCEPTED],
+            "suppressed_stationary": self.counts[STATIONARY],
+            "suppressed_rate_limited": self.counts[RATE_LIMITED],
+            "suppressed_ratio": round((total - self.counts[ACCEPTED]) / total, 4) if total else 0.0,
+            "tracked_users": len(self.tracks),
+            "min_move_meters": self.min_move_km * 1000.0,
+            "min_interval_seconds": self.min_interval_seconds,
+            "rate_per_second": self.rate_per_second,
+            "burst": self.burst,
+        }
+
+
+# Global location filter instance (one per worker process)
+location_filter = LocationUpdateFilter()
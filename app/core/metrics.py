@@ -0,0 +1,292 @@
+"""
+BILI Master System - Metrics
+In-process counters, gauges and histograms rendered in the Prometheus text
+format at /metrics (per worker; scrape every worker or aggregate by instance)
+
+- HTTP: latency per route template, DB query count and DB time per request
+- DB: every cursor execute (engine events), including background jobs
+- WebSocket: connections, send-queue depths, broadcast fan-out, dropped frames
+- Jobs: run duration and outcome per scheduled job
+
+No client library needed; updates take a short per-metric lock.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+FANOUT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 20000)
+
+# Starlette appends "; charset=utf-8"
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), lock: threading.Lock = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock or threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _items(self) -> list:
+        """Consistent snapshot of the series (histogram rows copied)."""
+        with self._lock:
+            return sorted((key, list(value) if isinstance(value, list) else value) for key, value in self.values.items())
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines for this metric (HELP, TYPE, then one line per sample)."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in self._items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Set explicitly, or read from a callback at scrape time (set_function)."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self.values[self._key(labels)] = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        if self.function is not None:
+            try:
+                lines.append(f"{self.name} {_format_value(self.function())}")
+            except Exception:
+                pass
+            return lines
+        for key, value in self._items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [per-bucket counts..., sum, count]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, series in self._items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(series[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of this worker; creating an existing name returns it."""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry (one per worker process)
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    "bili_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+http_request_db_queries = metrics.histogram(
+    "bili_http_request_db_queries", "DB queries issued per HTTP request", ("route",), buckets=COUNT_BUCKETS
+)
+http_request_db_seconds = metrics.histogram(
+    "bili_http_request_db_seconds", "Time spent in DB queries per HTTP request", ("route",)
+)
+db_queries_total = metrics.counter("bili_db_queries_total", "DB statements executed (requests and background jobs)")
+db_query_duration = metrics.histogram("bili_db_query_duration_seconds", "Duration of single DB statements")
+ws_broadcast_fanout = metrics.histogram(
+    "bili_ws_broadcast_fanout", "Sockets a broadcast frame was queued for", ("kind",), buckets=FANOUT_BUCKETS
+)
+ws_frames_dropped_total = metrics.counter(
+    "bili_ws_frames_dropped_total", "Frames dropped or sockets closed because a send queue was full", ("policy",)
+)
+job_duration = metrics.histogram(
+    "bili_job_duration_seconds", "Background job run duration", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+)
+job_runs_total = metrics.counter("bili_job_runs_total", "Background job runs by outcome", ("job", "outcome"))
+
+
+# ---------- Per-request DB accounting ----------
+
+class _RequestDbStats:
+    __slots__ = ("queries", "seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Set by the middleware; threadpool endpoints inherit it (context is copied)
+_request_db_stats: ContextVar[Optional[_RequestDbStats]] = ContextVar("bili_request_db_stats", default=None)
+
+
+def instrument_engine(engine) -> None:
+    """Count and time every cursor execute on engine (idempotent)."""
+    if engine is None or getattr(engine, "_bili_instrumented", False):
+        return
+    engine._bili_instrumented = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bili_query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("bili_query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        db_queries_total.inc()
+        db_query_duration.observe(elapsed)
+        stats = _request_db_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("bili_query_started"):
+            conn.info["bili_query_started"].pop()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing HTTP requests. Routes are labelled by their template
+    (/api/v1/admin/map-pins/{pin_id}), unmatched paths as "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = _RequestDbStats()
+        token = _request_db_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db_stats.reset(token)
+            route = scope.get("route")
+            route_label = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(elapsed, method=scope.get("method", ""), route=route_label, status=status["code"])
+            http_request_db_queries.observe(stats.queries, route=route_label)
+            http_request_db_seconds.observe(stats.seconds, route=route_label)
@@ -0,0 +1,74 @@
+"""
+BILI Master System - Keyset Pagination
+Opaque cursors for "seek" pagination: a page ends at the sort key of its last
+row, and the next page starts strictly after it (no OFFSET scans, stable under
+concurrent inserts). Also helpers for NDJSON and CSV streaming exports.
+"""
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+# Response header carrying the cursor of the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque URL-safe cursor for a sort key (datetimes and UUIDs become strings)."""
+    raw = json.dumps(list(values), default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Sort key values of a cursor; ValueError if it is malformed or has the wrong arity."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_cursor_datetime(value: Any):
+    """Datetime part of a decoded cursor (None stays None)."""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(value)
+
+
+def ndjson_lines(rows: Iterable[Dict]) -> Iterator[str]:
+    """One JSON document per line."""
+    for row in rows:
+        yield json.dumps(row, default=_json_default, separators=(",", ":")) + "\n"
+
+
+def csv_lines(rows: Iterable[Dict], fieldnames: Sequence[str]) -> Iterator[str]:
+    """Header line, then one CSV line per row (datetimes as ISO 8601)."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fieldnames), extrasaction="ignore")
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writeheader()
+    yield flush()
+    for row in rows:
+        writer.writerow({key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()})
+        yield flush()
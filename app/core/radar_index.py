@@ -0,0 +1,360 @@
+"""
+BILI Master System - In-Memory Radar Spatial Index
+Grid-cell buckets keyed by lat/lon for fast radius queries [cite: 2026-01-09]
+
+Radius queries only look at the cells that overlap the search circle instead of
+loading and scoring every visible user. The index holds exactly the users that
+pass the Silent Decay filter; callers fall back to SQL while it is cold.
+
+Every change bumps a version number and is recorded in a bounded changelog, so
+radar clients can fetch a delta since the version they already have.
+
+Thread-safe: endpoints running in the threadpool update it while the event
+loop reads it.
+"""
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Tuple, Set, Optional, List, Iterable, Any, Deque
+from sqlalchemy import or_, and_
+from app.core.config import settings
+from app.core.geo import haversine_km, KM_PER_DEGREE_LAT
+from app.core.location_buffer import location_buffer
+from app.models.user import User, UserStatus
+
+
+def is_radar_visible(status: UserStatus, credit_balance: float, is_invisible: bool = False) -> bool:
+    """
+    Silent Decay Logic [cite: 2026-01-30]: visible if online, or offline with credits > 0.00.
+    Mirrors User.should_appear_on_radar() plus the invisible-mode filter.
+    """
+    if is_invisible:
+        return False
+    if status == UserStatus.ONLINE:
+        return True
+    return status == UserStatus.OFFLINE and (credit_balance or 0) > 0.00
+
+
+def visible_users_query(db):
+    """SQL form of the Silent Decay filter: every user the index should hold."""
+    return db.query(User).filter(
+        or_(
+            User.status == UserStatus.ONLINE,
+            and_(
+                User.status == UserStatus.OFFLINE,
+                User.credit_balance > 0.00
+            )
+        ),
+        User.is_invisible == False,
+        User.latitude.isnot(None),
+        User.longitude.isnot(None)
+    )
+
+
+def is_silent_decayed(status: UserStatus, credit_balance: float, is_invisible: bool = False) -> bool:
+    """Silent Decay state: offline with 0.00 credits (invisible users are never announced)."""
+    return not is_invisible and status == UserStatus.OFFLINE and (credit_balance or 0) <= 0.00
+
+
+def decayed_user_ids_query(db):
+    """Ids of every user currently in the Silent Decay state (id column only)."""
+    return db.query(User.id).filter(
+        User.status == UserStatus.OFFLINE,
+        User.credit_balance <= 0.00,
+        User.is_invisible == False
+    )
+
+
+class RadarEntry:
+    """Radar-visible user as held in the index."""
+
+    __slots__ = (
+        "user_id", "latitude", "longitude", "status",
+        "credit_balance", "last_seen", "display_name", "cell",
+    )
+
+    def __init__(
+        self,
+        user_id: str,
+        latitude: float,
+        longitude: float,
+        status: UserStatus,
+        credit_balance: float,
+        last_seen: Optional[str] = None,
+        display_name: Optional[str] = None,
+    ):
+        self.user_id = user_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.status = status
+        self.credit_balance = credit_balance
+        self.last_seen = last_seen
+        self.display_name = display_name
+        self.cell: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def from_user(cls, user) -> "RadarEntry":
+        """Build an entry from a User ORM row."""
+        return cls(
+            user_id=str(user.id),
+            latitude=user.latitude,
+            longitude=user.longitude,
+            status=user.status,
+            credit_balance=float(user.credit_balance or 0),
+            last_seen=user.last_seen.isoformat() if user.last_seen else None,
+            display_name=user.display_name,
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RadarEntry":
+        """Inverse of to_dict (e.g. an entry received from another worker)."""
+        return cls(
+            user_id=data["user_id"],
+            latitude=data["latitude"],
+            longitude=data["longitude"],
+            status=UserStatus(data["status"]),
+            credit_balance=float(data.get("credit_balance") or 0),
+            last_seen=data.get("last_seen"),
+            display_name=data.get("display_name"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize in the RadarUserResponse shape."""
+        return {
+            "user_id": self.user_id,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "status": self.status.value if isinstance(self.status, UserStatus) else str(self.status),
+            "credit_balance": self.credit_balance,
+            "last_seen": self.last_seen,
+            "display_name": self.display_name,
+        }
+    
+    def same_as(self, other: Optional["RadarEntry"]) -> bool:
+        """True when other carries exactly the same radar-visible fields."""
+        return other is not None and all(
+            getattr(self, field) == getattr(other, field)
+            for field in self.__slots__ if field != "cell"
+        )
+
+
+class RadarSpatialIndex:
+    """
+    Process-local spatial index of radar-visible users.
+
+    Users are bucketed into fixed-size lat/lon cells (RADAR_INDEX_CELL_SIZE_DEG).
+    A radius query computes the cell range covering the circle's bounding box and
+    scores only the users in those cells.
+
+    The index is "cold" until it has been loaded from the database, and goes cold
+    again after RADAR_INDEX_MAX_AGE_SECONDS so changes made outside the hooked
+    update paths are reconciled by a periodic reload.
+
+    Versioning: each insert, move, field change or removal increments `version`
+    and appends (version, user_id) to a changelog of RADAR_CHANGELOG_SIZE entries.
+    `epoch` identifies this index instance, so versions handed out by another
+    process (or before a restart) are never mistaken for ours.
+    """
+
+    def __init__(
+        self,
+        cell_size_deg: float = settings.RADAR_INDEX_CELL_SIZE_DEG,
+        max_age_seconds: float = settings.RADAR_INDEX_MAX_AGE_SECONDS,
+        changelog_size: int = settings.RADAR_CHANGELOG_SIZE,
+    ):
+        self.cell_size_deg = cell_size_deg
+        self.max_age_seconds = max_age_seconds
+        self.entries: Dict[str, RadarEntry] = {}
+        self.cells: Dict[Tuple[int, int], Set[str]] = {}
+        self.warmed_at: Optional[float] = None
+        self._lon_cells = int(math.ceil(360.0 / cell_size_deg))
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.changelog: Deque[Tuple[int, str]] = deque(maxlen=max(1, changelog_size))
+        self._lock = threading.RLock()
+
+    @property
+    def is_warm(self) -> bool:
+        """True when the index has been loaded and has not exceeded its max age."""
+        if self.warmed_at is None:
+            return False
+        if self.max_age_seconds <= 0:
+            return True
+        return (time.monotonic() - self.warmed_at) < self.max_age_seconds
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _cell_for(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        row = int(math.floor((latitude + 90.0) / self.cell_size_deg))
+        col = int(math.floor((longitude + 180.0) / self.cell_size_deg)) % self._lon_cells
+        return row, col
+
+    def load(self, users: Iterable) -> None:
+        """
+        Rebuild the index from User rows (e.g. the result of the radar SQL query).
+        Users that fail the Silent Decay filter or have no location are skipped.
+        Only the differences from the current contents are applied and versioned,
+        so a periodic reload does not invalidate clients' deltas.
+        """
+        users = list(users)
+        with self._lock:
+            seen: Set[str] = set()
+            for user in users:
+                seen.add(str(user.id))
+                self.upsert_user(user)
+            for user_id in [uid for uid in self.entries if uid not in seen]:
+                self.remove(user_id)
+            self.warmed_at = time.monotonic()
+
+    def reload(self, db) -> None:
+        """Run the radar SQL query on db and load the result (blocking: use run_in_threadpool)."""
+        self.load(visible_users_query(db).all())
+
+    def invalidate(self) -> None:
+        """Mark the index cold so the next query reloads it from the database."""
+        self.warmed_at = None
+
+    def upsert_user(self, user) -> None:
+        """
+        Insert, move or drop a user from a User ORM row according to Silent Decay Logic.
+        A position still waiting in the location write-behind buffer wins over the row's.
+        """
+        user_id = str(user.id)
+        entry = RadarEntry.from_user(user)
+        buffered = location_buffer.get(user_id)
+        if buffered is not None:
+            entry.latitude = buffered.latitude
+            entry.longitude = buffered.longitude
+            entry.last_seen = buffered.timestamp.isoformat()
+            if buffered.set_online and entry.status == UserStatus.OFFLINE:
+                entry.status = UserStatus.ONLINE
+        if (
+            entry.latitude is None
+            or entry.longitude is None
+            or not is_radar_visible(entry.status, entry.credit_balance, user.is_invisible)
+        ):
+            self.remove(user_id)
+            return
+        self._put(entry)
+
+    def upsert_entry(self, entry: RadarEntry) -> None:
+        """Insert or move an already-visible entry (e.g. replicated from another worker)."""
+        if not is_radar_visible(entry.status, entry.credit_balance):
+            self.remove(entry.user_id)
+            return
+        self._put(entry)
+
+    def _put(self, entry: RadarEntry) -> None:
+        with self._lock:
+            existing = self.entries.get(entry.user_id)
+            if entry.same_as(existing):
+                return
+            cell = self._cell_for(entry.latitude, entry.longitude)
+            if existing is not None and existing.cell != cell:
+                self._discard_from_cell(existing)
+            entry.cell = cell
+            self.entries[entry.user_id] = entry
+            self.cells.setdefault(cell, set()).add(entry.user_id)
+            self._record(entry.user_id)
+
+    def _record(self, user_id: str) -> None:
+        self.version += 1
+        self.changelog.append((self.version, user_id))
+
+    def _discard_from_cell(self, entry: RadarEntry) -> None:
+        bucket = self.cells.get(entry.cell)
+        if bucket is not None:
+            bucket.discard(entry.user_id)
+            if not bucket:
+                del self.cells[entry.cell]
+
+    def remove(self, user_id: str) -> None:
+        """Drop a user from the index (Silent Decay removal)."""
+        with self._lock:
+            entry = self.entries.pop(user_id, None)
+            if entry is not None:
+                self._discard_from_cell(entry)
+                self._record(user_id)
+
+    def get(self, user_id: str) -> Optional[RadarEntry]:
+        return self.entries.get(user_id)
+
+    def all_entries(self) -> List[RadarEntry]:
+        with self._lock:
+            return list(self.entries.values())
+
+    def changes_since(self, version: int) -> Optional[Tuple[List[RadarEntry], List[str]]]:
+        """
+        Net changes after `version` as (upserted entries, removed user_ids).
+        Returns None when the changelog no longer reaches back that far (or the
+        version is from the future); the caller should send a full snapshot.
+        """
+        with self._lock:
+            if version > self.version:
+                return None
+            if version == self.version:
+                return [], []
+            if len(self.changelog) == self.changelog.maxlen and self.changelog[0][0] > version + 1:
+                return None
+
+            changed: Dict[str, None] = {}
+            for change_version, user_id in reversed(self.changelog):
+                if change_version <= version:
+                    break
+                changed[user_id] = None
+            upserts = [self.entries[uid] for uid in changed if uid in self.entries]
+            removed = [uid for uid in changed if uid not in self.entries]
+            return upserts, removed
+
+    def _candidate_cells(self, latitude: float, longitude: float, radius_km: float) -> Iterable[Tuple[int, int]]:
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        row_min, _ = self._cell_for(max(-90.0, latitude - dlat), longitude)
+        row_max, _ = self._cell_for(min(90.0, latitude + dlat), longitude)
+
+        cos_lat = math.cos(math.radians(min(89.9, abs(latitude) + dlat)))
+        dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat) if cos_lat > 0 else 360.0
+        if dlon >= 180.0:
+            cols = None  # Circle wraps the globe in longitude: every column
+        else:
+            col_min = int(math.floor((longitude - dlon + 180.0) / self.cell_size_deg))
+            col_max = int(math.floor((longitude + dlon + 180.0) / self.cell_size_deg))
+            cols = {c % self._lon_cells for c in range(col_min, col_max + 1)}
+
+        span = (row_max - row_min + 1) * (len(cols) if cols is not None else self._lon_cells)
+        if span >= len(self.cells):
+            # Fewer occupied cells than candidates: filter the occupied ones instead
+            return [
+                cell for cell in self.cells
+                if row_min <= cell[0] <= row_max and (cols is None or cell[1] in cols)
+            ]
+        if cols is None:
+            cols = range(self._lon_cells)
+        return [(row, col) for row in range(row_min, row_max + 1) for col in cols]
+
+    def query_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+    ) -> List[Tuple[RadarEntry, float]]:
+        """
+        Return (entry, distance_km) pairs within radius_km, nearest first.
+        Only users in cells overlapping the search circle are scored.
+        """
+        results: List[Tuple[RadarEntry, float]] = []
+        with self._lock:
+            for cell in self._candidate_cells(latitude, longitude, radius_km):
+                for user_id in self.cells.get(cell, ()):
+                    entry = self.entries[user_id]
+                    distance = haversine_km(latitude, longitude, entry.latitude, entry.longitude)
+                    if distance <= radius_km:
+                        results.append((entry, distance))
+        results.sort(key=lambda pair: pair[1])
+        return results
+
+
+# Global radar index instance (one per worker process)
+radar_index = RadarSpatialIndex()
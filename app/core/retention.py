@@ -0,0 +1,140 @@
+"""
+BILI Master System - Retention Engine
+Set-based expiry and cleanup for posts, chats, flash deals and idempotency keys
+
+Every step is a bulk UPDATE/DELETE over at most RETENTION_CHUNK_SIZE rows,
+committed per chunk, so runs keep up with millions of rows without long
+transactions or loading ORM objects. Each run reports rows affected and
+duration per table.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import select, update, delete
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.post import Post
+from app.models.chat import Chat, ChatMessage, ChatStatus
+from app.models.flash_deal import FlashDeal
+from app.models.idempotency_key import IdempotencyKey
+
+
+def _report(rows: int, chunks: int, started: float) -> Dict[str, float]:
+    return {
+        "rows": rows,
+        "chunks": chunks,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def expire_posts(db: Session, now: Optional[datetime] = None, chunk_size: int = settings.RETENTION_CHUNK_SIZE) -> Dict:
+    """Commercial posts past expires_at: is_expired=True, is_active=False."""
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    rows = chunks = 0
+    while True:
+        chunk = select(Post.id).where(
+            Post.is_expired == False,
+            Post.expires_at.isnot(None),
+            Post.expires_at < now
+        ).limit(chunk_size)
+        affected = db.execute(
+            update(Post)
+            .where(Post.id.in_(chunk))
+            .values(is_expired=True, is_active=False, updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        rows += affected
+        chunks += 1
+        if affected < chunk_size:
+            break
+    return {"posts": _report(rows, chunks, started)}
+
+
+def purge_chats(db: Session, now: Optional[datetime] = None, chunk_size: int = settings.RETENTION_CHUNK_SIZE) -> Dict:
+    """
+    Chats past the 30-day retention period: delete their messages and mark the
+    chat deleted. Chunked by chat, messages removed with one DELETE per chunk.
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    chat_rows = message_rows = chunks = 0
+    while True:
+        chat_ids = db.execute(
+            select(Chat.id).where(
+                Chat.expires_at < now,
+                Chat.status != ChatStatus.DELETED
+            ).limit(chunk_size)
+        ).scalars().all()
+        if not chat_ids:
+            break
+        message_rows += db.execute(
+            delete(ChatMessage)
+            .where(ChatMessage.chat_id.in_(chat_ids))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        chat_rows += db.execute(
+            update(Chat)
+            .where(Chat.id.in_(chat_ids))
+            .values(status=ChatStatus.DELETED, deleted_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        chunks += 1
+        if len(chat_ids) < chunk_size:
+            break
+    report = _report(chat_rows, chunks, started)
+    return {
+        "chats": report,
+        "chat_messages": {"rows": message_rows, "chunks": chunks, "duration_ms": report["duration_ms"]}
+    }
+
+
+def purge_flash_deals(db: Session, now: Optional[datetime] = None, chunk_size: int = settings.RETENTION_CHUNK_SIZE) -> Dict:
+    """Flash deals expired for longer than FLASH_DEAL_RETENTION_HOURS are deleted."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=settings.FLASH_DEAL_RETENTION_HOURS)
+    started = time.perf_counter()
+    rows = chunks = 0
+    while True:
+        chunk = select(FlashDeal.id).where(FlashDeal.expires_at < cutoff).limit(chunk_size)
+        affected = db.execute(
+            delete(FlashDeal)
+            .where(FlashDeal.id.in_(chunk))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        rows += affected
+        chunks += 1
+        if affected < chunk_size:
+            break
+    return {"flash_deals": _report(rows, chunks, started)}
+
+
+def purge_idempotency_keys(db: Session, now: Optional[datetime] = None, chunk_size: int = settings.RETENTION_CHUNK_SIZE) -> Dict:
+    """Idempotency keys past expires_at are deleted (permanent keys have none)."""
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    rows = chunks = 0
+    while True:
+        chunk = select(IdempotencyKey.key).where(IdempotencyKey.expires_at < now).limit(chunk_size)
+        affected = db.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.key.in_(chunk))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        rows += affected
+        chunks += 1
+        if affected < chunk_size:
+            break
+    return {"idempotency_keys": _report(rows, chunks, started)}
+
+
+def format_report(report: Dict) -> str:
+    """One log line: table=rows(duration) for every table in a report."""
+    return ", ".join(
+        f"{table}={stats['rows']} rows in {stats['duration_ms']}ms"
+        for table, stats in report.items()
+    )
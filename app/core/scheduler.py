@@ -0,0 +1,341 @@
+"""
+BILI Master System - Background Job Scheduler
+Runs each cluster-wide background job on exactly one worker
+
+Jobs are registered with an interval and jitter:
+- exclusive jobs (Silent Decay, retention, withdrawals, pin refresh) claim a lease
+  row in job_leases before running; on PostgreSQL the run is additionally guarded
+  by pg_try_advisory_lock, so a worker whose lease expired mid-run cannot overlap
+- per-worker jobs (location buffer flush, radar index refresh) run in every
+  process, since they work on that process's memory
+
+The lease row persists next_run_at, so intervals survive restarts and adding
+workers, plus last-run / duration / error state exposed at /admin/jobs.
+"""
+import asyncio
+import os
+import random
+import socket
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from app.core.database import SessionLocal, engine
+from app.core.metrics import job_duration, job_runs_total
+from app.models.job_lease import JobLease
+
+
+# Retry delay when the job is due but another worker holds it
+BUSY_RETRY_SECONDS = 15
+# Longest stored error text
+MAX_ERROR_LENGTH = 2000
+
+
+class Job:
+    """A registered job and this worker's view of its runs."""
+
+    __slots__ = (
+        "name", "func", "interval_seconds", "jitter_seconds", "exclusive", "lease_seconds",
+        "running", "runs", "failures", "skipped",
+        "last_started_at", "last_finished_at", "last_duration_ms", "last_error",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        interval_seconds: float,
+        jitter_seconds: float,
+        exclusive: bool,
+        lease_seconds: float,
+    ):
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.exclusive = exclusive
+        self.lease_seconds = lease_seconds
+        self.running = False
+        self.runs = 0
+        self.failures = 0
+        # Attempts that found the job not due yet or held by another worker
+        self.skipped = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_finished_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def lock_key(self) -> int:
+        """Stable 32-bit advisory lock key for this job name."""
+        return zlib.crc32(f"bili:job:{self.name}".encode("utf-8"))
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "exclusive": self.exclusive,
+            "interval_seconds": self.interval_seconds,
+            "jitter_seconds": self.jitter_seconds,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_finished_at": self.last_finished_at.isoformat() if self.last_finished_at else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    Per-process job runner. Exclusive jobs coordinate through the database; without
+    a database every job simply runs locally (single-process development).
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.tasks: List[asyncio.Task] = []
+        # Lease owner id: host, pid and a per-start suffix (pids are reused)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    def register(
+        self,
+        name: str,
+        func: Callable[[], Awaitable],
+        interval_seconds: float,
+        jitter_seconds: float = 0.0,
+        exclusive: bool = True,
+        lease_seconds: Optional[float] = None,
+    ) -> Job:
+        """
+        Add a job. func is an async callable doing one run.
+        lease_seconds bounds how long a crashed worker can keep an exclusive job
+        (default: the interval, at least 60s); it should exceed the job's run time.
+        """
+        job = Job(
+            name, func, interval_seconds, jitter_seconds, exclusive,
+            lease_seconds if lease_seconds is not None else max(60.0, interval_seconds),
+        )
+        self.jobs[name] = job
+        return job
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Start one loop per registered job (on loop, or the running event loop)."""
+        if self.tasks:
+            return
+        create_task = loop.create_task if loop is not None else asyncio.create_task
+        for job in self.jobs.values():
+            self.tasks.append(create_task(self._run_loop(job)))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    @property
+    def coordinated(self) -> bool:
+        return SessionLocal is not None
+
+    async def _run_loop(self, job: Job):
+        while True:
+            try:
+                if job.exclusive and self.coordinated:
+                    delay = await self._run_exclusive(job)
+                else:
+                    await self._run(job)
+                    delay = job.interval_seconds
+            except Exception as e:
+                print(f"Error scheduling job {job.name}: {e}")
+                delay = job.interval_seconds
+            await asyncio.sleep(delay + random.uniform(0, job.jitter_seconds))
+
+    async def _run(self, job: Job) -> Optional[str]:
+        """Run the job once here; returns the error text if it failed."""
+        job.running = True
+        job.last_started_at = datetime.utcnow()
+        started = time.perf_counter()
+        error = None
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Error in job {job.name}: {error}")
+        finally:
+            job.running = False
+            job.last_finished_at = datetime.utcnow()
+            job.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            job.runs += 1
+            job.last_error = error
+            if error:
+                job.failures += 1
+            job_duration.observe(job.last_duration_ms / 1000.0, job=job.name)
+            job_runs_total.inc(job=job.name, outcome="error" if error else "ok")
+        return error
+
+    async def _run_exclusive(self, job: Job) -> float:
+        """
+        Run the job if it is due and this worker wins the lease.
+        Returns seconds until it should be tried again.
+        """
+        # The coordination queries are blocking: keep them off the event loop
+        lock_conn = await run_in_threadpool(self._try_advisory_lock, job)
+        if lock_conn is False:
+            job.skipped += 1
+            return await run_in_threadpool(self._seconds_until_due, job)
+        try:
+            if not await run_in_threadpool(self._claim_lease, job):
+                return await run_in_threadpool(self._seconds_until_due, job)
+            error = await self._run(job)
+            await run_in_threadpool(self._release_lease, job, error)
+            return job.interval_seconds
+        finally:
+            await run_in_threadpool(self._advisory_unlock, job, lock_conn)
+
+    # ---------- Database coordination ----------
+
+    def _try_advisory_lock(self, job: Job):
+        """
+        PostgreSQL: hold a session advisory lock on a dedicated connection for the run.
+        Returns the connection, None where advisory locks are unavailable, or False
+        if another worker holds it.
+        """
+        if engine is None or engine.dialect.name != "postgresql":
+            return None
+        conn = engine.connect()
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": job.lock_key}).scalar()
+            # Session-level lock outlives the transaction; don't sit idle in one
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        return conn
+
+    def _advisory_unlock(self, job: Job, conn) -> None:
+        if not conn:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": job.lock_key})
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _ensure_row(self, db, job: Job) -> None:
+        if db.get(JobLease, job.name) is not None:
+            return
+        try:
+            db.add(JobLease(name=job.name, run_count=0, failure_count=0))
+            db.commit()
+        except IntegrityError:
+            # Another worker created it first
+            db.rollback()
+
+    def _claim_lease(self, job: Job) -> bool:
+        """Atomically take the lease if the job is due and not held by a live worker."""
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            self._ensure_row(db, job)
+            claimed = db.execute(
+                update(JobLease)
+                .where(
+                    JobLease.name == job.name,
+                    or_(JobLease.next_run_at.is_(None), JobLease.next_run_at <= now),
+                    or_(JobLease.lease_until.is_(None), JobLease.lease_until < now, JobLease.owner == self.owner)
+                )
+                .values(owner=self.owner, lease_until=now + timedelta(seconds=job.lease_seconds))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if not claimed:
+                job.skipped += 1
+            return bool(claimed)
+        finally:
+            db.close()
+
+    def _release_lease(self, job: Job, error: Optional[str]) -> None:
+        """Record the run and schedule the next one an interval after it finished."""
+        db = SessionLocal()
+        try:
+            values = {
+                "owner": None,
+                "lease_until": None,
+                "next_run_at": job.last_finished_at + timedelta(seconds=job.interval_seconds),
+                "last_owner": self.owner,
+                "last_started_at": job.last_started_at,
+                "last_finished_at": job.last_finished_at,
+                "last_duration_ms": job.last_duration_ms,
+                "last_error": error[:MAX_ERROR_LENGTH] if error else None,
+                "run_count": JobLease.run_count + 1,
+            }
+            if error:
+                values["failure_count"] = JobLease.failure_count + 1
+            db.execute(
+                update(JobLease)
+                .where(JobLease.name == job.name, JobLease.owner == self.owner)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _seconds_until_due(self, job: Job) -> float:
+        """Sleep until the stored next_run_at; retry soon if it is due but held elsewhere."""
+        db = SessionLocal()
+        try:
+            next_run_at = db.execute(
+                select(JobLease.next_run_at).where(JobLease.name == job.name)
+            ).scalar()
+        finally:
+            db.close()
+        if next_run_at is not None:
+            remaining = (next_run_at - datetime.utcnow()).total_seconds()
+            if remaining > 0:
+                return min(remaining, job.interval_seconds)
+        return min(BUSY_RETRY_SECONDS, job.interval_seconds)
+
+    # ---------- Status ----------
+
+    def status(self, db=None) -> List[Dict]:
+        """
+        Per-job state: this worker's runs, plus (exclusive jobs, with a db) the
+        cluster-wide lease row describing the last run on any worker.
+        """
+        leases = {}
+        if db is not None:
+            leases = {lease.name: lease for lease in db.query(JobLease).all()}
+        jobs = []
+        for job in self.jobs.values():
+            data = job.to_dict()
+            lease = leases.get(job.name) if job.exclusive else None
+            if lease is not None:
+                data["cluster"] = {
+                    "owner": lease.owner,
+                    "lease_until": lease.lease_until.isoformat() if lease.lease_until else None,
+                    "next_run_at": lease.next_run_at.isoformat() if lease.next_run_at else None,
+                    "last_owner": lease.last_owner,
+                    "last_started_at": lease.last_started_at.isoformat() if lease.last_started_at else None,
+                    "last_finished_at": lease.last_finished_at.isoformat() if lease.last_finished_at else None,
+                    "last_duration_ms": lease.last_duration_ms,
+                    "last_error": lease.last_error,
+                    "run_count": lease.run_count,
+                    "failure_count": lease.failure_count,
+                }
+            jobs.append(data)
+        return jobs
+
+
+# Global scheduler instance (one per worker process)
+scheduler = Scheduler()
@@ -3,13 +3,137 @@ BILI Master System - WebSocket Manager for Real-time Radar
 Implements Silent Decay Logic: Remove offline users with 0 credits
 """
 from fastapi import WebSocket
-from typing import Dict, List, Set, Optional
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, List, Set, Optional, Tuple, Union
 import json
+import gzip
+import zlib
 import asyncio
 from datetime import datetime, timedelta
 from app.core.config import settings
 from app.models.user import User, UserStatus
 from app.core.database import SessionLocal
+from app.core.radar_index import (
+    radar_index, decayed_user_ids_query, is_silent_decayed, RadarEntry
+)
+from app.core.backplane import create_backplane
+from app.core.location_buffer import location_buffer
+from app.core.location_filter import location_filter
+from app.core.geo import GeoArea
+from app.core.metrics import metrics, ws_broadcast_fanout, ws_frames_dropped_total
+
+
+# Frames are encoded once per broadcast and shared by reference across queues
+Frame = Union[str, bytes]
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DISCONNECT = "disconnect"
+
+RADAR_ENCODINGS = ("gzip", "deflate")
+
+
+def _encode_frame(payload: str, encoding: Optional[str]) -> Frame:
+    """JSON text frame, or a gzip/deflate-compressed binary frame."""
+    if encoding == "gzip":
+        return gzip.compress(payload.encode("utf-8"), mtime=0)
+    if encoding == "deflate":
+        return zlib.compress(payload.encode("utf-8"))
+    return payload
+
+
+class ClientConnection:
+    """
+    One connected socket with its own bounded outbound queue and writer task,
+    so a slow client only delays itself and never the broadcaster.
+    """
+    
+    __slots__ = ("socket_id", "websocket", "queue", "writer_task", "dropped_frames")
+    
+    def __init__(self, socket_id: str, websocket: WebSocket, max_queue: int):
+        self.socket_id = socket_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.dropped_frames = 0
+    
+    def offer(self, frame: Frame, policy: str) -> bool:
+        """
+        Queue a frame without waiting.
+        Returns False when the queue is full and the policy is to disconnect.
+        """
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            if policy == OVERFLOW_DISCONNECT:
+                return False
+        # drop_oldest: discard the stalest frame to make room for the newest
+        try:
+            self.queue.get_nowait()
+            self.dropped_frames += 1
+            ws_frames_dropped_total.inc(policy=OVERFLOW_DROP_OLDEST)
+        except asyncio.QueueEmpty:
+            pass
+        self.queue.put_nowait(frame)
+        return True
+    
+    async def write_loop(self):
+        """Drain the queue onto the socket; exits (raising) when the socket fails."""
+        while True:
+            frame = await self.queue.get()
+            if isinstance(frame, bytes):
+                await self.websocket.send_bytes(frame)
+            else:
+                await self.websocket.send_text(frame)
+
+
+class UserSession:
+    """Connection bookkeeping for one authenticated user."""
+    
+    __slots__ = ("user_id", "socket_id", "last_ping", "status")
+    
+    def __init__(self, user_id: str, socket_id: str, status: str = "online"):
+        self.user_id = user_id
+        self.socket_id = socket_id
+        self.last_ping = datetime.utcnow()
+        self.status = status
+
+
+class SilentDecayTracker:
+    """
+    Users whose Silent Decay removal has already been broadcast.
+    
+    Removals are broadcast on the transition into the decayed state (status flips
+    to offline, or balance reaches 0.00 while offline); the periodic reconciliation
+    only diffs the current decayed set against this one.
+    """
+    
+    def __init__(self):
+        self.decayed: Set[str] = set()
+        self.seeded = False
+        self.last_reconciled_at: Optional[datetime] = None
+    
+    def mark_decayed(self, user_id: str) -> bool:
+        """Record a broadcast removal; False if it had already been announced."""
+        if user_id in self.decayed:
+            return False
+        self.decayed.add(user_id)
+        return True
+    
+    def mark_visible(self, user_id: str):
+        """The user is back on the radar: a future decay must be announced again."""
+        self.decayed.discard(user_id)
+    
+    def diff(self, current: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """
+        Compare with the users decayed right now.
+        Returns (newly decayed, restored); restored users are forgotten here,
+        newly decayed ones are recorded when their removal is broadcast.
+        """
+        newly_decayed = current - self.decayed
+        restored = self.decayed - current
+        self.decayed -= restored
+        return newly_decayed, restored
 
 
 class WebSocketManager:
@@ -22,44 +146,83 @@ class WebSocketManager:
     - Zero-lag location broadcasting [cite: 2026-01-09]
     - Efficient batching for 20,000+ users
     - Immediate radar mapping [cite: 2026-02-03]
+    - Interest-based fan-out: clients may subscribe to a viewport or radius
+      ("subscribe_area") and then only receive events located inside it
+    - Per-socket bounded send queues with writer tasks: broadcast latency is
+      independent of the slowest client (WS_SEND_QUEUE_SIZE, WS_SLOW_CONSUMER_POLICY)
+    - request_radar served from the versioned radar index: cached full snapshot
+      (optionally gzip/deflate) or a delta since the client's version
+    - Multi-worker fan-out through a backplane (RADAR_BACKPLANE_URL): location
+      batches, status changes and removals reach sockets on every worker
     """
     
     def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.user_sessions: Dict[str, Dict] = {}  # user_id -> {socket_id, last_ping, status}
+        self.active_connections: Dict[str, ClientConnection] = {}
+        self.user_sessions: Dict[str, UserSession] = {}
+        # Reverse map socket_id -> user_id so ping/disconnect never scan user_sessions
+        self.socket_users: Dict[str, str] = {}
         self.grace_period_tasks: Dict[str, asyncio.Task] = {}
-        # Location update batching for scalability
-        self.location_update_queue: List[Dict] = []
+        # socket_id -> subscribed area (sockets without one receive every event)
+        self.subscriptions: Dict[str, GeoArea] = {}
+        # Location update batching for scalability: user_id -> (latest update, routing points).
+        # Coalesced per user, so only the newest position in each window is sent.
+        self.location_update_queue: Dict[str, Tuple[Dict, List[Tuple[float, float]]]] = {}
         self.batch_task: Optional[asyncio.Task] = None
+        self.batch_interval_seconds = settings.WS_LOCATION_BATCH_INTERVAL_MS / 1000.0
+        self.batch_max_size = settings.WS_LOCATION_BATCH_MAX_SIZE
+        self.send_queue_size = settings.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = settings.WS_SLOW_CONSUMER_POLICY
+        # request_radar snapshot cache, keyed by (index epoch, version) and encoding
+        self._radar_snapshot_key: Optional[Tuple[str, int]] = None
+        self._radar_snapshot_frames: Dict[Optional[str], Frame] = {}
+        self._radar_load_lock = asyncio.Lock()
+        self.backplane = create_backplane()
+        self.silent_decay = SilentDecayTracker()
+        # Event loop owning the sockets; threadpool endpoints hand work back to it
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def bind_loop(self):
+        """Remember the running event loop (startup / first connect)."""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+    
+    def _in_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+    
+    async def start_backplane(self):
+        """Start receiving radar events published by other workers."""
+        self.bind_loop()
+        await self.backplane.start(self.handle_backplane_event)
+    
+    async def stop_backplane(self):
+        await self.backplane.stop()
         
     async def connect(self, websocket: WebSocket, user_id: str = None):
         """Connect a WebSocket client"""
         await websocket.accept()
+        self.bind_loop()
         socket_id = str(id(websocket))
-        self.active_connections[socket_id] = websocket
+        connection = ClientConnection(socket_id, websocket, self.send_queue_size)
+        connection.writer_task = asyncio.create_task(self._run_writer(connection))
+        self.active_connections[socket_id] = connection
         
         # Start batch processing task if not already running
-        if self.batch_task is None or self.batch_task.done():
-            self.batch_task = asyncio.create_task(self.batch_location_updates())
+        self._ensure_batch_task()
         
         if user_id:
-            self.user_sessions[user_id] = {
-                "socket_id": socket_id,
-                "last_ping": datetime.utcnow(),
-                "status": "online"
-            }
-            # Update user status to online in database
+            previous = self.user_sessions.get(user_id)
+            if previous is not None and previous.socket_id != socket_id:
+                # Reconnect: the old socket no longer speaks for this user
+                self.socket_users.pop(previous.socket_id, None)
+            self.user_sessions[user_id] = UserSession(user_id, socket_id)
+            self.socket_users[socket_id] = user_id
+            # Update user status to online in database (off the event loop)
             if SessionLocal is None:
                 return
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(User.id == user_id).first()
-                if user:
-                    user.status = UserStatus.ONLINE
-                    user.last_seen = datetime.utcnow()
-                    db.commit()
-            finally:
-                db.close()
+            await run_in_threadpool(self._store_user_status, user_id, UserStatus.ONLINE)
             # Broadcast user online status
             await self.broadcast_user_status(user_id, "online")
     
@@ -67,15 +230,9 @@ class WebSocketManager:
         """Disconnect a WebSocket client"""
         socket_id = str(id(websocket))
         
-        # Find user_id for this socket
-        user_id = None
-        for uid, session in self.user_sessions.items():
-            if session["socket_id"] == socket_id:
-                user_id = uid
-                break
+        user_id = self.socket_users.pop(socket_id, None)
         
-        if socket_id in self.active_connections:
-            del self.active_connections[socket_id]
+        self._drop_connection(socket_id)
         
         if user_id:
             # Start grace period before marking offline
@@ -92,10 +249,9 @@ class WebSocketManager:
         async def grace_period_handler():
             await asyncio.sleep(settings.SOCKET_GRACE_PERIOD_SECONDS)
             # Check if user still has no active connection
-            if user_id in self.user_sessions:
-                session = self.user_sessions[user_id]
-                if session["socket_id"] not in self.active_connections:
-                    await self.mark_user_offline(user_id)
+            session = self.user_sessions.get(user_id)
+            if session is not None and session.socket_id not in self.active_connections:
+                await self.mark_user_offline(user_id)
         
         task = asyncio.create_task(grace_period_handler())
         self.grace_period_tasks[user_id] = task
@@ -107,20 +263,37 @@ class WebSocketManager:
         """
         if SessionLocal is None:
             return
+        user = await run_in_threadpool(self._store_user_status, user_id, UserStatus.OFFLINE)
+        if user is None:
+            return
+        
+        # Silent Decay Logic: Remove if balance is 0.00
+        if is_silent_decayed(user.status, user.credit_balance, user.is_invisible):
+            await self.remove_from_radar(user_id)
+        else:
+            # Broadcast offline status (but keep on radar if credits > 0)
+            await self.broadcast_user_status(user_id, "offline")
+    
+    def _store_user_status(self, user_id: str, status: UserStatus) -> Optional[User]:
+        """
+        Blocking part of connect / mark_user_offline (runs in the threadpool):
+        persist status and last_seen and update the radar index.
+        Returns the refreshed, detached user, or None if it does not exist.
+        """
         db = SessionLocal()
         try:
             user = db.query(User).filter(User.id == user_id).first()
-            if user:
-                user.status = UserStatus.OFFLINE
-                user.last_seen = datetime.utcnow()
-                db.commit()
-                
-                # Silent Decay Logic: Remove if balance is 0.00
-                if user.credit_balance == 0.00:
-                    await self.remove_from_radar(user_id)
-                else:
-                    # Broadcast offline status (but keep on radar if credits > 0)
-                    await self.broadcast_user_status(user_id, "offline")
+            if user is None:
+                return None
+            user.status = status
+            if status == UserStatus.OFFLINE:
+                location_buffer.cancel_online(user_id)
+                location_filter.forget(user_id)
+            user.last_seen = datetime.utcnow()
+            db.commit()
+            db.refresh(user)
+            radar_index.upsert_user(user)
+            return user
         finally:
             db.close()
     
@@ -129,105 +302,350 @@ class WebSocketManager:
         Remove user from radar (Silent Decay Logic).
         Broadcast removal to all connected clients.
         """
-        if user_id in self.user_sessions:
-            del self.user_sessions[user_id]
+        session = self.user_sessions.pop(user_id, None)
+        if session is not None and self.socket_users.get(session.socket_id) == user_id:
+            del self.socket_users[session.socket_id]
+        self.silent_decay.mark_decayed(user_id)
+        points = self._user_points(user_id)
+        radar_index.remove(user_id)
         
-        # Broadcast removal to all clients
+        # Broadcast removal to clients whose area contained the user
         message = {
             "type": "user_removed",
             "user_id": user_id,
             "reason": "silent_decay",
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.broadcast(message)
+        await self.broadcast(message, points=points)
+        await self.backplane.publish("user_removed", {
+            "user_id": user_id,
+            "message": message,
+            "points": points
+        })
+    
+    async def reconcile_silent_decay(self, db, announce: bool = True) -> Dict:
+        """
+        Cheap Silent Decay reconciliation: one id-only query, diffed against the
+        users already announced. Only users that newly decayed through a path
+        without a transition hook are broadcast; users that became visible again
+        are forgotten so their next decay is announced.
+        
+        With announce=False (first run after startup) the current set is only
+        recorded: connecting clients get it through radar_state anyway.
+        """
+        rows = await run_in_threadpool(lambda: decayed_user_ids_query(db).all())
+        current = {str(user_id) for (user_id,) in rows}
+        newly_decayed, restored = self.silent_decay.diff(current)
+        if announce:
+            for user_id in newly_decayed:
+                await self.remove_from_radar(user_id)
+        else:
+            self.silent_decay.decayed |= newly_decayed
+            for user_id in newly_decayed:
+                radar_index.remove(user_id)
+        self.silent_decay.seeded = True
+        self.silent_decay.last_reconciled_at = datetime.utcnow()
+        return {
+            "removed_count": len(newly_decayed) if announce else 0,
+            "restored_count": len(restored),
+            "decayed_total": len(self.silent_decay.decayed)
+        }
     
     async def broadcast_user_status(self, user_id: str, status: str):
-        """Broadcast user status change to all connected clients"""
+        """Broadcast user status change to clients whose area contains the user"""
         message = {
             "type": "user_status_update",
             "user_id": user_id,
             "status": status,
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.broadcast(message)
+        if status != "offline" or radar_index.get(user_id) is not None:
+            self.silent_decay.mark_visible(user_id)
+        points = self._user_points(user_id)
+        await self.broadcast(message, points=points)
+        await self.backplane.publish("user_status", {
+            "user_id": user_id,
+            "status": status,
+            "message": message,
+            "points": points,
+            "entry": self._entry_dict(user_id)
+        })
+    
+    def _entry_dict(self, user_id: str) -> Optional[Dict]:
+        entry = radar_index.get(user_id)
+        return entry.to_dict() if entry is not None else None
+    
+    def _apply_remote_entry(self, user_id: str, entry: Optional[Dict]):
+        """Mirror another worker's radar index change into ours."""
+        if entry is None:
+            radar_index.remove(user_id)
+        else:
+            radar_index.upsert_entry(RadarEntry.from_dict(entry))
+    
+    async def handle_backplane_event(self, event: str, payload: Dict):
+        """
+        Deliver a radar event published by another worker to our sockets.
+        Local sessions are left alone except when the user came online elsewhere,
+        which supersedes any grace period running here.
+        """
+        if event == "location_batch":
+            batch = []
+            for update, points, entry in payload.get("updates", []):
+                self._apply_remote_entry(update["user_id"], entry)
+                batch.append((update, [tuple(point) for point in points]))
+            if batch and self.active_connections:
+                await self.send_location_batch(batch)
+            return
+        
+        user_id = payload.get("user_id")
+        if event == "user_removed":
+            radar_index.remove(user_id)
+            self.silent_decay.mark_decayed(user_id)
+        elif event == "user_status":
+            self._apply_remote_entry(user_id, payload.get("entry"))
+            if payload.get("entry") is not None:
+                self.silent_decay.mark_visible(user_id)
+            if payload.get("status") == "online":
+                task = self.grace_period_tasks.pop(user_id, None)
+                if task is not None:
+                    task.cancel()
+                session = self.user_sessions.get(user_id)
+                if session is not None and session.socket_id not in self.active_connections:
+                    del self.user_sessions[user_id]
+        else:
+            return
+        points = payload.get("points")
+        await self.broadcast(
+            payload["message"],
+            points=[tuple(point) for point in points] if points else None
+        )
+    
+    def _user_points(self, user_id: str) -> Optional[List[Tuple[float, float]]]:
+        """Last known radar position of a user, used to route events (None if unknown)."""
+        entry = radar_index.get(user_id)
+        if entry is None:
+            return None
+        return [(entry.latitude, entry.longitude)]
+    
+    def _is_interested(self, socket_id: str, points: Optional[List[Tuple[float, float]]]) -> bool:
+        """True if the socket has no area, the event has no position, or any point is inside the area."""
+        area = self.subscriptions.get(socket_id)
+        if area is None or not points:
+            return True
+        return any(area.contains(lat, lon) for lat, lon in points)
     
-    async def broadcast(self, message: dict):
+    async def broadcast(self, message: dict, points: Optional[List[Tuple[float, float]]] = None):
         """
-        Broadcast message to all connected WebSocket clients.
+        Broadcast message to connected WebSocket clients.
         Optimized for 20,000+ concurrent connections [cite: 2026-01-09].
+        
+        Args:
+            message: Message payload
+            points: Event positions as (latitude, longitude); when given, sockets with a
+                subscribed area only receive the message if one of the points is inside it
         """
         if not self.active_connections:
             return
         
-        disconnected = []
+        # Encoded once, shared by reference across every socket's queue
         message_json = json.dumps(message)
+        frames = {
+            socket_id: message_json
+            for socket_id in self.active_connections
+            if self._is_interested(socket_id, points)
+        }
+        ws_broadcast_fanout.observe(len(frames), kind=message.get("type", "unknown"))
+        self._queue_frames(frames)
+    
+    def _queue_frames(self, frames: Dict[str, Frame]):
+        """
+        Queue pre-encoded frames (socket_id -> frame) on each socket's send queue.
+        Never waits on a socket: writer tasks do the actual sends.
+        """
+        slow_consumers = []
+        for socket_id, frame in frames.items():
+            connection = self.active_connections.get(socket_id)
+            if connection is not None and not connection.offer(frame, self.overflow_policy):
+                slow_consumers.append(socket_id)
         
-        # Batch send to all connections (non-blocking)
-        tasks = []
-        for socket_id, connection in self.active_connections.items():
-            try:
-                tasks.append(connection.send_text(message_json))
-            except Exception:
-                disconnected.append(socket_id)
-        
-        # Send to all connections concurrently
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            # Track failed connections
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    socket_id = list(self.active_connections.keys())[i]
-                    disconnected.append(socket_id)
-        
-        # Clean up disconnected clients
-        for socket_id in disconnected:
-            if socket_id in self.active_connections:
-                del self.active_connections[socket_id]
+        # Disconnect slow consumers (WS_SLOW_CONSUMER_POLICY=disconnect)
+        for socket_id in slow_consumers:
+            ws_frames_dropped_total.inc(policy=OVERFLOW_DISCONNECT)
+            self._drop_connection(socket_id, close_code=1013)
+    
+    async def send_to(self, websocket: WebSocket, message: Union[dict, Frame]):
+        """Queue a direct reply to one socket (keeps ordering with broadcasts)."""
+        frame = json.dumps(message) if isinstance(message, dict) else message
+        self._queue_frames({str(id(websocket)): frame})
+    
+    async def _run_writer(self, connection: ClientConnection):
+        try:
+            await connection.write_loop()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Send failed: the socket is gone
+            self._drop_connection(connection.socket_id)
+    
+    def _drop_connection(self, socket_id: str, close_code: Optional[int] = None):
+        """Forget a socket, stop its writer and optionally close it."""
+        connection = self.active_connections.pop(socket_id, None)
+        self.subscriptions.pop(socket_id, None)
+        if connection is None:
+            return
+        task = connection.writer_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        if close_code is not None:
+            asyncio.create_task(self._close_quietly(connection.websocket, close_code))
+    
+    async def _close_quietly(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
     
     async def broadcast_location_update(
         self,
         user_id: str,
         latitude: float,
         longitude: float,
-        auto_detect: bool = False
+        auto_detect: bool = False,
+        previous_latitude: Optional[float] = None,
+        previous_longitude: Optional[float] = None
     ):
         """
-        Broadcast location update with zero lag [cite: 2026-01-09].
+        Queue a location update for the next batch tick [cite: 2026-01-09].
         Immediately maps user to global radar view [cite: 2026-02-03].
+        
+        Updates are coalesced per user and sent as one batch_location_update
+        frame per tick, so the outbound message rate is bounded no matter how
+        many GPS pings arrive. Each update also carries status "online",
+        replacing the separate user_status_update broadcast.
         """
-        message = {
-            "type": "location_update",
+        self.enqueue_location_update(
+            user_id, latitude, longitude, auto_detect,
+            previous_latitude, previous_longitude
+        )
+    
+    def enqueue_location_update(
+        self,
+        user_id: str,
+        latitude: float,
+        longitude: float,
+        auto_detect: bool = False,
+        previous_latitude: Optional[float] = None,
+        previous_longitude: Optional[float] = None
+    ):
+        """
+        Coalesce a location update into the pending batch (latest position wins).
+        Safe to call from threadpool endpoints: the update is handed to the event loop.
+        """
+        if self.loop is not None and not self._in_loop_thread():
+            self.loop.call_soon_threadsafe(
+                self.enqueue_location_update, user_id, latitude, longitude,
+                auto_detect, previous_latitude, previous_longitude
+            )
+            return
+        update = {
             "user_id": user_id,
             "latitude": latitude,
             "longitude": longitude,
+            "status": "online",
             "auto_detect": auto_detect,
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.broadcast(message)
-        
-        # Also send updated radar state to requesting clients
-        # This ensures immediate visibility on radar
-        await self.broadcast_user_status(user_id, "online")
+        points = [(latitude, longitude)]
+        pending = self.location_update_queue.get(user_id)
+        if pending is not None:
+            # Keep where the user was at the start of the window for routing
+            points.extend(pending[1][1:] or pending[1][:1])
+        elif previous_latitude is not None and previous_longitude is not None:
+            points.append((previous_latitude, previous_longitude))
+        self.location_update_queue[user_id] = (update, points)
+        self._ensure_batch_task()
+    
+    def _ensure_batch_task(self):
+        """Start the batch loop on the running event loop if it is not running yet."""
+        if self.batch_task is None or self.batch_task.done():
+            try:
+                self.batch_task = asyncio.get_running_loop().create_task(self.batch_location_updates())
+            except RuntimeError:
+                pass  # No running loop yet; started on the next connect/enqueue
+    
+    def _take_location_batch(self) -> List[Tuple[Dict, List[Tuple[float, float]]]]:
+        """Pop up to batch_max_size pending updates, oldest first."""
+        if len(self.location_update_queue) <= self.batch_max_size:
+            batch = list(self.location_update_queue.values())
+            self.location_update_queue.clear()
+            return batch
+        batch_ids = []
+        for user_id in self.location_update_queue:
+            batch_ids.append(user_id)
+            if len(batch_ids) >= self.batch_max_size:
+                break
+        return [self.location_update_queue.pop(user_id) for user_id in batch_ids]
     
     async def batch_location_updates(self):
         """
         Process batched location updates for scalability.
-        Reduces WebSocket message overhead for 20,000+ users.
+        Reduces WebSocket message overhead for 20,000+ users: one
+        batch_location_update frame per tick (WS_LOCATION_BATCH_INTERVAL_MS),
+        at most WS_LOCATION_BATCH_MAX_SIZE updates per frame.
         """
         while True:
-            await asyncio.sleep(0.1)  # 100ms batch window
-            if self.location_update_queue:
-                updates = self.location_update_queue.copy()
+            await asyncio.sleep(self.batch_interval_seconds)
+            if not self.location_update_queue:
+                continue
+            if not self.active_connections and not self.backplane.distributed:
                 self.location_update_queue.clear()
-                
-                # Send batched location updates
-                if updates:
-                    message = {
+                continue
+            try:
+                batch = self._take_location_batch()
+                if self.active_connections:
+                    await self.send_location_batch(batch)
+                if self.backplane.distributed:
+                    await self.backplane.publish("location_batch", {
+                        "updates": [
+                            (update, points, self._entry_dict(update["user_id"]))
+                            for update, points in batch
+                        ]
+                    })
+            except Exception as e:
+                print(f"Error sending location batch: {e}")
+    
+    async def send_location_batch(self, batch: List[Tuple[Dict, List[Tuple[float, float]]]]):
+        """
+        Send one batch_location_update frame to each socket.
+        Sockets without a subscribed area share one encoded frame; subscribed
+        sockets get only the updates inside their area (or none at all).
+        """
+        timestamp = datetime.utcnow().isoformat()
+        full_frame = None
+        frames: Dict[str, str] = {}
+        for socket_id in self.active_connections:
+            area = self.subscriptions.get(socket_id)
+            if area is None:
+                if full_frame is None:
+                    full_frame = json.dumps({
                         "type": "batch_location_update",
-                        "updates": updates,
-                        "timestamp": datetime.utcnow().isoformat()
-                    }
-                    await self.broadcast(message)
+                        "updates": [update for update, _ in batch],
+                        "timestamp": timestamp
+                    })
+                frames[socket_id] = full_frame
+                continue
+            updates = [
+                update for update, points in batch
+                if any(area.contains(lat, lon) for lat, lon in points)
+            ]
+            if updates:
+                frames[socket_id] = json.dumps({
+                    "type": "batch_location_update",
+                    "updates": updates,
+                    "timestamp": timestamp
+                })
+        ws_broadcast_fanout.observe(len(frames), kind="batch_location_update")
+        self._queue_frames(frames)
     
     async def handle_message(self, websocket: WebSocket, data: str):
         """Handle incoming WebSocket message"""
@@ -237,68 +655,146 @@ class WebSocketManager:
             
             if message_type == "ping":
                 # Update last ping time
-                socket_id = str(id(websocket))
-                for user_id, session in self.user_sessions.items():
-                    if session["socket_id"] == socket_id:
-                        session["last_ping"] = datetime.utcnow()
-                        await websocket.send_text(json.dumps({"type": "pong"}))
-                        break
+                user_id = self.socket_users.get(str(id(websocket)))
+                session = self.user_sessions.get(user_id) if user_id else None
+                if session is not None:
+                    session.last_ping = datetime.utcnow()
+                    await self.send_to(websocket, {"type": "pong"})
             
             elif message_type == "request_radar":
-                # Send current radar state
-                await self.send_radar_state(websocket)
+                # Send current radar state (full snapshot or delta)
+                await self.send_radar_state(websocket, message)
+            
+            elif message_type == "subscribe_area":
+                await self.subscribe_area(websocket, message)
+            
+            elif message_type == "unsubscribe_area":
+                self.subscriptions.pop(str(id(websocket)), None)
+                await self.send_to(websocket, {"type": "area_unsubscribed"})
         
         except json.JSONDecodeError:
-            await websocket.send_text(json.dumps({"error": "Invalid JSON"}))
+            await self.send_to(websocket, {"error": "Invalid JSON"})
     
-    async def send_radar_state(self, websocket: WebSocket):
+    async def subscribe_area(self, websocket: WebSocket, message: dict):
         """
-        Send current radar state (only online users, or offline users with credits > 0).
-        Silent Decay: Users with status="offline" AND balance=0.00 are excluded.
+        Subscribe a socket to a geographic area. Accepts either a viewport:
+            {"type": "subscribe_area", "bounds": {"south": .., "west": .., "north": .., "east": ..}}
+        or a radius:
+            {"type": "subscribe_area", "latitude": .., "longitude": .., "radius_km": ..}
+        Location, status and removal events outside the area are no longer sent to it.
         """
-        if SessionLocal is None:
-            await websocket.send_text(json.dumps({"type": "radar_state", "users": []}))
-            return
-        db = SessionLocal()
         try:
-            # Get all users that should appear on radar:
-            # - Status = "online" OR
-            # - Status = "offline" AND credit_balance > 0.00
-            from sqlalchemy import or_, and_
-            radar_users = db.query(User).filter(
-                or_(
-                    User.status == UserStatus.ONLINE,
-                    and_(
-                        User.status == UserStatus.OFFLINE,
-                        User.credit_balance > 0.00
-                    )
+            bounds = message.get("bounds")
+            if bounds:
+                area = GeoArea.from_bounds(
+                    float(bounds["south"]), float(bounds["west"]),
+                    float(bounds["north"]), float(bounds["east"])
                 )
-            ).filter(
-                User.is_invisible == False,
-                User.latitude.isnot(None),
-                User.longitude.isnot(None)
-            ).all()
-            
-            radar_data = {
-                "type": "radar_state",
-                "users": [
-                    {
-                        "user_id": str(user.id),
-                        "latitude": user.latitude,
-                        "longitude": user.longitude,
-                        "status": user.status.value,
-                        "credit_balance": float(user.credit_balance),
-                        "last_seen": user.last_seen.isoformat() if user.last_seen else None
-                    }
-                    for user in radar_users
-                ],
-                "timestamp": datetime.utcnow().isoformat()
+            else:
+                area = GeoArea.from_radius(
+                    float(message["latitude"]),
+                    float(message["longitude"]),
+                    float(message.get("radius_km", settings.DEFAULT_NOTIFICATION_RADIUS_KM))
+                )
+        except (KeyError, TypeError, ValueError):
+            await self.send_to(websocket, {"error": "Invalid subscribe_area payload"})
+            return
+        
+        self.subscriptions[str(id(websocket))] = area
+        await self.send_to(websocket, {"type": "area_subscribed"})
+    
+    async def send_radar_state(self, websocket: WebSocket, request: Optional[dict] = None):
+        """
+        Send current radar state (only online users, or offline users with credits > 0).
+        Silent Decay: Users with status="offline" AND balance=0.00 are excluded.
+        
+        Served from the versioned in-memory radar index, not a query per request:
+        - {"since_version": N, "epoch": E} sends only the changes after N ("radar_delta"),
+          or the full snapshot if the delta is no longer available
+        - {"encoding": "gzip" | "deflate"} sends a compressed binary frame
+        """
+        request = request or {}
+        await self._ensure_radar_index()
+        encoding = request.get("encoding")
+        if encoding not in RADAR_ENCODINGS:
+            encoding = None
+        
+        since_version = request.get("since_version")
+        if isinstance(since_version, int) and request.get("epoch") == radar_index.epoch:
+            delta = radar_index.changes_since(since_version)
+            if delta is not None:
+                upserts, removed = delta
+                payload = json.dumps({
+                    "type": "radar_delta",
+                    "epoch": radar_index.epoch,
+                    "from_version": since_version,
+                    "version": radar_index.version,
+                    "users": [entry.to_dict() for entry in upserts],
+                    "removed": removed,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                await self.send_to(websocket, _encode_frame(payload, encoding))
+                return
+        
+        await self.send_to(websocket, self._radar_snapshot_frame(encoding))
+    
+    def _radar_snapshot_frame(self, encoding: Optional[str]) -> Frame:
+        """Full radar_state frame, serialized (and compressed) once per index version."""
+        key = (radar_index.epoch, radar_index.version)
+        if self._radar_snapshot_key != key:
+            self._radar_snapshot_key = key
+            self._radar_snapshot_frames = {
+                None: json.dumps({
+                    "type": "radar_state",
+                    "epoch": radar_index.epoch,
+                    "version": radar_index.version,
+                    "users": [entry.to_dict() for entry in radar_index.all_entries()],
+                    "timestamp": datetime.utcnow().isoformat()
+                })
             }
-            
-            await websocket.send_text(json.dumps(radar_data))
-        finally:
-            db.close()
+        frame = self._radar_snapshot_frames.get(encoding)
+        if frame is None:
+            frame = _encode_frame(self._radar_snapshot_frames[None], encoding)
+            self._radar_snapshot_frames[encoding] = frame
+        return frame
+    
+    async def _ensure_radar_index(self):
+        """
+        Load the radar index from the database if it is cold.
+        Single-flight: concurrent requests wait for one query instead of each running it.
+        """
+        if radar_index.is_warm or SessionLocal is None:
+            return
+        async with self._radar_load_lock:
+            if radar_index.is_warm:
+                return
+            db = SessionLocal()
+            try:
+                # Query and rebuild in the threadpool; waiters keep yielding to the loop
+                await run_in_threadpool(radar_index.reload, db)
+            finally:
+                db.close()
 
 
 # Global WebSocket manager instance
 websocket_manager = WebSocketManager()
+
+# Scrape-time gauges
+metrics.gauge("bili_ws_connections", "Open WebSocket connections on this worker").set_function(
+    lambda: len(websocket_manager.active_connections)
+)
+metrics.gauge("bili_ws_user_sessions", "Tracked user sessions (including grace periods)").set_function(
+    lambda: len(websocket_manager.user_sessions)
+)
+metrics.gauge("bili_ws_send_queue_depth", "Frames waiting in all per-socket send queues").set_function(
+    lambda: sum(c.queue.qsize() for c in list(websocket_manager.active_connections.values()))
+)
+metrics.gauge("bili_ws_send_queue_max_depth", "Deepest per-socket send queue").set_function(
+    lambda: max((c.queue.qsize() for c in list(websocket_manager.active_connections.values())), default=0)
+)
+metrics.gauge("bili_ws_location_updates_pending", "Location updates waiting for the next batch frame").set_function(
+    lambda: len(websocket_manager.location_update_queue)
+)
+metrics.gauge("bili_location_buffer_pending", "Buffered GPS positions not yet written to the DB").set_function(
+    lambda: len(location_buffer)
+)
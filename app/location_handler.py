@@ -19,11 +19,13 @@ from sqlalchemy import or_, and_
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 import uuid
-import asyncio
-import math
 from collections import defaultdict
 from app.models.user import User, UserStatus
 from app.core.websocket import websocket_manager
+from app.core.radar_index import radar_index, RadarEntry, is_radar_visible
+from app.core.location_buffer import location_buffer
+from app.core.location_filter import location_filter, ACCEPTED, STATIONARY
+from app.core.geo import haversine_km, nearest_within
 from app.core.config import settings
 
 
@@ -36,10 +38,6 @@ class LocationHandler:
     
     def __init__(self, db: Session):
         self.db = db
-        # Location update batching for scalability
-        self.pending_updates: Dict[str, Dict] = {}
-        self.batch_interval = 0.5  # 500ms batching window
-        self.last_batch_time = datetime.utcnow()
     
     def detect_and_set_location(
         self,
@@ -73,6 +71,7 @@ class LocationHandler:
             - should_appear_on_radar: bool
             - distance_moved_km: Optional[float]
             - timestamp: str
+            - suppressed: "stationary" / "rate_limited" if not written or broadcast
         """
         try:
             user_uuid = uuid.UUID(user_id)
@@ -82,7 +81,20 @@ class LocationHandler:
                 "error": "Invalid user ID format"
             }
         
-        user = self.db.query(User).filter(User.id == user_uuid).first()
+        # Movement threshold + rate limit: a suppressed ping only refreshes last_seen
+        suppressed = self._filter_location(str(user_uuid), latitude, longitude, auto_detect)
+        if suppressed is not None:
+            return suppressed
+        
+        # One light SELECT of the radar fields; the write goes to the buffer (no commit here)
+        user = self.db.query(
+            User.latitude,
+            User.longitude,
+            User.status,
+            User.credit_balance,
+            User.is_invisible,
+            User.display_name
+        ).filter(User.id == user_uuid).first()
         if not user:
             return {
                 "success": False,
@@ -96,22 +108,33 @@ class LocationHandler:
                 "error": "Invalid coordinates. Latitude must be between -90 and 90, longitude between -180 and 180"
             }
         
-        # Update user location
-        previous_lat = user.latitude
-        previous_lon = user.longitude
+        # Previous position: the unflushed one if any, else the stored one
+        buffered = location_buffer.get(str(user_uuid))
+        if buffered is not None:
+            previous_lat, previous_lon = buffered.latitude, buffered.longitude
+        else:
+            previous_lat, previous_lon = user.latitude, user.longitude
         
-        user.latitude = latitude
-        user.longitude = longitude
-        user.last_location_update = datetime.utcnow()
-        user.last_seen = datetime.utcnow()
+        # Update user location (written by the next buffer flush)
+        location = location_buffer.put(str(user_uuid), latitude, longitude)
         
         # Set status to online when location is detected
-        if user.status == UserStatus.OFFLINE:
-            user.status = UserStatus.ONLINE
+        status = UserStatus.ONLINE if user.status == UserStatus.OFFLINE else user.status
+        should_appear_on_radar = is_radar_visible(status, user.credit_balance)
         
-        # Commit to database
-        self.db.commit()
-        self.db.refresh(user)
+        if should_appear_on_radar and not user.is_invisible:
+            radar_index.upsert_entry(RadarEntry(
+                user_id=str(user_uuid),
+                latitude=latitude,
+                longitude=longitude,
+                status=status,
+                credit_balance=float(user.credit_balance or 0),
+                last_seen=location.timestamp.isoformat(),
+                display_name=user.display_name,
+            ))
+        else:
+            radar_index.remove(str(user_uuid))
+        location_filter.accepted(str(user_uuid), latitude, longitude, status.value, should_appear_on_radar)
         
         # Calculate distance moved (if previous location exists)
         distance_moved_km = None
@@ -125,26 +148,11 @@ class LocationHandler:
             )
         
         # IMMEDIATE RADAR MAPPING [cite: 2026-01-09]
-        # Broadcast location update via WebSocket immediately (zero lag)
-        try:
-            # Create async task for broadcasting (non-blocking)
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.create_task(
-                    self._broadcast_location_update(user_id, latitude, longitude, auto_detect)
-                )
-            else:
-                loop.run_until_complete(
-                    self._broadcast_location_update(user_id, latitude, longitude, auto_detect)
-                )
-        except RuntimeError:
-            # If no event loop, create a new one
-            asyncio.run(
-                self._broadcast_location_update(user_id, latitude, longitude, auto_detect)
-            )
-        except Exception as e:
-            # Log error but don't fail location update
-            print(f"Warning: Failed to broadcast location update: {e}")
+        # Queue the WebSocket broadcast (zero lag); safe from threadpool endpoints,
+        # the update is handed to the event loop that owns the sockets
+        self._broadcast_location_update(
+            user_id, latitude, longitude, auto_detect, previous_lat, previous_lon
+        )
         
         return {
             "success": True,
@@ -152,31 +160,73 @@ class LocationHandler:
             "user_id": user_id,
             "latitude": latitude,
             "longitude": longitude,
-            "status": user.status.value,
-            "should_appear_on_radar": user.should_appear_on_radar(),
+            "status": status.value,
+            "should_appear_on_radar": should_appear_on_radar,
             "distance_moved_km": distance_moved_km,
             "timestamp": datetime.utcnow().isoformat()
         }
     
-    async def _broadcast_location_update(
+    def _filter_location(
+        self,
+        user_id: str,
+        latitude: float,
+        longitude: float,
+        auto_detect: bool
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Apply the GPS update filter (LOCATION_MIN_MOVE_METERS, LOCATION_MIN_INTERVAL_SECONDS,
+        per-user token bucket). Returns the response for a suppressed ping, or None
+        when the ping should be written and broadcast.
+        
+        Only users with an accepted ping in this worker can be suppressed, so
+        unknown users, bad coordinates and the first ping always take the full path.
+        """
+        track = location_filter.last_accepted(user_id)
+        if track is None or not self.validate_coordinates(latitude, longitude):
+            return None
+        outcome = location_filter.check(user_id, latitude, longitude, force=auto_detect)
+        if outcome == ACCEPTED:
+            return None
+        
+        location_buffer.touch(user_id)
+        return {
+            "success": True,
+            "message": "Location unchanged" if outcome == STATIONARY else "Location update rate limited",
+            "user_id": user_id,
+            "latitude": track.latitude,
+            "longitude": track.longitude,
+            "status": track.status,
+            "should_appear_on_radar": track.visible,
+            "distance_moved_km": round(
+                self._calculate_distance_km(track.latitude, track.longitude, latitude, longitude), 2
+            ),
+            "timestamp": datetime.utcnow().isoformat(),
+            "suppressed": outcome
+        }
+    
+    def _broadcast_location_update(
         self,
         user_id: str,
         latitude: float,
         longitude: float,
-        auto_detect: bool = False
+        auto_detect: bool = False,
+        previous_latitude: Optional[float] = None,
+        previous_longitude: Optional[float] = None
     ):
         """
-        Broadcast location update to all connected WebSocket clients.
+        Broadcast location update to interested WebSocket clients.
         Zero-lag real-time update for immediate radar mapping [cite: 2026-01-09].
         Uses optimized WebSocket broadcasting for 20,000+ users.
         """
         try:
-            # Use optimized location broadcasting
-            await websocket_manager.broadcast_location_update(
+            # Coalesced into the next batch_location_update frame
+            websocket_manager.enqueue_location_update(
                 user_id=user_id,
                 latitude=latitude,
                 longitude=longitude,
-                auto_detect=auto_detect
+                auto_detect=auto_detect,
+                previous_latitude=previous_latitude,
+                previous_longitude=previous_longitude
             )
         except Exception as e:
             # Log error but don't fail location update
@@ -190,7 +240,8 @@ class LocationHandler:
     ):
         """
         Batch location updates for scalability (20,000+ users) [cite: 2026-01-09].
-        Accumulates updates and processes them in batches to reduce database load.
+        Delegates to the process-wide location write-behind buffer, which bulk-writes
+        all pending positions every LOCATION_FLUSH_INTERVAL_MS.
         
         Args:
             user_id: User UUID
@@ -201,60 +252,7 @@ class LocationHandler:
         if not self.validate_coordinates(latitude, longitude):
             return
         
-        # Store pending update
-        self.pending_updates[user_id] = {
-            "latitude": latitude,
-            "longitude": longitude,
-            "timestamp": datetime.utcnow()
-        }
-        
-        # Process batch if interval elapsed
-        elapsed = (datetime.utcnow() - self.last_batch_time).total_seconds()
-        if elapsed >= self.batch_interval:
-            self._process_batch()
-    
-    def _process_batch(self):
-        """Process batched location updates"""
-        if not self.pending_updates:
-            return
-        
-        updates = self.pending_updates.copy()
-        self.pending_updates.clear()
-        self.last_batch_time = datetime.utcnow()
-        
-        # Process updates in batch
-        for user_id, update_data in updates.items():
-            try:
-                user_uuid = uuid.UUID(user_id)
-                user = self.db.query(User).filter(User.id == user_uuid).first()
-                if user:
-                    user.latitude = update_data["latitude"]
-                    user.longitude = update_data["longitude"]
-                    user.last_location_update = update_data["timestamp"]
-                    user.last_seen = update_data["timestamp"]
-                    if user.status == UserStatus.OFFLINE:
-                        user.status = UserStatus.ONLINE
-            except (ValueError, Exception) as e:
-                print(f"Error processing batch update for user {user_id}: {e}")
-                continue
-        
-        self.db.commit()
-        
-        # Broadcast all updates
-        for user_id, update_data in updates.items():
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    asyncio.create_task(
-                        self._broadcast_location_update(
-                            user_id,
-                            update_data["latitude"],
-                            update_data["longitude"],
-                            auto_detect=False
-                        )
-                    )
-            except Exception as e:
-                print(f"Error broadcasting batch update for user {user_id}: {e}")
+        self.detect_and_set_location(user_id, latitude, longitude, auto_detect=False)
     
     def get_user_location(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -272,10 +270,12 @@ class LocationHandler:
             return None
         
         user = self.db.query(User).filter(User.id == user_uuid).first()
-        if not user or user.latitude is None or user.longitude is None:
+        if not user:
+            return None
+        if (user.latitude is None or user.longitude is None) and location_buffer.get(user_id) is None:
             return None
         
-        return {
+        data = location_buffer.overlay({
             "user_id": user_id,
             "latitude": user.latitude,
             "longitude": user.longitude,
@@ -284,7 +284,9 @@ class LocationHandler:
             "should_appear_on_radar": user.should_appear_on_radar(),
             "display_name": user.display_name,
             "credit_balance": float(user.credit_balance)
-        }
+        }, user_id)
+        data["should_appear_on_radar"] = is_radar_visible(UserStatus(data["status"]), user.credit_balance)
+        return data
     
     def get_nearby_users(
         self,
@@ -295,7 +297,9 @@ class LocationHandler:
     ) -> List[Dict[str, Any]]:
         """
         Get users within radius (optimized query for 20,000+ users).
-        Uses database indexes for fast geolocation queries.
+        Uses a bounding-box prefilter on idx_users_location, then scores
+        candidates in one vectorized Haversine pass and returns the nearest first.
+        Unflushed buffered positions are merged before the radius filter and limit.
         
         Args:
             latitude: Center latitude
@@ -310,11 +314,8 @@ class LocationHandler:
         if not self.validate_coordinates(latitude, longitude):
             return []
         
-        # Query users with location (using indexes)
         # Apply Silent Decay Logic: only online or offline with credits
-        users = self.db.query(User).filter(
-            User.latitude.isnot(None),
-            User.longitude.isnot(None),
+        query = self.db.query(User).filter(
             User.is_invisible == False
         ).filter(
             or_(
@@ -324,37 +325,52 @@ class LocationHandler:
                     User.credit_balance > 0.00
                 )
             )
-        ).limit(limit * 2).all()  # Get more to filter by distance
-        
-        nearby_users = []
-        for user in users:
-            if user.latitude is None or user.longitude is None:
-                continue
-                
-            distance = self._calculate_distance_km(
-                latitude, longitude,
-                user.latitude, user.longitude
-            )
-            
-            if distance <= radius_km:
-                nearby_users.append({
-                    "user_id": str(user.id),
-                    "latitude": user.latitude,
-                    "longitude": user.longitude,
-                    "distance_km": round(distance, 2),
-                    "status": user.status.value,
-                    "display_name": user.display_name,
-                    "credit_balance": float(user.credit_balance),
-                    "last_seen": user.last_seen.isoformat() if user.last_seen else None
-                })
-                
-                if len(nearby_users) >= limit:
-                    break
-        
-        # Sort by distance
-        nearby_users.sort(key=lambda x: x["distance_km"])
-        
-        return nearby_users
+        )
+        
+        # Bounding box in SQL (idx_users_location), exact distance in one pass; the
+        # limit is applied after buffered positions are merged (they may move users
+        # out of range)
+        matches = nearest_within(
+            query, User.latitude, User.longitude,
+            latitude, longitude, radius_km
+        )
+        
+        # Users whose unflushed position moved into range (the SQL box sees the stored one)
+        found = {str(user.id) for user, _ in matches}
+        moved_in = [
+            uuid.UUID(location.user_id) for location in location_buffer.positions()
+            if location.user_id not in found
+            and haversine_km(latitude, longitude, location.latitude, location.longitude) <= radius_km
+        ]
+        if moved_in:
+            matches.extend((user, None) for user in query.filter(User.id.in_(moved_in)).all())
+        
+        results = []
+        for user, distance in matches:
+            data = {
+                "user_id": str(user.id),
+                "latitude": user.latitude,
+                "longitude": user.longitude,
+                "distance_km": None,
+                "status": user.status.value,
+                "display_name": user.display_name,
+                "credit_balance": float(user.credit_balance),
+                "last_seen": user.last_seen.isoformat() if user.last_seen else None
+            }
+            if location_buffer.get(data["user_id"]) is not None:
+                # Unflushed position: re-score against the buffered coordinates
+                location_buffer.overlay(data, data["user_id"])
+                distance = None
+            if distance is None:
+                if data["latitude"] is None or data["longitude"] is None:
+                    continue
+                distance = haversine_km(latitude, longitude, data["latitude"], data["longitude"])
+                if distance > radius_km:
+                    continue
+            data["distance_km"] = round(distance, 2)
+            results.append(data)
+        results.sort(key=lambda data: data["distance_km"])
+        return results[:limit]
     
     def _calculate_distance_km(
         self,
@@ -376,20 +392,7 @@ class LocationHandler:
         Returns:
             Distance in kilometers
         """
-        R = 6371.0  # Earth radius in km
-        
-        lat1_rad = math.radians(lat1)
-        lon1_rad = math.radians(lon1)
-        lat2_rad = math.radians(lat2)
-        lon2_rad = math.radians(lon2)
-        
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        
-        a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        return haversine_km(lat1, lon1, lat2, lon2)
     
     def validate_coordinates(self, latitude: float, longitude: float) -> bool:
         """
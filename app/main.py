@@ -1,21 +1,27 @@
 """
 BILI Master System - Main Application Entry Point
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from app.core.config import settings
 from app.api.v1.router import api_router
 from app.core.database import Base
 from app.core.websocket import websocket_manager
+from app.core.location_buffer import location_buffer
 from app.core.background_tasks import start_background_tasks
+from app.core.scheduler import scheduler
+from app.core.metrics import metrics, MetricsMiddleware, instrument_engine, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from app.services.bybit_client import close_bybit_client
 from contextlib import asynccontextmanager
+import anyio.to_thread
 
 # Create database tables (only if database is available)
 # Import models so their tables are registered with Base before create_all
 try:
     from app.core.database import engine
-    from app.models import FlashDeal, ManualMapPin  # noqa: F401 - register tables
+    from app.models import FlashDeal, ManualMapPin, JobLease, CreditLedgerSummary, IdempotencyKey, BybitWithdrawal  # noqa: F401 - register tables
     if engine is not None:
         Base.metadata.create_all(bind=engine)
 except Exception as e:
@@ -25,11 +31,16 @@ except Exception as e:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Start background tasks
+    # Startup: size the threadpool that runs blocking ORM work, start background tasks
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.DB_THREADPOOL_SIZE
     start_background_tasks()
+    await websocket_manager.start_backplane()
     yield
-    # Shutdown: Cleanup if needed
-    pass
+    # Shutdown: stop jobs and listening to other workers, write out buffered locations
+    await scheduler.stop()
+    await websocket_manager.stop_backplane()
+    location_buffer.flush()
+    await close_bybit_client()
 
 app = FastAPI(
     title="BILI Master System",
@@ -52,6 +63,15 @@ app.add_middleware(
 # GZip Compression
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 
+# Metrics: per-route latency and per-request DB queries (METRICS_ENABLED)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    try:
+        from app.core.database import engine as _metrics_engine
+        instrument_engine(_metrics_engine)
+    except Exception as e:
+        print(f"Warning: Could not instrument database engine: {e}")
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
@@ -63,7 +83,7 @@ def health():
 
 # WebSocket endpoint
 @app.websocket("/ws")
-async def websocket_endpoint(websocket):
+async def websocket_endpoint(websocket: WebSocket):
     user_id = None
     # Try to extract user_id from query params or headers
     try:
@@ -93,3 +113,10 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        """Prometheus text-format metrics of this worker."""
+        return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
@@ -1,18 +1,25 @@
 from app.models.user import User
 from app.models.business import Business
-from app.models.credit import CreditTransaction, CreditLedger
+from app.models.credit import CreditTransaction, CreditLedger, CreditLedgerSummary
 from app.models.post import Post
 from app.models.chat import Chat, ChatMessage
 from app.models.flash_deal import FlashDeal
 from app.models.manual_map_pin import ManualMapPin
+from app.models.job_lease import JobLease
+from app.models.idempotency_key import IdempotencyKey
+from app.models.withdrawal import BybitWithdrawal
 
 __all__ = [
     "User",
     "Business",
     "CreditTransaction",
     "CreditLedger",
+    "CreditLedgerSummary",
     "Post",
     "Chat",
     "ChatMessage",
     "FlashDeal",
+    "JobLease",
+    "IdempotencyKey",
+    "BybitWithdrawal",
 ]
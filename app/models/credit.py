@@ -4,11 +4,11 @@ Credit Ledger for tracking all credit transactions
 
 Optimized for scalability (20,000+ users) with proper indexing [cite: 2026-01-09]
 """
-from sqlalchemy import Column, String, Float, DateTime, Text, ForeignKey, Enum, Integer, Index
+from sqlalchemy import Column, String, DateTime, JSON, Text, ForeignKey, Enum, Integer, Index
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime
-from app.core.database import Base, GUID
+from app.core.database import Base, GUID, Money
 import enum
 
 
@@ -28,7 +28,7 @@ class CreditTransaction(Base):
     user_id = Column(GUID(), ForeignKey("users.id"), nullable=False)
     
     transaction_type = Column(Enum(CreditTransactionType), nullable=False)
-    amount = Column(Float, nullable=False)  # Positive for credits added, negative for deducted
+    amount = Column(Money(), nullable=False)  # Positive for credits added, negative for deducted
     
     # Reference to related entity
     reference_id = Column(GUID(), nullable=True)  # Post ID, Business ID, etc.
@@ -37,7 +37,7 @@ class CreditTransaction(Base):
     description = Column(Text, nullable=True)
     
     # Balance after transaction
-    balance_after = Column(Float, nullable=False)
+    balance_after = Column(Money(), nullable=False)
     
     timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
     
@@ -71,9 +71,9 @@ class CreditLedger(Base):
     
     # Ledger Details
     entry_type = Column(String(50), nullable=False)  # "credit", "debit"
-    amount = Column(Float, nullable=False)
-    balance_before = Column(Float, nullable=False)
-    balance_after = Column(Float, nullable=False)
+    amount = Column(Money(), nullable=False)
+    balance_before = Column(Money(), nullable=False)
+    balance_after = Column(Money(), nullable=False)
     
     description = Column(Text, nullable=False)
     category = Column(String(100), nullable=True)  # "reward", "purchase", "ad", etc.
@@ -94,3 +94,34 @@ class CreditLedger(Base):
     
     def __repr__(self):
         return f"<CreditLedger(id={self.id}, type={self.entry_type}, amount={self.amount})>"
+
+
+class CreditLedgerSummary(Base):
+    """
+    Per-user ledger rollup, kept current by the credit posting service
+    (app/services/ledger_summary.py) in the same transaction as each posting.
+    Wallet and history screens read this one row instead of scanning the ledger;
+    missing rows (users from before the table existed) are rebuilt on first use.
+    """
+    __tablename__ = "credit_ledger_summaries"
+    
+    user_id = Column(GUID(), ForeignKey("users.id"), primary_key=True)
+    
+    # Lifetime totals
+    lifetime_earned = Column(Money(), default=0.00, nullable=False)
+    lifetime_spent = Column(Money(), default=0.00, nullable=False)
+    entry_count = Column(Integer, default=0, nullable=False)
+    
+    # {category: net amount}
+    totals_by_category = Column(JSON, nullable=False, default=dict)
+    # Newest first, as served by the ledger endpoint (bounded)
+    recent_entries = Column(JSON, nullable=False, default=list)
+    # Every claim reward (welcome and business claims), newest first
+    claims = Column(JSON, nullable=False, default=list)
+    # Bybit payouts that were not refunded, newest first (bounded)
+    recent_withdrawals = Column(JSON, nullable=False, default=list)
+    
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<CreditLedgerSummary(user_id={self.user_id}, entries={self.entry_count})>"
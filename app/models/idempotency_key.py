@@ -0,0 +1,35 @@
+"""
+BILI Master System - Idempotency Key Model
+One row per request key ("<scope>:<key>"): the primary key makes a key
+impossible to use twice, and the stored response is replayed to retries.
+"""
+from datetime import datetime
+from sqlalchemy import Column, String, Integer, DateTime, JSON, Index
+from app.core.database import Base
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(300), primary_key=True)
+    # SHA-256 of the request payload (a key may only be replayed with the same request)
+    request_hash = Column(String(64), nullable=True)
+
+    # None while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    response = Column(JSON, nullable=True)
+
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+    # When the running request took the key; a reservation older than
+    # IDEMPOTENCY_RESERVATION_TIMEOUT_SECONDS is taken over by a retry
+    reserved_at = Column(DateTime, nullable=True)
+    # None = kept forever (one-per-user keys such as the welcome reward)
+    expires_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_idempotency_keys_expires_at', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key}, status_code={self.status_code})>"
@@ -0,0 +1,30 @@
+"""
+BILI Master System - Background Job Lease Model
+One row per scheduled job: which worker holds it, when it may run next, and how
+the last run went. Lets exactly one worker run each cluster-wide job.
+"""
+from sqlalchemy import Column, String, Integer, Float, DateTime, Text
+from app.core.database import Base
+
+
+class JobLease(Base):
+    __tablename__ = "job_leases"
+
+    name = Column(String(100), primary_key=True)
+
+    # Lease: held by owner until lease_until (expires if the worker dies mid-run)
+    owner = Column(String(100), nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+    next_run_at = Column(DateTime, nullable=True)
+
+    # Last run (whichever worker ran it)
+    last_owner = Column(String(100), nullable=True)
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_duration_ms = Column(Float, nullable=True)
+    last_error = Column(Text, nullable=True)
+    run_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<JobLease(name={self.name}, owner={self.owner}, next_run_at={self.next_run_at})>"
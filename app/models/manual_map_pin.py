@@ -3,7 +3,7 @@ BILI Master System - Manual Map Pin Model
 Admin-added store locations (no Google Places API). Pins appear on the map for all users.
 Dynamic Refresh: optional profile_url; system fetches and displays latest video/post.
 """
-from sqlalchemy import Column, String, Float, DateTime, Text
+from sqlalchemy import Column, String, Float, DateTime, Text, Integer
 import uuid
 from datetime import datetime
 from app.core.database import Base, GUID
@@ -26,5 +26,13 @@ class ManualMapPin(Base):
     latest_content_title = Column(String(512), nullable=True)
     content_fetched_at = Column(DateTime, nullable=True)
 
+    # Refresh state: resolved YouTube channel id (@handle cache), HTTP validators for
+    # conditional GETs, and back-off for profiles that keep failing
+    youtube_channel_id = Column(String(64), nullable=True)
+    content_etag = Column(String(255), nullable=True)
+    content_last_modified = Column(String(64), nullable=True)
+    refresh_failures = Column(Integer, nullable=False, default=0)
+    next_refresh_at = Column(DateTime, nullable=True, index=True)
+
     def __repr__(self):
         return f"<ManualMapPin(id={self.id}, name={self.name}, lat={self.latitude}, lng={self.longitude})>"
@@ -8,7 +8,7 @@ from sqlalchemy import Column, String, Float, Boolean, DateTime, Integer, Text,
 from sqlalchemy.orm import relationship
 import uuid
 from datetime import datetime
-from app.core.database import Base, GUID
+from app.core.database import Base, GUID, Money
 import enum
 
 
@@ -51,7 +51,7 @@ class User(Base):
     is_invisible = Column(Boolean, default=False, nullable=False)  # Invisible mode
     
     # Credit System
-    credit_balance = Column(Float, default=0.00, nullable=False)
+    credit_balance = Column(Money(), default=0.00, nullable=False)
     
     # Royal Hospitality Period
     claim_date = Column(DateTime, nullable=True)  # Date when user claimed business
@@ -89,6 +89,7 @@ class User(Base):
         Index('idx_users_role_status', 'role', 'status'),  # Fast role/status filtering
         Index('idx_users_status_balance', 'status', 'credit_balance'),  # Radar queries (Silent Decay Logic)
         Index('idx_users_last_seen', 'last_seen'),  # Activity tracking
+        Index('idx_users_balance_last_seen', 'credit_balance', 'last_seen', 'id'),  # Zero-balance watchdog pages
         Index('idx_users_location', 'latitude', 'longitude'),  # Geolocation queries
         Index('idx_users_created_at', 'created_at'),  # User growth analytics
     )
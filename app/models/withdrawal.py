@@ -0,0 +1,44 @@
+"""
+BILI Master System - Bybit Withdrawal Model
+One row per payout, keyed by its Bybit requestId. The credits are debited when
+the row is created (PENDING) and stay reserved until Bybit's answer is known:
+COMPLETED when Bybit accepted it, REFUNDED when Bybit definitively rejected it.
+Timeouts and other unknown outcomes stay PENDING until reconciled.
+"""
+from sqlalchemy import Column, String, DateTime, Text, ForeignKey, Enum, Integer, Index
+from datetime import datetime
+from app.core.database import Base, GUID, Money
+import enum
+
+
+class BybitWithdrawalStatus(str, enum.Enum):
+    PENDING = "pending"  # Credits debited, Bybit outcome not known yet
+    COMPLETED = "completed"  # Bybit accepted the payout
+    REFUNDED = "refunded"  # Bybit rejected it; credits given back
+
+
+class BybitWithdrawal(Base):
+    __tablename__ = "bybit_withdrawals"
+
+    request_id = Column(String(32), primary_key=True)
+    user_id = Column(GUID(), ForeignKey("users.id"), nullable=False)
+
+    amount_usdt = Column(Money(), nullable=False)
+    credits = Column(Money(), nullable=False)
+    status = Column(Enum(BybitWithdrawalStatus), default=BybitWithdrawalStatus.PENDING, nullable=False)
+
+    bybit_withdrawal_id = Column(String(64), nullable=True)
+    last_error = Column(Text, nullable=True)
+    reconcile_attempts = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    resolved_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_bybit_withdrawals_status_created', 'status', 'created_at'),
+        Index('idx_bybit_withdrawals_user_id', 'user_id'),
+    )
+
+    def __repr__(self):
+        return f"<BybitWithdrawal(request_id={self.request_id}, user_id={self.user_id}, status={self.status})>"
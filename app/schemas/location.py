@@ -25,6 +25,7 @@ class LocationResponse(BaseModel):
     should_appear_on_radar: bool
     distance_moved_km: Optional[float] = None
     timestamp: str
+    suppressed: Optional[str] = None  # "stationary" or "rate_limited" when not written/broadcast
 
 
 class BatchLocationUpdate(BaseModel):
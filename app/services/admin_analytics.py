@@ -0,0 +1,150 @@
+"""
+BILI Master System - Admin Analytics
+Dashboard figures from a handful of aggregate statements (conditional counts
+with SUM(CASE ...), one statement per table), cached per worker for
+ADMIN_ANALYTICS_CACHE_SECONDS so the dashboard does not rescan the tables on
+every load.
+"""
+from datetime import datetime
+from typing import Dict
+from sqlalchemy import case, desc, func, select, union
+from sqlalchemy.orm import Session
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.user import User, UserRole, UserStatus
+from app.models.business import Business, BusinessStatus
+from app.models.credit import CreditTransaction, CreditTransactionType
+from app.models.post import Post, PostType
+from app.models.chat import Chat, ChatStatus
+
+
+analytics_cache = TTLCache(settings.ADMIN_ANALYTICS_CACHE_SECONDS)
+
+AWARD_TYPES = (CreditTransactionType.CLAIM_REWARD, CreditTransactionType.REFERRAL_REWARD)
+
+
+def _count_if(condition):
+    """Rows matching condition, counted within an aggregate statement."""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def _rate(part: int, whole: int) -> float:
+    return round((part / whole * 100) if whole > 0 else 0, 2)
+
+
+def compute_admin_analytics(db: Session) -> Dict:
+    """Compute the dashboard (seven statements, whatever the table sizes)."""
+    users = db.execute(
+        select(
+            func.count(),
+            _count_if(User.role == UserRole.MEMBER),
+            _count_if(User.role == UserRole.GUEST),
+            _count_if(User.is_master.is_(True)),
+            _count_if(User.status == UserStatus.ONLINE),
+            _count_if(User.latitude.isnot(None) & User.longitude.isnot(None)),
+            _count_if(User.claim_date.isnot(None)),
+        ).select_from(User)
+    ).one()
+    total_users, members, guests, masters, online, with_location, users_who_claimed = users
+
+    total_businesses, claimed_businesses, unclaimed_businesses = db.execute(
+        select(
+            func.count(),
+            _count_if(Business.status == BusinessStatus.CLAIMED),
+            _count_if(Business.status == BusinessStatus.UNCLAIMED),
+        ).select_from(Business)
+    ).one()
+
+    awarded, spent = db.execute(
+        select(
+            _sum_if(CreditTransaction.transaction_type.in_(AWARD_TYPES), CreditTransaction.amount),
+            _sum_if(CreditTransaction.amount < 0, CreditTransaction.amount),
+        ).select_from(CreditTransaction)
+    ).one()
+    total_credits_awarded = float(awarded or 0)
+    total_credits_spent = abs(float(spent or 0))
+
+    total_posts, commercial_posts, personal_posts, users_who_posted = db.execute(
+        select(
+            func.count(),
+            _count_if(Post.is_commercial.is_(True)),
+            _count_if(Post.post_type == PostType.PERSONAL),
+            func.count(func.distinct(Post.owner_id)),
+        ).select_from(Post)
+    ).one()
+
+    total_chats, active_chats = db.execute(
+        select(func.count(), _count_if(Chat.status == ChatStatus.ACTIVE)).select_from(Chat)
+    ).one()
+
+    # Users on either side of a chat (UNION de-duplicates)
+    participants = union(
+        select(Chat.initiator_id.label("user_id")),
+        select(Chat.recipient_id.label("user_id")),
+    ).subquery()
+    users_who_chatted = db.execute(select(func.count()).select_from(participants)).scalar() or 0
+
+    top_categories = db.execute(
+        select(Post.category, func.count(Post.id).label("count"))
+        .where(Post.is_commercial.is_(True), Post.category.isnot(None))
+        .group_by(Post.category)
+        .order_by(desc("count"))
+        .limit(10)
+    ).all()
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "users": {
+            "total": total_users,
+            "members": members,
+            "guests": guests,
+            "masters": masters,
+            "online": online
+        },
+        "businesses": {
+            "total": total_businesses,
+            "claimed": claimed_businesses,
+            "unclaimed": unclaimed_businesses,
+            "claim_rate_percent": _rate(claimed_businesses, total_businesses)
+        },
+        "credits": {
+            "total_awarded": total_credits_awarded,
+            "total_spent": total_credits_spent,
+            "net_circulation": total_credits_awarded - total_credits_spent
+        },
+        "posts": {
+            "total": total_posts,
+            "commercial": commercial_posts,
+            "personal": personal_posts
+        },
+        "chats": {
+            "total": total_chats,
+            "active": active_chats
+        },
+        "conversion_metrics": {
+            "users_who_claimed": users_who_claimed,
+            "users_who_posted": users_who_posted,
+            "users_who_chatted": users_who_chatted,
+            "claim_to_post_rate": _rate(users_who_posted, users_who_claimed),
+            "post_to_chat_rate": _rate(users_who_chatted, users_who_posted)
+        },
+        "top_ad_categories": [
+            {"category": category, "count": count}
+            for category, count in top_categories
+        ],
+        "geographic_zones": {
+            "users_with_location": with_location,
+            "active_zones": "Calculate based on user density"
+        }
+    }
+
+
+def get_cached_admin_analytics(db: Session, refresh: bool = False) -> Dict:
+    """Dashboard from the per-worker cache; recomputed when older than the TTL or on refresh."""
+    analytics = analytics_cache.get_or_compute("admin_analytics", lambda: compute_admin_analytics(db), refresh=refresh)
+    age = analytics_cache.age("admin_analytics")
+    return {**analytics, "cache_age_seconds": round(age, 1) if age is not None else 0.0}
@@ -0,0 +1,226 @@
+"""
+BILI Master System - Async Bybit Client
+Non-blocking Bybit v5 API access for automatic withdrawals [cite: 2026-02-03]
+
+- One pooled keep-alive httpx.AsyncClient per worker
+- Connect/read timeouts (BYBIT_TIMEOUT_SECONDS)
+- Retries with exponential backoff and full jitter on transport errors,
+  HTTP 429/5xx and Bybit's transient retCodes (BYBIT_MAX_RETRIES)
+- Withdrawals carry a requestId (idempotency key), reused on every retry so
+  Bybit never executes the same payout twice
+- Withdrawal records can be looked up by requestId, to settle payouts whose
+  outcome was unknown (timeouts, 5xx after retries)
+
+For local testing run scripts/mock_bybit_server.py and point BYBIT_BASE_URL at it.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+import httpx
+from app.core.config import settings
+
+
+WITHDRAW_CREATE_PATH = "/v5/asset/withdraw/create"
+WITHDRAW_RECORDS_PATH = "/v5/asset/withdraw/query-record"
+
+# retCodes Bybit documents as temporary (rate limit / server busy / timeout)
+TRANSIENT_RET_CODES = {10000, 10006, 10016, 10018}
+TRANSIENT_HTTP_STATUSES = {429, 500, 502, 503, 504}
+
+# Namespace of requestIds derived from client idempotency keys
+REQUEST_ID_NAMESPACE = uuid.UUID("6f1c2f4e-6d1a-4c59-9a43-0b7e2f8d51a3")
+
+# Withdrawal record statuses: the payout went out / it never will
+WITHDRAWAL_SUCCESS_STATUSES = {"success", "BlockchainConfirmed"}
+WITHDRAWAL_FAILED_STATUSES = {"CancelByUser", "Reject", "Fail"}
+
+
+class BybitError(Exception):
+    """Bybit could not be reached (after retries) or answered with a non-JSON body."""
+
+
+def new_request_id() -> str:
+    """Idempotency key for one withdrawal (Bybit allows at most 32 characters)."""
+    return uuid.uuid4().hex
+
+
+def request_id_for(*parts: Any) -> str:
+    """
+    Deterministic requestId for a client-supplied key (e.g. user id + Idempotency-Key):
+    every retry of that request maps to the same Bybit withdrawal.
+    """
+    return uuid.uuid5(REQUEST_ID_NAMESPACE, ":".join(str(part) for part in parts)).hex
+
+
+class BybitClient:
+    """Signed Bybit v5 client on a shared, pooled httpx.AsyncClient."""
+
+    def __init__(
+        self,
+        api_key: str = settings.BYBIT_API_KEY,
+        api_secret: str = settings.BYBIT_API_SECRET,
+        base_url: str = settings.BYBIT_BASE_URL,
+        timeout_seconds: float = settings.BYBIT_TIMEOUT_SECONDS,
+        max_retries: int = settings.BYBIT_MAX_RETRIES,
+        recv_window_ms: int = settings.BYBIT_RECV_WINDOW_MS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout_seconds, connect=min(5.0, timeout_seconds))
+        self.max_retries = max(0, max_retries)
+        self.recv_window_ms = recv_window_ms
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _sign(self, timestamp: str, body: str) -> str:
+        """v5 signature: HMAC-SHA256(timestamp + api_key + recv_window + body)."""
+        payload = f"{timestamp}{self.api_key}{self.recv_window_ms}{body}"
+        return hmac.new(self.api_secret.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform(0, min(cap, base * 2^attempt))."""
+        return random.uniform(0, min(8.0, 0.5 * (2 ** attempt)))
+
+    async def _request(self, method: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Signed request with retries. Returns Bybit's JSON response (check retCode).
+        Raises BybitError when every attempt failed to get an answer.
+        """
+        # POST signs the JSON body, GET the query string
+        payload = json.dumps(params, separators=(",", ":")) if method == "POST" else urlencode(params)
+        last_error: Optional[str] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1))
+            # Re-signed per attempt: the timestamp must be inside recv_window
+            timestamp = str(int(time.time() * 1000))
+            headers = {
+                "Content-Type": "application/json",
+                "X-BAPI-API-KEY": self.api_key,
+                "X-BAPI-TIMESTAMP": timestamp,
+                "X-BAPI-RECV-WINDOW": str(self.recv_window_ms),
+                "X-BAPI-SIGN": self._sign(timestamp, payload),
+            }
+            try:
+                if method == "POST":
+                    response = await self.client.post(path, content=payload, headers=headers)
+                else:
+                    response = await self.client.get(f"{path}?{payload}", headers=headers)
+            except httpx.TransportError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                continue
+
+            if response.status_code in TRANSIENT_HTTP_STATUSES:
+                last_error = f"HTTP {response.status_code}"
+                continue
+            try:
+                result = response.json()
+            except ValueError:
+                raise BybitError(f"Unexpected Bybit response (HTTP {response.status_code})")
+            if result.get("retCode") in TRANSIENT_RET_CODES and attempt < self.max_retries:
+                last_error = f"retCode {result.get('retCode')}: {result.get('retMsg')}"
+                continue
+            return result
+
+        raise BybitError(f"Bybit request failed after {self.max_retries + 1} attempts ({last_error})")
+
+    async def post(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Signed POST with retries (see _request)."""
+        return await self._request("POST", path, params)
+
+    async def get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Signed GET with retries (see _request)."""
+        return await self._request("GET", path, params)
+
+    async def create_withdrawal(
+        self,
+        address: str,
+        amount: str,
+        request_id: str,
+        coin: str = "USDT",
+        chain: str = "TRC20",
+    ) -> Dict[str, Any]:
+        """
+        Create an on-chain withdrawal. request_id is the idempotency key: retries
+        (here or by the caller) with the same id can never pay out twice.
+        """
+        return await self.post(WITHDRAW_CREATE_PATH, {
+            "coin": coin,
+            "chain": chain,
+            "address": address,
+            "amount": amount,
+            "timestamp": int(time.time() * 1000),
+            "requestId": request_id,
+            "accountType": "FUND",
+        })
+
+    async def get_withdrawal_record(
+        self,
+        request_id: str,
+        start_time_ms: int,
+        coin: str = "USDT",
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Bybit's record of the withdrawal created with request_id (searching the
+        week from start_time_ms), or None if Bybit has no such withdrawal.
+        Raises BybitError if the records could not be read.
+        """
+        end_time_ms = start_time_ms + 7 * 24 * 3600 * 1000
+        cursor = None
+        while True:
+            params = {"coin": coin, "startTime": start_time_ms, "endTime": end_time_ms, "limit": 50}
+            if cursor:
+                params["cursor"] = cursor
+            result = await self.get(WITHDRAW_RECORDS_PATH, params)
+            if result.get("retCode") != 0:
+                raise BybitError(f"Withdrawal records unavailable: retCode {result.get('retCode')}: {result.get('retMsg')}")
+            page = result.get("result") or {}
+            for row in page.get("rows") or []:
+                if row.get("requestId") == request_id:
+                    return row
+            cursor = page.get("nextPageCursor")
+            if not cursor:
+                return None
+
+
+_bybit_client: Optional[BybitClient] = None
+
+
+def get_bybit_client() -> BybitClient:
+    """Shared per-worker client (created on first use, so the pool lives on the running loop)."""
+    global _bybit_client
+    if _bybit_client is None:
+        _bybit_client = BybitClient()
+    return _bybit_client
+
+
+async def close_bybit_client():
+    """Close the pooled connections (app shutdown)."""
+    global _bybit_client
+    if _bybit_client is not None:
+        await _bybit_client.aclose()
+        _bybit_client = None
@@ -0,0 +1,178 @@
+"""
+BILI Master System - Credit Posting
+The one place credit balances change.
+
+A posting moves a user's balance by a signed amount and records it:
+- balances change in SQL (credit_balance = credit_balance + delta ... RETURNING),
+  one UPDATE for a whole batch, never read-modify-write in Python, so concurrent
+  claims, referrals and withdrawals cannot lose updates
+- debits are guarded in the same statement (the balance may not go below 0.00);
+  if any debit of a batch would overdraw, nothing is applied (the balance updates
+  run in a savepoint; the caller's other work in the session is kept)
+- CreditTransaction and CreditLedger rows are inserted in bulk from the
+  returned balances, and each user's CreditLedgerSummary is updated
+
+post_credits does not commit: the caller commits, so the postings land in the
+same short transaction as the rest of its changes (claims, conversions).
+"""
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import case, insert, literal, or_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from app.core.database import Money, to_money
+from app.models.user import User
+from app.models.credit import CreditTransaction, CreditTransactionType, CreditLedger
+from app.services.ledger_summary import apply_postings
+
+# Users per UPDATE statement of a batch
+POSTING_CHUNK_SIZE = 500
+
+
+class InsufficientCredits(Exception):
+    """A debit would take a balance below 0.00 (nothing was posted)."""
+
+    def __init__(self, user_ids: Sequence):
+        self.user_ids = list(user_ids)
+        super().__init__(f"Insufficient credits for user(s): {', '.join(str(u) for u in self.user_ids)}")
+
+
+class Posting:
+    """One balance change: amount > 0 credits the user, amount < 0 debits them."""
+
+    __slots__ = (
+        "user_id", "amount", "transaction_type", "description", "ledger_description",
+        "category", "reference_id", "reference_type",
+        "transaction_id", "balance_before", "balance_after",
+    )
+
+    def __init__(
+        self,
+        user_id,
+        amount: float,
+        transaction_type: CreditTransactionType,
+        description: str,
+        category: Optional[str] = None,
+        ledger_description: Optional[str] = None,
+        reference_id=None,
+        reference_type: Optional[str] = None,
+    ):
+        self.user_id = user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))
+        self.amount = amount
+        self.transaction_type = transaction_type
+        self.description = description
+        self.ledger_description = ledger_description or description
+        self.category = category
+        self.reference_id = reference_id
+        self.reference_type = reference_type
+        # Filled in by post_credits
+        self.transaction_id: Optional[uuid.UUID] = None
+        self.balance_before: Optional[float] = None
+        self.balance_after: Optional[float] = None
+
+
+def _apply_deltas(db: Session, deltas: Dict[uuid.UUID, Decimal]) -> Dict[uuid.UUID, float]:
+    """One guarded UPDATE ... RETURNING for these users; returns the new balances."""
+    # Comparisons (not a value map) so ids are bound with the GUID column type
+    delta = case(
+        *((User.id == user_id, literal(amount, Money())) for user_id, amount in deltas.items()),
+        else_=literal(0, Money())
+    )
+    rows = db.execute(
+        update(User.__table__)
+        .where(
+            User.id.in_(list(deltas)),
+            or_(delta >= 0, User.credit_balance + delta >= 0)
+        )
+        .values(credit_balance=User.credit_balance + delta)
+        .returning(User.id, User.credit_balance)
+    ).all()
+    balances = {user_id: balance for user_id, balance in rows}
+    missing = [user_id for user_id in deltas if user_id not in balances]
+    if missing:
+        # Unknown users, or debits that would overdraw
+        raise InsufficientCredits(missing)
+    return balances
+
+
+def post_credits(db: Session, postings: Sequence[Posting]) -> List[Posting]:
+    """
+    Apply postings atomically (all or none) and write their transaction and
+    ledger rows. Each posting gets transaction_id, balance_before and balance_after.
+    Raises InsufficientCredits (after rolling back its own savepoint only) if a
+    debit would overdraw. The caller commits, or rolls back.
+    """
+    if not postings:
+        return []
+    # Pending users (new guests) must exist before their balance is updated
+    db.flush()
+
+    # Exact fixed-point arithmetic (amounts are rounded to 0.001 like the columns)
+    deltas: Dict[uuid.UUID, Decimal] = {}
+    for posting in postings:
+        posting.amount = float(to_money(posting.amount))
+        deltas[posting.user_id] = deltas.get(posting.user_id, Decimal(0)) + to_money(posting.amount)
+
+    # Fixed user order, so concurrent batches lock rows in the same order
+    user_ids = sorted(deltas, key=str)
+    balances: Dict[uuid.UUID, float] = {}
+    # A failed chunk undoes the chunks before it; the context manager rolls back
+    # to the savepoint and re-raises
+    with db.begin_nested():
+        for start in range(0, len(user_ids), POSTING_CHUNK_SIZE):
+            chunk = user_ids[start:start + POSTING_CHUNK_SIZE]
+            balances.update(_apply_deltas(db, {user_id: deltas[user_id] for user_id in chunk}))
+
+    # Walk each user's postings from the balance before the batch
+    running = {user_id: to_money(balances[user_id]) - deltas[user_id] for user_id in deltas}
+    now = datetime.utcnow()
+    transactions, ledger_entries = [], []
+    for posting in postings:
+        posting.transaction_id = uuid.uuid4()
+        before = running[posting.user_id]
+        running[posting.user_id] = before + to_money(posting.amount)
+        posting.balance_before = float(before)
+        posting.balance_after = float(running[posting.user_id])
+        transactions.append({
+            "id": posting.transaction_id,
+            "user_id": posting.user_id,
+            "transaction_type": posting.transaction_type,
+            "amount": posting.amount,
+            "reference_id": posting.reference_id,
+            "reference_type": posting.reference_type,
+            "description": posting.description,
+            "balance_after": posting.balance_after,
+            "timestamp": now,
+        })
+        ledger_entries.append({
+            "id": uuid.uuid4(),
+            "user_id": posting.user_id,
+            "transaction_id": posting.transaction_id,
+            "entry_type": "credit" if posting.amount >= 0 else "debit",
+            "amount": abs(posting.amount),
+            "balance_before": posting.balance_before,
+            "balance_after": posting.balance_after,
+            "description": posting.ledger_description,
+            "category": posting.category,
+            "timestamp": now,
+        })
+    db.execute(insert(CreditTransaction), transactions)
+    db.execute(insert(CreditLedger), ledger_entries)
+    # Per-user rollups behind the wallet and history screens
+    apply_postings(db, list(zip(transactions, ledger_entries)))
+
+    # Loaded User objects see the new balance without a reload (and without
+    # marking it dirty, so a later flush cannot write a stale value back)
+    for user_id, balance in balances.items():
+        user = db.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            set_committed_value(user, "credit_balance", balance)
+    return list(postings)
+
+
+def post_credit(db: Session, posting: Posting) -> Posting:
+    """Apply a single posting (see post_credits). The caller commits."""
+    return post_credits(db, [posting])[0]
@@ -0,0 +1,251 @@
+"""
+BILI Master System - Idempotency Keys
+Makes retried claim and withdrawal requests safe: a client sends an
+Idempotency-Key header, and every retry with the same key gets the first
+request's response instead of posting again.
+
+- The idempotency_keys primary key decides which request runs: the first one
+  reserves the key, concurrent duplicates get 409 until it finishes
+- Successful responses are stored for IDEMPOTENCY_KEY_TTL_HOURS and kept in a
+  per-worker LRU, so most replays cost no query at all
+- Failed requests release their key (nothing was posted), so they can be retried,
+  unless the operation says otherwise: StoredFailure is stored and replayed like
+  a success (money already moved), UnsettledFailure keeps the key reserved until
+  the operation's outcome is known (see run_idempotent's settled)
+- A reservation older than IDEMPOTENCY_RESERVATION_TIMEOUT_SECONDS (the worker
+  died before storing a response) is taken over by the next retry
+- One-per-user rewards use an implicit, permanent key inserted in the same
+  transaction as the posting (see welcome_reward_key)
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+WELCOME_REWARD_SCOPE = "welcome_reward"
+
+# record key -> (request hash, status code, stored response); completed keys only
+response_cache = LRUCache(settings.IDEMPOTENCY_CACHE_SIZE)
+
+
+class StoredFailure(HTTPException):
+    """A failure after side effects committed: stored, and replayed to retries."""
+
+
+class UnsettledFailure(HTTPException):
+    """A failure whose outcome is not known yet: the key stays reserved (retries get 409 until it settles)."""
+
+
+class KeyInProgress(HTTPException):
+    """409: the key is reserved by a request that has not stored a response."""
+
+
+def record_key(scope: str, key) -> str:
+    return f"{scope}:{key}"
+
+
+def welcome_reward_key(user_id) -> str:
+    """Implicit key of a user's one welcome reward."""
+    return record_key(WELCOME_REWARD_SCOPE, user_id)
+
+
+def request_hash(payload: Dict) -> str:
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _stored(db: Session, key: str) -> Optional[Tuple[Optional[str], int, Any]]:
+    """(request hash, status code, response) of a completed key, from the LRU or the table."""
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    row = db.get(IdempotencyKey, key)
+    if row is None or row.status_code is None:
+        return None
+    cached = (row.request_hash, row.status_code, row.response)
+    response_cache.set(key, cached)
+    return cached
+
+
+def is_recorded(db: Session, key: str) -> bool:
+    """Whether a completed record exists for key (LRU, then one primary-key lookup)."""
+    return _stored(db, key) is not None
+
+
+def add_record(db: Session, key: str, response: Any, ttl_hours: Optional[int] = None) -> None:
+    """
+    Add a completed record to the caller's transaction (not committed). The
+    commit fails with IntegrityError if the key was already used.
+    """
+    now = datetime.utcnow()
+    db.add(IdempotencyKey(
+        key=key,
+        status_code=200,
+        response=jsonable_encoder(response),
+        created_at=now,
+        completed_at=now,
+        expires_at=now + timedelta(hours=ttl_hours) if ttl_hours else None,
+    ))
+
+
+def remember(key: str, response: Any, fingerprint: Optional[str] = None) -> None:
+    """Put a committed record in this worker's LRU."""
+    response_cache.set(key, (fingerprint, 200, jsonable_encoder(response)))
+
+
+def begin(db: Session, scope: str, key: str, payload: Dict) -> Optional[Any]:
+    """
+    Reserve key for this request (returns None: run it), or return the stored
+    response of an earlier request with the same key (a stored failure is raised).
+    409 if that request is still running, 422 if the key was used for a different request.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+    full_key = record_key(scope, key)
+    fingerprint = request_hash(payload)
+
+    stored = response_cache.get(full_key)
+    if stored is None:
+        now = datetime.utcnow()
+        db.add(IdempotencyKey(
+            key=full_key,
+            request_hash=fingerprint,
+            created_at=now,
+            reserved_at=now,
+            expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+        ))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+        stored = _stored(db, full_key)
+        if stored is None:
+            reserved_hash = db.execute(
+                select(IdempotencyKey.request_hash).where(IdempotencyKey.key == full_key)
+            ).scalar()
+            if reserved_hash is not None and reserved_hash != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"This {IDEMPOTENCY_HEADER} was already used for a different request"
+                )
+            if _take_over(db, full_key, fingerprint):
+                return None
+            raise KeyInProgress(
+                status_code=409,
+                detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed"
+            )
+
+    stored_hash, status_code, response = stored
+    if stored_hash != fingerprint:
+        raise HTTPException(
+            status_code=422,
+            detail=f"This {IDEMPOTENCY_HEADER} was already used for a different request"
+        )
+    if status_code >= 400:
+        raise HTTPException(status_code=status_code, detail=(response or {}).get("detail"))
+    return response
+
+
+def _take_over(db: Session, key: str, fingerprint: str) -> bool:
+    """Reserve a key whose reservation timed out (its request never stored a response)."""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.IDEMPOTENCY_RESERVATION_TIMEOUT_SECONDS)
+    taken = db.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.status_code.is_(None),
+            IdempotencyKey.request_hash == fingerprint,
+            or_(IdempotencyKey.reserved_at.is_(None), IdempotencyKey.reserved_at < cutoff)
+        )
+        .values(reserved_at=now, expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return bool(taken)
+
+
+def complete(db: Session, scope: str, key: str, payload: Dict, response: Any, status_code: int = 200) -> None:
+    """Store the response of a reserved key."""
+    full_key = record_key(scope, key)
+    stored = jsonable_encoder(response)
+    db.rollback()
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == full_key)
+        .values(status_code=status_code, response=stored, completed_at=datetime.utcnow())
+    )
+    db.commit()
+    response_cache.set(full_key, (request_hash(payload), status_code, stored))
+
+
+def release(db: Session, scope: str, key: str) -> None:
+    """Drop a reservation whose request failed, so the key can be retried."""
+    db.rollback()
+    db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.key == record_key(scope, key), IdempotencyKey.status_code.is_(None))
+    )
+    db.commit()
+
+
+async def run_idempotent(
+    db: Session,
+    scope: str,
+    key: Optional[str],
+    payload: Dict,
+    operation: Callable[[], Awaitable[Any]],
+    settled: Optional[Callable[[], Awaitable[Any]]] = None
+) -> Any:
+    """
+    Run operation once per key: replays return the stored response. Without a
+    key the operation simply runs. Successful responses and StoredFailure are
+    stored; other failures release the key, except UnsettledFailure.
+    
+    settled (operations that can raise UnsettledFailure) is asked for the final
+    response when a retry finds the key still reserved: it returns the response
+    or raises StoredFailure once the outcome is known (then stored for the key),
+    or returns None while it is not (the retry gets 409).
+    """
+    if key is None:
+        return await operation()
+    try:
+        replay = await run_in_threadpool(begin, db, scope, key, payload)
+    except KeyInProgress as busy:
+        if settled is None:
+            raise
+        try:
+            response = await settled()
+        except StoredFailure as e:
+            await run_in_threadpool(complete, db, scope, key, payload, {"detail": e.detail}, e.status_code)
+            raise
+        if response is None:
+            raise busy
+        await run_in_threadpool(complete, db, scope, key, payload, response)
+        return response
+    if replay is not None:
+        return replay
+    try:
+        response = await operation()
+    except StoredFailure as e:
+        await run_in_threadpool(complete, db, scope, key, payload, {"detail": e.detail}, e.status_code)
+        raise
+    except UnsettledFailure:
+        raise
+    except BaseException:
+        await run_in_threadpool(release, db, scope, key)
+        raise
+    await run_in_threadpool(complete, db, scope, key, payload, response)
+    return response
@@ -0,0 +1,172 @@
+"""
+BILI Master System - Ledger Summary
+Maintains CreditLedgerSummary, the per-user rollup behind the ledger, claim
+history and withdrawal history screens.
+
+- Every posting updates its users' rows in the posting's own transaction
+  (the users row is already locked by the balance UPDATE, so updates to one
+  summary are serialized)
+- A missing row is rebuilt from the ledger once, on first read or posting
+- Lists are stored newest first; recent entries and withdrawals keep the last
+  LEDGER_SUMMARY_RECENT_ENTRIES, claims are kept in full (a handful per user)
+"""
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import to_money
+from app.models.user import User
+from app.models.credit import CreditLedger, CreditLedgerSummary, CreditTransaction, CreditTransactionType
+
+WITHDRAWAL_CATEGORY = "withdrawal"
+WITHDRAWAL_REFUND_REFERENCE = "bybit_withdrawal_refund"
+UNCATEGORIZED = "uncategorized"
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _id(value) -> Optional[str]:
+    return str(value) if value is not None else None
+
+
+def ledger_event(transaction, ledger) -> Dict:
+    """
+    One posted movement from its transaction and ledger rows (ORM objects or
+    dicts with the column names), in the shape stored on the summary.
+    """
+    get_tx = transaction.get if isinstance(transaction, dict) else lambda key: getattr(transaction, key)
+    get_entry = ledger.get if isinstance(ledger, dict) else lambda key: getattr(ledger, key)
+    transaction_type = get_tx("transaction_type")
+    return {
+        "id": _id(get_entry("id")),
+        "transaction_id": _id(get_entry("transaction_id")),
+        "transaction_type": getattr(transaction_type, "value", transaction_type),
+        "signed_amount": float(get_tx("amount")),
+        "entry_type": get_entry("entry_type"),
+        "amount": float(get_entry("amount")),
+        "balance_before": float(get_entry("balance_before")),
+        "balance_after": float(get_entry("balance_after")),
+        "description": get_entry("description"),
+        "transaction_description": get_tx("description"),
+        "category": get_entry("category"),
+        "reference_id": _id(get_tx("reference_id")),
+        "reference_type": get_tx("reference_type"),
+        "timestamp": _iso(get_entry("timestamp")),
+    }
+
+
+def _apply_events(summary: CreditLedgerSummary, events: Iterable[Dict]) -> None:
+    """Fold events (oldest first) into summary; lists are replaced, not mutated, so changes are tracked."""
+    limit = settings.LEDGER_SUMMARY_RECENT_ENTRIES
+    earned = to_money(summary.lifetime_earned or 0)
+    spent = to_money(summary.lifetime_spent or 0)
+    count = summary.entry_count or 0
+    by_category = {key: to_money(value) for key, value in (summary.totals_by_category or {}).items()}
+    recent = list(summary.recent_entries or [])
+    claims = list(summary.claims or [])
+    withdrawals = list(summary.recent_withdrawals or [])
+
+    for event in events:
+        signed = to_money(event["signed_amount"])
+        if signed >= 0:
+            earned += signed
+        else:
+            spent -= signed
+        count += 1
+        category = event["category"] or UNCATEGORIZED
+        by_category[category] = by_category.get(category, Decimal(0)) + signed
+        recent.insert(0, {
+            "id": event["id"],
+            "transaction_id": event["transaction_id"],
+            "entry_type": event["entry_type"],
+            "amount": event["amount"],
+            "balance_before": event["balance_before"],
+            "balance_after": event["balance_after"],
+            "description": event["description"],
+            "category": event["category"],
+            "timestamp": event["timestamp"],
+        })
+        if event["transaction_type"] == CreditTransactionType.CLAIM_REWARD.value:
+            claims.insert(0, {
+                "transaction_id": event["transaction_id"],
+                "amount": event["signed_amount"],
+                "business_id": event["reference_id"],
+                "timestamp": event["timestamp"],
+                "description": event["transaction_description"],
+            })
+        if event["category"] == WITHDRAWAL_CATEGORY:
+            withdrawals.insert(0, {
+                "transaction_id": event["transaction_id"],
+                "reference_id": event["reference_id"],
+                "amount": event["amount"],
+                "balance_before": event["balance_before"],
+                "balance_after": event["balance_after"],
+                "description": event["description"],
+                "timestamp": event["timestamp"],
+            })
+        elif event["reference_type"] == WITHDRAWAL_REFUND_REFERENCE:
+            withdrawals = [w for w in withdrawals if w["reference_id"] != event["reference_id"]]
+
+    summary.lifetime_earned = float(earned)
+    summary.lifetime_spent = float(spent)
+    summary.entry_count = count
+    summary.totals_by_category = {key: float(value) for key, value in by_category.items()}
+    summary.recent_entries = recent[:limit]
+    summary.claims = claims
+    summary.recent_withdrawals = withdrawals[:limit]
+
+
+def rebuild_ledger_summary(db: Session, user_id: uuid.UUID) -> CreditLedgerSummary:
+    """Summary computed from the user's whole ledger (added to the session, not committed)."""
+    rows = db.execute(
+        select(CreditTransaction, CreditLedger)
+        .join(CreditTransaction, CreditTransaction.id == CreditLedger.transaction_id)
+        .where(CreditLedger.user_id == user_id)
+        .order_by(CreditLedger.timestamp, CreditLedger.id)
+    ).all()
+    summary = CreditLedgerSummary(
+        user_id=user_id, lifetime_earned=0.0, lifetime_spent=0.0, entry_count=0,
+        totals_by_category={}, recent_entries=[], claims=[], recent_withdrawals=[],
+    )
+    _apply_events(summary, (ledger_event(transaction, ledger) for transaction, ledger in rows))
+    db.add(summary)
+    return summary
+
+
+def apply_postings(db: Session, rows: List) -> None:
+    """
+    Fold freshly inserted (transaction, ledger) row dicts into their users'
+    summaries. Called by post_credits inside the posting's transaction.
+    """
+    events_by_user: Dict[uuid.UUID, List[Dict]] = {}
+    for transaction, ledger in rows:
+        events_by_user.setdefault(transaction["user_id"], []).append(ledger_event(transaction, ledger))
+    for user_id in sorted(events_by_user, key=str):
+        summary = db.get(CreditLedgerSummary, user_id, with_for_update=True)
+        if summary is None:
+            # First posting since the table existed: the rebuild already sees these rows
+            rebuild_ledger_summary(db, user_id)
+        else:
+            _apply_events(summary, events_by_user[user_id])
+    db.flush()
+
+
+def get_ledger_summary(db: Session, user_id: uuid.UUID) -> Optional[CreditLedgerSummary]:
+    """The user's summary (one primary-key lookup), rebuilt and stored if missing; None for unknown users."""
+    summary = db.get(CreditLedgerSummary, user_id)
+    if summary is not None:
+        return summary
+    if db.get(User, user_id) is None:
+        return None
+    rebuild_ledger_summary(db, user_id)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent posting or read created it first
+        db.rollback()
+    return db.get(CreditLedgerSummary, user_id)
@@ -2,140 +2,303 @@
 BILI Master System - Dynamic Refresh for Store Pins
 Fetches latest video/post from a store's profile URL so pins stay fresh without manual updates.
 Supports: YouTube (channel RSS), and noembed.com fallback for direct video/post URLs.
+
+Refreshes are async on one pooled httpx client, at most PIN_REFRESH_CONCURRENCY at a time:
+- @handle -> channel id is resolved once and kept on the pin (youtube_channel_id)
+- Feed/embed requests are conditional (ETag / If-Modified-Since); 304 means nothing to write
+- Failing pins back off exponentially (refresh_failures / next_refresh_at)
+- A background run writes only changed pins, in one bulk UPDATE and one commit
 """
+import asyncio
 import re
-from datetime import datetime
-from typing import Optional
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.models.manual_map_pin import ManualMapPin
 
 try:
-    import requests
-    HAS_REQUESTS = True
+    import httpx
+    HAS_HTTPX = True
 except ImportError:
-    HAS_REQUESTS = False
+    HAS_HTTPX = False
 
 
-def _extract_youtube_channel_id(profile_url: str) -> Optional[str]:
-    """Extract YouTube channel ID from channel URL or @handle URL."""
-    if not profile_url or "youtube.com" not in profile_url and "youtu.be" not in profile_url:
-        return None
-    # /channel/UCxxxxxxxxxxxxxxxxxx
+UPDATED = "updated"
+NOT_MODIFIED = "not_modified"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+USER_AGENT = "Mozilla/5.0 (compatible; BILI/1.0)"
+FETCH_TIMEOUT_SECONDS = 10
+# First back-off after a failure; doubles per consecutive failure
+BASE_BACKOFF_MINUTES = 30
+
+CONTENT_FIELDS = ("latest_content_url", "latest_content_thumbnail", "latest_content_title")
+
+# @handle -> channel id, shared by all pins of this worker (the pin column persists it)
+_channel_ids: Dict[str, str] = {}
+
+
+def _new_client(concurrency: int = 4) -> "httpx.AsyncClient":
+    return httpx.AsyncClient(
+        timeout=FETCH_TIMEOUT_SECONDS,
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+    )
+
+
+def _youtube_channel_id_from_url(profile_url: str) -> Optional[str]:
+    """Channel ID written in the URL itself (/channel/UC...)."""
     m = re.search(r"youtube\.com/channel/([a-zA-Z0-9_-]{20,})", profile_url)
-    if m:
-        return m.group(1)
-    # /@Username or /c/CustomName - we need to resolve to channel ID via page fetch
-    m = re.search(r"youtube\.com/(@[a-zA-Z0-9_-]+)", profile_url)
-    if m:
-        handle = m.group(1).lstrip("@")
-        try:
-            r = requests.get(
-                f"https://www.youtube.com/@{handle}",
-                timeout=10,
-                headers={"User-Agent": "Mozilla/5.0 (compatible; BILI/1.0)"},
-            )
-            if r.status_code != 200:
-                return None
-            # Channel page contains channel_id or "externalId" in JSON
-            match = re.search(r'"channelId":"(UC[a-zA-Z0-9_-]{22})"', r.text)
-            if match:
-                return match.group(1)
-            match = re.search(r'"externalId":"(UC[a-zA-Z0-9_-]{22})"', r.text)
-            if match:
-                return match.group(1)
-        except Exception:
-            pass
-    return None
-
-
-def _fetch_youtube_latest(channel_id: str) -> Optional[dict]:
-    """Fetch latest video from YouTube channel RSS. Returns dict with url, thumbnail, title or None."""
-    if not HAS_REQUESTS:
-        return None
-    url = f"https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+    return m.group(1) if m else None
+
+
+def _youtube_handle(profile_url: str) -> Optional[str]:
+    """@handle of a YouTube profile URL (needs a page fetch to resolve)."""
+    m = re.search(r"youtube\.com/@([a-zA-Z0-9_-]+)", profile_url)
+    return m.group(1) if m else None
+
+
+async def _resolve_youtube_handle(client: "httpx.AsyncClient", handle: str) -> Optional[str]:
+    """Resolve @handle to a channel ID via the channel page (cached per worker)."""
+    key = handle.lower()
+    if key in _channel_ids:
+        return _channel_ids[key]
     try:
-        r = requests.get(url, timeout=10, headers={"User-Agent": "BILI/1.0"})
-        if r.status_code != 200:
-            return None
-        text = r.text
-        # Parse first entry: videoId, title, thumbnail (regex to avoid namespace issues)
-        video_id_m = re.search(r"<yt:videoId>([^<]+)</yt:videoId>", text)
-        if not video_id_m:
-            video_id_m = re.search(r"<id>yt:video:([^<]+)</id>", text)
-        video_id = video_id_m.group(1).strip() if video_id_m else None
-        if not video_id:
-            return None
-        title_m = re.search(r"<title>([^<]+)</title>", text)
-        title = title_m.group(1).strip() if title_m else f"Video {video_id}"
-        thumb_m = re.search(r'<media:thumbnail\s+url="([^"]+)"', text)
-        thumb = thumb_m.group(1) if thumb_m else f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"
-        return {
-            "latest_content_url": f"https://www.youtube.com/watch?v={video_id}",
-            "latest_content_thumbnail": thumb,
-            "latest_content_title": title,
-        }
-    except Exception:
+        r = await client.get(f"https://www.youtube.com/@{handle}")
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200:
+        return None
+    # Channel page contains channel_id or "externalId" in JSON
+    match = re.search(r'"channelId":"(UC[a-zA-Z0-9_-]{22})"', r.text) or \
+        re.search(r'"externalId":"(UC[a-zA-Z0-9_-]{22})"', r.text)
+    if not match:
         return None
+    _channel_ids[key] = match.group(1)
+    return match.group(1)
 
 
-def _fetch_noembed(url: str) -> Optional[dict]:
-    """Fetch thumbnail and title via noembed.com for direct video/post URLs."""
-    if not HAS_REQUESTS:
+def _parse_youtube_feed(r: "httpx.Response", profile_url: str) -> Optional[dict]:
+    """Latest video from a channel RSS feed (regex to avoid namespace issues)."""
+    text = r.text
+    video_id_m = re.search(r"<yt:videoId>([^<]+)</yt:videoId>", text)
+    if not video_id_m:
+        video_id_m = re.search(r"<id>yt:video:([^<]+)</id>", text)
+    video_id = video_id_m.group(1).strip() if video_id_m else None
+    if not video_id:
         return None
+    # The feed's first <title> is the channel; the entry title follows the video id
+    title_m = re.search(r"<title>([^<]+)</title>", text[video_id_m.end():])
+    title = title_m.group(1).strip() if title_m else f"Video {video_id}"
+    thumb_m = re.search(r'<media:thumbnail\s+url="([^"]+)"', text)
+    thumb = thumb_m.group(1) if thumb_m else f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"
+    return {
+        "latest_content_url": f"https://www.youtube.com/watch?v={video_id}",
+        "latest_content_thumbnail": thumb,
+        "latest_content_title": title,
+    }
+
+
+def _parse_noembed(r: "httpx.Response", profile_url: str) -> Optional[dict]:
+    """Thumbnail and title from a noembed.com response."""
     try:
-        r = requests.get(
-            "https://noembed.com/embed",
-            params={"url": url},
-            timeout=10,
-            headers={"User-Agent": "BILI/1.0"},
-        )
-        if r.status_code != 200:
-            return None
         data = r.json()
-        thumb = data.get("thumbnail_url") or data.get("thumbnail")
-        title = data.get("title") or ""
-        if not thumb and not title:
-            return None
-        return {
-            "latest_content_url": url,
-            "latest_content_thumbnail": thumb,
-            "latest_content_title": title,
-        }
-    except Exception:
+    except ValueError:
         return None
+    thumb = data.get("thumbnail_url") or data.get("thumbnail")
+    title = data.get("title") or ""
+    if not thumb and not title:
+        return None
+    return {
+        "latest_content_url": profile_url,
+        "latest_content_thumbnail": thumb,
+        "latest_content_title": title,
+    }
 
 
-def fetch_latest_content_from_profile(profile_url: str) -> Optional[dict]:
+async def _fetch(
+    client: "httpx.AsyncClient",
+    url: str,
+    parse,
+    profile_url: str,
+    params: Optional[dict] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> Tuple[Optional[object], Optional["httpx.Response"]]:
     """
-    Fetch latest video or post content from a profile URL.
-    Returns dict with latest_content_url, latest_content_thumbnail, latest_content_title,
-    or None if fetch failed or URL not supported.
+    Conditional GET. Returns (NOT_MODIFIED, response) on 304, (content dict, response)
+    on a parsable 200, else (None, response-or-None).
     """
-    if not profile_url or not profile_url.strip():
-        return None
-    profile_url = profile_url.strip()
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        r = await client.get(url, params=params, headers=headers)
+    except httpx.HTTPError:
+        return None, None
+    if r.status_code == 304:
+        return NOT_MODIFIED, r
+    if r.status_code != 200:
+        return None, r
+    return parse(r, profile_url), r
+
+
+def _backoff_values(pin, now: datetime) -> dict:
+    failures = (pin.refresh_failures or 0) + 1
+    minutes = min(settings.PIN_REFRESH_MAX_BACKOFF_HOURS * 60, BASE_BACKOFF_MINUTES * 2 ** (failures - 1))
+    return {"refresh_failures": failures, "next_refresh_at": now + timedelta(minutes=minutes)}
+
 
-    # YouTube channel or @handle
-    channel_id = _extract_youtube_channel_id(profile_url)
+async def fetch_pin_update(client: "httpx.AsyncClient", pin, now: Optional[datetime] = None) -> Tuple[dict, str]:
+    """
+    Fetch a pin's profile and work out what to write.
+    pin may be an ORM object or a row with the same column names.
+    Returns (column values that changed, outcome).
+    """
+    now = now or datetime.utcnow()
+    profile_url = (pin.profile_url or "").strip()
+    values = {}
+
+    # YouTube channel or @handle (resolved once, then read from the pin)
+    channel_id = pin.youtube_channel_id or _youtube_channel_id_from_url(profile_url)
+    if not channel_id and _youtube_handle(profile_url):
+        channel_id = await _resolve_youtube_handle(client, _youtube_handle(profile_url))
+    if channel_id and channel_id != pin.youtube_channel_id:
+        values["youtube_channel_id"] = channel_id
+
+    content, response = None, None
     if channel_id:
-        result = _fetch_youtube_latest(channel_id)
-        if result:
-            return result
+        content, response = await _fetch(
+            client, "https://www.youtube.com/feeds/videos.xml", _parse_youtube_feed, profile_url,
+            params={"channel_id": channel_id}, etag=pin.content_etag, last_modified=pin.content_last_modified,
+        )
+    if content is None and profile_url:
+        # Fallback: noembed (works for direct YouTube video, Vimeo, etc.); validators only
+        # belong to the primary request, so a fallback after a feed failure sends none
+        primary = not channel_id
+        content, fallback = await _fetch(
+            client, "https://noembed.com/embed", _parse_noembed, profile_url, params={"url": profile_url},
+            etag=pin.content_etag if primary else None,
+            last_modified=pin.content_last_modified if primary else None,
+        )
+        response = fallback if primary else None
+
+    if content is None:
+        values.update(_backoff_values(pin, now))
+        return values, FAILED
 
-    # Fallback: noembed (works for direct YouTube video, Vimeo, etc.)
-    return _fetch_noembed(profile_url)
+    if pin.refresh_failures or pin.next_refresh_at is not None:
+        values["refresh_failures"] = 0
+        values["next_refresh_at"] = None
+    if response is not None and content is not NOT_MODIFIED:
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag != pin.content_etag:
+            values["content_etag"] = etag
+        if last_modified != pin.content_last_modified:
+            values["content_last_modified"] = last_modified
+    if content is NOT_MODIFIED:
+        return values, NOT_MODIFIED
 
+    if all(content.get(field) == getattr(pin, field) for field in CONTENT_FIELDS):
+        return values, UNCHANGED
+    values.update({field: content.get(field) for field in CONTENT_FIELDS})
+    values["content_fetched_at"] = now
+    return values, UPDATED
 
-def refresh_pin_content(pin) -> bool:
+
+def reset_refresh_state(pin) -> None:
+    """Profile URL changed: forget the cached channel id, validators and back-off."""
+    pin.youtube_channel_id = None
+    pin.content_etag = None
+    pin.content_last_modified = None
+    pin.refresh_failures = 0
+    pin.next_refresh_at = None
+
+
+async def refresh_pin_content(pin) -> bool:
     """
-    Update a ManualMapPin's latest_content_* from its profile_url.
+    Update a ManualMapPin's latest_content_* from its profile_url (caller commits).
     Returns True if content was updated, False otherwise.
     """
-    if not pin.profile_url:
+    if not pin.profile_url or not HAS_HTTPX:
         return False
-    content = fetch_latest_content_from_profile(pin.profile_url)
-    if not content:
-        return False
-    pin.latest_content_url = content.get("latest_content_url")
-    pin.latest_content_thumbnail = content.get("latest_content_thumbnail")
-    pin.latest_content_title = content.get("latest_content_title")
-    pin.content_fetched_at = datetime.utcnow()
-    return True
+    async with _new_client() as client:
+        values, outcome = await fetch_pin_update(client, pin)
+    for field, value in values.items():
+        setattr(pin, field, value)
+    return outcome == UPDATED
+
+
+def _load_due_pins(db: Session, now: datetime) -> list:
+    """Pins due for a refresh (blocking)."""
+    pins = db.execute(
+        select(
+            ManualMapPin.id, ManualMapPin.profile_url, ManualMapPin.youtube_channel_id,
+            ManualMapPin.content_etag, ManualMapPin.content_last_modified,
+            ManualMapPin.refresh_failures, ManualMapPin.next_refresh_at,
+            *(getattr(ManualMapPin, field) for field in CONTENT_FIELDS),
+        ).where(
+            ManualMapPin.profile_url.isnot(None),
+            or_(ManualMapPin.next_refresh_at.is_(None), ManualMapPin.next_refresh_at <= now)
+        )
+    ).all()
+    # Don't hold the read transaction open across network I/O
+    db.commit()
+    return pins
+
+
+def _write_pin_changes(db: Session, changes: List[Dict]) -> None:
+    """ORM bulk UPDATE by primary key (executemany per distinct column set; blocking)."""
+    db.execute(update(ManualMapPin), changes)
+    db.commit()
+
+
+async def refresh_due_pins(db: Session, now: Optional[datetime] = None, concurrency: int = settings.PIN_REFRESH_CONCURRENCY) -> Dict:
+    """
+    Refresh every pin with a profile URL that is not backing off.
+    Fetches run concurrently; changed pins are written with one bulk UPDATE.
+    """
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    counts = {UPDATED: 0, NOT_MODIFIED: 0, UNCHANGED: 0, FAILED: 0}
+    if not HAS_HTTPX:
+        return {"checked": 0, **counts, "written": 0, "duration_ms": 0.0}
+
+    # Only the fetches run on the event loop; the read and the write go to the threadpool
+    pins = await run_in_threadpool(_load_due_pins, db, now)
+
+    concurrency = max(1, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    changes = []
+
+    async def refresh(pin):
+        async with semaphore:
+            try:
+                values, outcome = await fetch_pin_update(client, pin, now)
+            except Exception as e:
+                print(f"Error refreshing pin {pin.id}: {e}")
+                values, outcome = _backoff_values(pin, now), FAILED
+        counts[outcome] += 1
+        if values:
+            changes.append({"id": pin.id, **values})
+
+    async with _new_client(concurrency) as client:
+        await asyncio.gather(*(refresh(pin) for pin in pins))
+
+    if changes:
+        await run_in_threadpool(_write_pin_changes, db, changes)
+    return {
+        "checked": len(pins),
+        **counts,
+        "written": len(changes),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
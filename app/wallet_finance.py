@@ -14,24 +14,42 @@ Architecture:
 """
 
 from sqlalchemy.orm import Session
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import uuid
 import asyncio
-from decimal import Decimal, ROUND_DOWN
+import logging
+from decimal import Decimal, ROUND_DOWN, ROUND_UP
+from fastapi.concurrency import run_in_threadpool
 from app.models.user import User
 from app.models.credit import CreditTransaction, CreditTransactionType, CreditLedger
+from app.models.withdrawal import BybitWithdrawal, BybitWithdrawalStatus
 from app.core.config import settings
-from app.core.database import SessionLocal
-import requests
-import hmac
-import hashlib
-import time
+from app.core.database import SessionLocal, MONEY_QUANTUM, to_money
+from app.core.radar_index import radar_index, is_silent_decayed
+from app.core.websocket import websocket_manager
+from app.services.bybit_client import (
+    BybitError, TRANSIENT_RET_CODES, WITHDRAWAL_FAILED_STATUSES, WITHDRAWAL_SUCCESS_STATUSES,
+    get_bybit_client, new_request_id,
+)
+from app.services.credit_posting import InsufficientCredits, Posting, post_credit
+from app.services.ledger_summary import get_ledger_summary
 import json
 import os
 from typing import List, Optional, Dict, Any
 
 
+logger = logging.getLogger("bili.wallet_finance")
+
+# Payouts are in whole cents
+USDT_QUANTUM = Decimal("0.01")
+
+# Pending withdrawals settled per reconciliation run
+RECONCILE_BATCH_SIZE = 100
+
+
 class WalletFinanceHandler:
     """
     Centralized wallet and finance handler for BILI App.
@@ -53,7 +71,7 @@ class WalletFinanceHandler:
         self.bybit_api_secret = settings.BYBIT_API_SECRET
         self.bybit_wallet_address = settings.BYBIT_WALLET_ADDRESS
         self.bybit_testnet = settings.BYBIT_TESTNET
-        self.bybit_base_url = "https://api-testnet.bybit.com" if self.bybit_testnet else "https://api.bybit.com"
+        self.bybit_base_url = settings.BYBIT_BASE_URL
     
     def credits_to_usdt(self, credits: float) -> float:
         """
@@ -63,9 +81,10 @@ class WalletFinanceHandler:
             credits: Number of credits (Habbet)
             
         Returns:
-            USDT equivalent value
+            USDT equivalent value (rounded down to the cent: a payout never exceeds the balance)
         """
-        return round(credits * self.CREDIT_TO_USDT_RATE, 2)
+        usdt = to_money(credits) * Decimal(str(self.CREDIT_TO_USDT_RATE))
+        return float(usdt.quantize(USDT_QUANTUM, rounding=ROUND_DOWN))
     
     def usdt_to_credits(self, usdt: float) -> float:
         """
@@ -75,9 +94,10 @@ class WalletFinanceHandler:
             usdt: USDT amount
             
         Returns:
-            Equivalent credits (Habbet)
+            Equivalent credits (Habbet), rounded up to 0.001 so a payout is always fully covered
         """
-        return round(usdt / self.CREDIT_TO_USDT_RATE, 2)
+        credits = Decimal(str(usdt)) / Decimal(str(self.CREDIT_TO_USDT_RATE))
+        return float(credits.quantize(MONEY_QUANTUM, rounding=ROUND_UP))
     
     def get_user_usdt_balance(self, user_id: str) -> Optional[float]:
         """
@@ -130,31 +150,28 @@ class WalletFinanceHandler:
             "remaining_balance": max(0.0, usdt_balance - withdrawable_amount) if eligible else usdt_balance
         }
     
-    def _generate_bybit_signature(self, params: dict, timestamp: str) -> str:
+    def eligible_withdrawals_query(self):
         """
-        Generate Bybit API signature for authentication.
-        
-        Args:
-            params: Request parameters
-            timestamp: Request timestamp
-            
-        Returns:
-            HMAC-SHA256 signature
+        Users whose balance reached the withdrawal threshold, decided in SQL so
+        ineligible users are never loaded. Balances are exact fixed-point, so this
+        is a plain (indexable) credit_balance >= threshold-in-credits; it matches
+        credits_to_usdt exactly. Users in the Royal Hospitality period are skipped.
         """
-        param_str = "&".join([f"{k}={v}" for k, v in sorted(params.items())])
-        payload = f"{timestamp}{self.bybit_api_key}{param_str}"
-        signature = hmac.new(
-            self.bybit_api_secret.encode('utf-8'),
-            payload.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        return signature
+        now = datetime.utcnow()
+        return self.db.query(User.id, User.credit_balance).filter(
+            User.credit_balance >= self.usdt_to_credits(self.WITHDRAWAL_THRESHOLD_USD),
+            or_(
+                User.royal_hospitality_end_date.is_(None),
+                User.royal_hospitality_end_date <= now
+            )
+        )
     
     async def withdraw_to_bybit(
         self,
         user_id: str,
         amount_usdt: float,
-        force: bool = False
+        force: bool = False,
+        request_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Withdraw USDT to Bybit wallet address.
@@ -163,6 +180,9 @@ class WalletFinanceHandler:
             user_id: User UUID
             amount_usdt: Amount to withdraw in USDT
             force: Force withdrawal even if below threshold (admin use)
+            request_id: Bybit requestId of this withdrawal (see request_id_for); a
+                retry with the same id returns the first attempt's state instead
+                of withdrawing again. A new one is generated when omitted.
             
         Returns:
             Dictionary with withdrawal result
@@ -175,7 +195,13 @@ class WalletFinanceHandler:
                 "error": "Invalid user ID format"
             }
         
-        user = self.db.query(User).filter(User.id == user_uuid).first()
+        if request_id is not None:
+            existing = await run_in_threadpool(self.get_withdrawal_state, request_id)
+            if existing is not None:
+                return existing
+        
+        # Blocking ORM work runs in the threadpool throughout (this is called from the event loop)
+        user = await run_in_threadpool(self._get_user, user_uuid)
         if not user:
             return {
                 "success": False,
@@ -221,98 +247,262 @@ class WalletFinanceHandler:
                 "error": "Bybit API credentials not configured. Please set BYBIT_API_KEY, BYBIT_API_SECRET, and BYBIT_WALLET_ADDRESS in .env"
             }
         
-        # Prepare withdrawal request to Bybit
-        timestamp = str(int(time.time() * 1000))
-        params = {
-            "coin": "USDT",
-            "chain": "TRC20",  # TRC20 network for USDT
-            "address": self.bybit_wallet_address,
-            "amount": str(amount_usdt),
-            "timestamp": timestamp,
-            "api_key": self.bybit_api_key
-        }
-        
-        signature = self._generate_bybit_signature(params, timestamp)
-        params["sign"] = signature
+        # Idempotency key: Bybit executes a requestId at most once. HTTP retries in
+        # BybitClient and reconciliation reuse it; a client retry reuses it only when
+        # the caller derives request_id from the client's key (request_id_for)
+        request_id = request_id or new_request_id()
         
+        # Debit first (guarded in SQL: concurrent withdrawals cannot overdraw), so the
+        # credits are reserved before any money moves. The pending withdrawal row is
+        # written in the same transaction and keeps them reserved until Bybit answers.
         try:
-            # Make withdrawal request to Bybit API
-            response = requests.post(
-                f"{self.bybit_base_url}/v5/asset/withdraw/create",
-                json=params,
-                headers={"Content-Type": "application/json"},
-                timeout=30
+            debit = await run_in_threadpool(
+                self._reserve_withdrawal, user.id, credits_to_deduct, amount_usdt, request_id
             )
-            
-            result = response.json()
-            
-            # Check if withdrawal was successful
-            if result.get("retCode") == 0:
-                # Deduct credits from user account
-                balance_before = user.credit_balance
-                user.credit_balance -= credits_to_deduct
-                balance_after = user.credit_balance
-                
-                # Create withdrawal transaction
-                withdrawal_transaction = CreditTransaction(
-                    user_id=user.id,
-                    transaction_type=CreditTransactionType.ADMIN_ADJUSTMENT,  # Using admin adjustment for withdrawals
-                    amount=-credits_to_deduct,  # Negative for deduction
-                    description=f"Automatic withdrawal: {amount_usdt} USDT to Bybit wallet",
-                    balance_after=balance_after
-                )
-                self.db.add(withdrawal_transaction)
-                self.db.flush()
-                
-                # Create ledger entry
-                ledger_entry = CreditLedger(
-                    user_id=user.id,
-                    transaction_id=withdrawal_transaction.id,
-                    entry_type="debit",
-                    amount=credits_to_deduct,
-                    balance_before=balance_before,
-                    balance_after=balance_after,
-                    description=f"💰 Automatic Withdrawal: {amount_usdt} USDT sent to Bybit wallet (Address: {self.bybit_wallet_address[:10]}...)",
-                    category="withdrawal"
-                )
-                self.db.add(ledger_entry)
-                
-                self.db.commit()
-                self.db.refresh(user)
-                self.db.refresh(withdrawal_transaction)
-                self.db.refresh(ledger_entry)
-                
-                return {
-                    "success": True,
-                    "message": f"Successfully withdrew {amount_usdt} USDT to Bybit wallet",
-                    "user_id": user_id,
-                    "amount_usdt": amount_usdt,
-                    "credits_deducted": credits_to_deduct,
-                    "balance_before_usdt": self.credits_to_usdt(balance_before),
-                    "balance_after_usdt": self.credits_to_usdt(balance_after),
-                    "bybit_transaction_id": result.get("result", {}).get("id"),
-                    "bybit_wallet_address": self.bybit_wallet_address,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-            else:
-                error_msg = result.get("retMsg", "Unknown error")
-                return {
-                    "success": False,
-                    "error": f"Bybit withdrawal failed: {error_msg}",
-                    "bybit_response": result
-                }
-                
-        except requests.exceptions.RequestException as e:
+        except InsufficientCredits:
+            return {
+                "success": False,
+                "error": f"Insufficient balance. Requested: {amount_usdt} USDT"
+            }
+        except IntegrityError:
+            # A concurrent request with the same request_id reserved it first
+            await run_in_threadpool(self.db.rollback)
+            existing = await run_in_threadpool(self.get_withdrawal_state, request_id)
+            if existing is not None:
+                return existing
             return {
                 "success": False,
-                "error": f"Failed to connect to Bybit API: {str(e)}"
+                "error": "Withdrawal processing failed: duplicate request"
             }
         except Exception as e:
-            self.db.rollback()
+            await run_in_threadpool(self.db.rollback)
             return {
                 "success": False,
                 "error": f"Withdrawal processing failed: {str(e)}"
             }
+        
+        try:
+            # Non-blocking request on the pooled client (timeouts + jittered retries)
+            result = await get_bybit_client().create_withdrawal(
+                address=self.bybit_wallet_address,
+                amount=str(amount_usdt),
+                request_id=request_id
+            )
+        except BybitError as e:
+            # Unknown outcome (timeout, 5xx, unreadable answer): Bybit may have paid out,
+            # so the credits stay reserved until reconcile_pending_withdrawals settles it
+            await run_in_threadpool(self._keep_pending, request_id, str(e))
+            return {
+                "success": False,
+                "pending": True,
+                "error": f"Bybit did not confirm the withdrawal ({str(e)}). The credits stay reserved until it is settled.",
+                "bybit_request_id": request_id
+            }
+        
+        status = await self._apply_bybit_answer(request_id, result)
+        if status != BybitWithdrawalStatus.COMPLETED:
+            error_msg = result.get("retMsg", "Unknown error")
+            return {
+                "success": False,
+                "pending": status == BybitWithdrawalStatus.PENDING,
+                "error": f"Bybit withdrawal failed: {error_msg}",
+                "bybit_response": result,
+                "bybit_request_id": request_id
+            }
+        
+        await run_in_threadpool(self.db.refresh, user)
+        radar_index.upsert_user(user)
+        
+        # Silent Decay: an offline user whose balance just reached 0.00 leaves the radar
+        if is_silent_decayed(user.status, user.credit_balance, user.is_invisible):
+            await websocket_manager.remove_from_radar(str(user.id))
+        
+        return {
+            "success": True,
+            "message": f"Successfully withdrew {amount_usdt} USDT to Bybit wallet",
+            "user_id": user_id,
+            "amount_usdt": amount_usdt,
+            "credits_deducted": credits_to_deduct,
+            "balance_before_usdt": self.credits_to_usdt(debit.balance_before),
+            "balance_after_usdt": self.credits_to_usdt(debit.balance_after),
+            "bybit_transaction_id": (result.get("result") or {}).get("id"),
+            "bybit_request_id": request_id,
+            "bybit_wallet_address": self.bybit_wallet_address,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    def _get_user(self, user_uuid: uuid.UUID) -> Optional[User]:
+        return self.db.query(User).filter(User.id == user_uuid).first()
+    
+    def _reserve_withdrawal(self, user_id: uuid.UUID, credits: float, amount_usdt: float, request_id: str) -> Posting:
+        """Debit the credits and record the PENDING withdrawal in one transaction (blocking)."""
+        try:
+            debit = post_credit(self.db, Posting(
+                user_id,
+                -credits,
+                CreditTransactionType.ADMIN_ADJUSTMENT,  # Using admin adjustment for withdrawals
+                description=f"Automatic withdrawal: {amount_usdt} USDT to Bybit wallet",
+                ledger_description=f"💰 Automatic Withdrawal: {amount_usdt} USDT sent to Bybit wallet (Address: {self.bybit_wallet_address[:10]}...)",
+                category="withdrawal",
+                reference_id=uuid.UUID(request_id),
+                reference_type="bybit_withdrawal",
+            ))
+        except InsufficientCredits:
+            self.db.rollback()
+            raise
+        self.db.add(BybitWithdrawal(
+            request_id=request_id,
+            user_id=user_id,
+            amount_usdt=amount_usdt,
+            credits=credits,
+            status=BybitWithdrawalStatus.PENDING,
+            reconcile_attempts=0,
+        ))
+        self.db.commit()
+        return debit
+    
+    def get_withdrawal_state(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Result of an earlier withdrawal with this requestId, or None if there is none (blocking)."""
+        withdrawal = self.db.get(BybitWithdrawal, request_id, populate_existing=True)
+        if withdrawal is None:
+            return None
+        state = {
+            "user_id": str(withdrawal.user_id),
+            "amount_usdt": withdrawal.amount_usdt,
+            "credits_deducted": withdrawal.credits,
+            "bybit_request_id": request_id,
+        }
+        if withdrawal.status == BybitWithdrawalStatus.COMPLETED:
+            return {
+                "success": True,
+                "message": f"Successfully withdrew {withdrawal.amount_usdt} USDT to Bybit wallet",
+                **state,
+                "bybit_transaction_id": withdrawal.bybit_withdrawal_id,
+                "bybit_wallet_address": self.bybit_wallet_address,
+                "timestamp": (withdrawal.resolved_at or withdrawal.updated_at).isoformat()
+            }
+        if withdrawal.status == BybitWithdrawalStatus.PENDING:
+            return {
+                "success": False,
+                "pending": True,
+                "error": "Bybit has not confirmed the withdrawal yet. The credits stay reserved until it is settled.",
+                **state
+            }
+        return {
+            "success": False,
+            "pending": False,
+            "error": f"Bybit withdrawal failed: {withdrawal.last_error}",
+            **state
+        }
+    
+    def _locked_pending_withdrawal(self, request_id: str) -> Optional[BybitWithdrawal]:
+        """The withdrawal row, locked, if it is still PENDING (otherwise the transaction is rolled back)."""
+        withdrawal = self.db.get(BybitWithdrawal, request_id, with_for_update=True, populate_existing=True)
+        if withdrawal is None or withdrawal.status != BybitWithdrawalStatus.PENDING:
+            self.db.rollback()
+            return None
+        return withdrawal
+    
+    def _complete_withdrawal(self, request_id: str, bybit_withdrawal_id: Optional[str]) -> None:
+        """Bybit accepted the payout: the reserved credits are spent (blocking)."""
+        withdrawal = self._locked_pending_withdrawal(request_id)
+        if withdrawal is None:
+            return
+        withdrawal.status = BybitWithdrawalStatus.COMPLETED
+        withdrawal.bybit_withdrawal_id = bybit_withdrawal_id
+        withdrawal.resolved_at = datetime.utcnow()
+        self.db.commit()
+    
+    def _keep_pending(self, request_id: str, error: str, reconciling: bool = False) -> None:
+        """Outcome still unknown: note why and leave the credits reserved (blocking)."""
+        withdrawal = self._locked_pending_withdrawal(request_id)
+        if withdrawal is None:
+            return
+        withdrawal.last_error = error
+        if reconciling:
+            withdrawal.reconcile_attempts = (withdrawal.reconcile_attempts or 0) + 1
+        self.db.commit()
+    
+    def _refund_withdrawal(self, request_id: str, reason: str) -> bool:
+        """
+        Give back the credits of a payout Bybit definitively rejected, in the same
+        transaction that marks it REFUNDED (blocking). On failure the withdrawal
+        stays PENDING, so reconciliation retries the refund.
+        """
+        try:
+            withdrawal = self._locked_pending_withdrawal(request_id)
+            if withdrawal is None:
+                return False
+            post_credit(self.db, Posting(
+                withdrawal.user_id,
+                withdrawal.credits,
+                CreditTransactionType.REFUND,
+                description=f"Withdrawal refund: {withdrawal.amount_usdt} USDT payout to Bybit failed",
+                category="withdrawal_refund",
+                reference_id=uuid.UUID(request_id),
+                reference_type="bybit_withdrawal_refund",
+            ))
+            withdrawal.status = BybitWithdrawalStatus.REFUNDED
+            withdrawal.last_error = reason
+            withdrawal.resolved_at = datetime.utcnow()
+            self.db.commit()
+            return True
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"Refund of withdrawal {request_id} failed, left pending for reconciliation: {e}")
+            return False
+    
+    async def _apply_bybit_answer(self, request_id: str, result: Dict[str, Any]) -> BybitWithdrawalStatus:
+        """
+        Settle a withdrawal from Bybit's answer to the create request: retCode 0
+        completes it, a definitive rejection refunds it, a transient retCode
+        leaves it pending. Returns the resulting status.
+        """
+        ret_code = result.get("retCode")
+        if ret_code == 0:
+            await run_in_threadpool(self._complete_withdrawal, request_id, (result.get("result") or {}).get("id"))
+            return BybitWithdrawalStatus.COMPLETED
+        error = f"retCode {ret_code}: {result.get('retMsg', 'Unknown error')}"
+        if ret_code in TRANSIENT_RET_CODES:
+            await run_in_threadpool(self._keep_pending, request_id, error)
+            return BybitWithdrawalStatus.PENDING
+        if await run_in_threadpool(self._refund_withdrawal, request_id, error):
+            return BybitWithdrawalStatus.REFUNDED
+        return BybitWithdrawalStatus.PENDING
+    
+    async def reconcile_withdrawal(self, request_id: str, amount_usdt: float, created_at: datetime) -> BybitWithdrawalStatus:
+        """
+        Settle a PENDING withdrawal from Bybit's record of its requestId: paid out
+        completes it, rejected/failed refunds it, in progress leaves it pending.
+        If Bybit has no record the request never reached it, so it is submitted
+        again under the same requestId (which Bybit executes at most once).
+        """
+        client = get_bybit_client()
+        # A minute of slack for clock skew between us and Bybit
+        start_time_ms = int(created_at.replace(tzinfo=timezone.utc).timestamp() * 1000) - 60_000
+        try:
+            record = await client.get_withdrawal_record(request_id, start_time_ms)
+            if record is None:
+                result = await client.create_withdrawal(
+                    address=self.bybit_wallet_address,
+                    amount=str(amount_usdt),
+                    request_id=request_id
+                )
+                return await self._apply_bybit_answer(request_id, result)
+        except BybitError as e:
+            await run_in_threadpool(self._keep_pending, request_id, str(e), True)
+            return BybitWithdrawalStatus.PENDING
+        
+        status = record.get("status")
+        if status in WITHDRAWAL_SUCCESS_STATUSES:
+            await run_in_threadpool(self._complete_withdrawal, request_id, record.get("withdrawId"))
+            return BybitWithdrawalStatus.COMPLETED
+        if status in WITHDRAWAL_FAILED_STATUSES:
+            if await run_in_threadpool(self._refund_withdrawal, request_id, f"Bybit status {status}"):
+                return BybitWithdrawalStatus.REFUNDED
+            return BybitWithdrawalStatus.PENDING
+        await run_in_threadpool(self._keep_pending, request_id, f"Bybit status {status}", True)
+        return BybitWithdrawalStatus.PENDING
     
     async def process_automatic_withdrawal(self, user_id: str) -> Dict[str, Any]:
         """
@@ -327,8 +517,8 @@ class WalletFinanceHandler:
         Returns:
             Dictionary with withdrawal processing result
         """
-        # Check if user is eligible for withdrawal
-        threshold_check = self.check_withdrawal_threshold(user_id)
+        # Check if user is eligible for withdrawal (blocking query in the threadpool)
+        threshold_check = await run_in_threadpool(self.check_withdrawal_threshold, user_id)
         
         if not threshold_check.get("success"):
             return threshold_check
@@ -369,10 +559,35 @@ class WalletFinanceHandler:
         except ValueError:
             return []
         
-        # Get withdrawal transactions from ledger
-        withdrawals = self.db.query(CreditLedger).filter(
+        # Recent withdrawals are on the ledger summary row (refunded payouts already removed)
+        if limit <= settings.LEDGER_SUMMARY_RECENT_ENTRIES:
+            summary = get_ledger_summary(self.db, user_uuid)
+            if summary is None:
+                return []
+            return [
+                {
+                    "transaction_id": w["transaction_id"],
+                    "amount_usdt": self.credits_to_usdt(w["amount"]),
+                    "credits_deducted": w["amount"],
+                    "balance_before_usdt": self.credits_to_usdt(w["balance_before"]),
+                    "balance_after_usdt": self.credits_to_usdt(w["balance_after"]),
+                    "description": w["description"],
+                    "timestamp": w["timestamp"]
+                }
+                for w in summary.recent_withdrawals[:limit]
+            ]
+        
+        # Longer histories: from the ledger (payouts that failed and were refunded are left out)
+        refunded = self.db.query(CreditTransaction.reference_id).filter(
+            CreditTransaction.user_id == user_uuid,
+            CreditTransaction.reference_type == "bybit_withdrawal_refund"
+        )
+        withdrawals = self.db.query(CreditLedger).join(
+            CreditTransaction, CreditTransaction.id == CreditLedger.transaction_id
+        ).filter(
             CreditLedger.user_id == user_uuid,
-            CreditLedger.category == "withdrawal"
+            CreditLedger.category == "withdrawal",
+            CreditTransaction.reference_id.notin_(refunded)
         ).order_by(CreditLedger.timestamp.desc()).limit(limit).all()
         
         return [
@@ -422,6 +637,95 @@ async def process_automatic_withdrawal_if_eligible(
     return await handler.process_automatic_withdrawal(user_id)
 
 
+async def process_eligible_withdrawals(concurrency: int = settings.AUTO_SWEEP_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Automatic withdrawal sweep [cite: 2026-02-03]: one query for every eligible
+    user, then payouts with at most `concurrency` in flight. Each payout uses its
+    own session (sessions are not safe to share between concurrent tasks).
+    
+    Returns:
+        Dictionary with eligible, processed and failed counts
+    """
+    if SessionLocal is None:
+        return {"eligible": 0, "processed": 0, "failed": 0}
+    
+    db = SessionLocal()
+    try:
+        handler = WalletFinanceHandler(db)
+        eligible = [
+            (str(user_id), handler.credits_to_usdt(credit_balance))
+            for user_id, credit_balance in handler.eligible_withdrawals_query().all()
+        ]
+    finally:
+        db.close()
+    eligible = [
+        (user_id, usdt_balance) for user_id, usdt_balance in eligible
+        if usdt_balance >= WalletFinanceHandler.WITHDRAWAL_THRESHOLD_USD
+    ]
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def withdraw(user_id: str, usdt_balance: float) -> Dict[str, Any]:
+        async with semaphore:
+            session = SessionLocal()
+            try:
+                result = await WalletFinanceHandler(session).withdraw_to_bybit(
+                    user_id=user_id,
+                    amount_usdt=usdt_balance,
+                    force=False
+                )
+                if result.get("success"):
+                    print(f"Automatic withdrawal processed for user {user_id}: {result.get('amount_usdt')} USDT")
+                return result
+            except Exception as e:
+                print(f"Error processing withdrawal for user {user_id}: {e}")
+                return {"success": False, "error": str(e)}
+            finally:
+                session.close()
+    
+    results = await asyncio.gather(*(withdraw(user_id, usdt) for user_id, usdt in eligible))
+    processed = sum(1 for result in results if result.get("success"))
+    return {"eligible": len(eligible), "processed": processed, "failed": len(eligible) - processed}
+
+
+async def reconcile_pending_withdrawals(limit: int = RECONCILE_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Settle withdrawals left PENDING by an unknown Bybit outcome, oldest first.
+    Only withdrawals older than WITHDRAWAL_RECONCILE_AFTER_SECONDS are checked,
+    so requests still in flight are left alone.
+    
+    Returns:
+        Dictionary with checked, completed, refunded and pending counts
+    """
+    counts = {"checked": 0, "completed": 0, "refunded": 0, "pending": 0}
+    if SessionLocal is None:
+        return counts
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.WITHDRAWAL_RECONCILE_AFTER_SECONDS)
+    
+    def due_withdrawals():
+        db = SessionLocal()
+        try:
+            return db.query(
+                BybitWithdrawal.request_id, BybitWithdrawal.amount_usdt, BybitWithdrawal.created_at
+            ).filter(
+                BybitWithdrawal.status == BybitWithdrawalStatus.PENDING,
+                BybitWithdrawal.created_at < cutoff
+            ).order_by(BybitWithdrawal.created_at).limit(limit).all()
+        finally:
+            db.close()
+    
+    db = SessionLocal()
+    try:
+        handler = WalletFinanceHandler(db)
+        for request_id, amount_usdt, created_at in await run_in_threadpool(due_withdrawals):
+            status = await handler.reconcile_withdrawal(request_id, amount_usdt, created_at)
+            counts["checked"] += 1
+            counts[status.value] += 1
+    finally:
+        db.close()
+    return counts
+
+
 def get_user_usdt_balance(
     db: Session,
     user_id: str
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Local mock of the Bybit v5 withdrawal endpoints for testing automatic withdrawals.
+Run from bili folder:  python scripts/mock_bybit_server.py --port 8765
+
+Then set in .env:
+  BYBIT_BASE_URL=http://127.0.0.1:8765
+  BYBIT_API_KEY / BYBIT_API_SECRET / BYBIT_WALLET_ADDRESS = any non-X value
+
+- Verifies the X-BAPI-* headers are present (signature is not checked)
+- Same requestId -> same withdrawal id, so retries never pay out twice
+- GET withdraw/query-record lists every withdrawal created (with its requestId)
+- --fail-rate answers that share of requests with HTTP 503 (exercises retries)
+- --delay sleeps before answering (exercises timeouts)
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+WITHDRAW_CREATE_PATH = "/v5/asset/withdraw/create"
+WITHDRAW_RECORDS_PATH = "/v5/asset/withdraw/query-record"
+REQUIRED_HEADERS = ("X-BAPI-API-KEY", "X-BAPI-TIMESTAMP", "X-BAPI-RECV-WINDOW", "X-BAPI-SIGN")
+
+withdrawals = {}  # requestId -> withdrawal record
+withdrawals_lock = threading.Lock()
+
+
+class MockBybitHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    delay = 0.0
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.delay:
+            time.sleep(self.delay)
+        if self.path != WITHDRAW_CREATE_PATH:
+            self._reply(404, {"retCode": 404, "retMsg": "Not found"})
+            return
+        if random.random() < self.fail_rate:
+            self._reply(503, {"retCode": 10016, "retMsg": "Service unavailable (mock)"})
+            return
+        if any(not self.headers.get(name) for name in REQUIRED_HEADERS):
+            self._reply(200, {"retCode": 10003, "retMsg": "API key is invalid.", "result": {}})
+            return
+        try:
+            params = json.loads(raw or b"{}")
+        except ValueError:
+            self._reply(200, {"retCode": 10001, "retMsg": "Invalid JSON body", "result": {}})
+            return
+        missing = [key for key in ("coin", "chain", "address", "amount") if not params.get(key)]
+        if missing:
+            self._reply(200, {"retCode": 10001, "retMsg": f"Missing parameters: {', '.join(missing)}", "result": {}})
+            return
+
+        request_id = params.get("requestId") or uuid.uuid4().hex
+        with withdrawals_lock:
+            replay = request_id in withdrawals
+            record = withdrawals.setdefault(request_id, {
+                "coin": params["coin"],
+                "chain": params["chain"],
+                "amount": params["amount"],
+                "toAddress": params["address"],
+                "status": "success",
+                "withdrawId": str(random.randint(10**7, 10**8 - 1)),
+                "requestId": request_id,
+                "createTime": str(int(time.time() * 1000)),
+            })
+            withdrawal_id = record["withdrawId"]
+        print(f"{'Replayed' if replay else 'Created'} withdrawal {withdrawal_id}: "
+              f"{params['amount']} {params['coin']} ({params['chain']}) -> {params['address']} [requestId {request_id}]")
+        self._reply(200, {
+            "retCode": 0,
+            "retMsg": "success",
+            "result": {"id": withdrawal_id},
+            "retExtInfo": {},
+            "time": int(time.time() * 1000),
+        })
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        if self.path.split("?", 1)[0] != WITHDRAW_RECORDS_PATH:
+            self._reply(404, {"retCode": 404, "retMsg": "Not found"})
+            return
+        if any(not self.headers.get(name) for name in REQUIRED_HEADERS):
+            self._reply(200, {"retCode": 10003, "retMsg": "API key is invalid.", "result": {}})
+            return
+        with withdrawals_lock:
+            rows = list(withdrawals.values())
+        self._reply(200, {
+            "retCode": 0,
+            "retMsg": "success",
+            "result": {"rows": rows, "nextPageCursor": ""},
+            "retExtInfo": {},
+            "time": int(time.time() * 1000),
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Bybit withdrawal API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with HTTP 503 (0-1)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before answering")
+    args = parser.parse_args()
+
+    MockBybitHandler.fail_rate = args.fail_rate
+    MockBybitHandler.delay = args.delay
+    server = ThreadingHTTPServer((args.host, args.port), MockBybitHandler)
+    print(f"Mock Bybit listening on http://{args.host}:{args.port} (fail rate {args.fail_rate}, delay {args.delay}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()